@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import asyncio
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pydantic import BaseModel, Field
+
+from app.api.events import FINAL_EVENTS
+from app.api.job_store import BatchRecord, JobRecord, _store_call
+from app.api.runner import JobRunner, get_job_runner
+from app.core import tracing
+from app.core.config import Settings, get_settings
+from app.core.logging import get_logger
+from app.core.queue import get_job_queue
+from app.pipeline.storage import cleanup_sources
+
+logger = get_logger("batches")
+
+# How often a dispatcher waiting on a queued child re-reads the store when no
+# event arrives (workers without Redis cannot reach this process's bus).
+WAIT_POLL_SECONDS = 2.0
+
+
+class BatchGroup(BaseModel):
+    name: str = Field(min_length=1)
+    files: List[str] = Field(min_length=1)
+
+
+class BatchManifest(BaseModel):
+    groups: List[BatchGroup] = Field(min_length=1)
+    concurrency: Optional[int] = Field(default=None, ge=1)
+
+
+async def batch_summary(store, batch: BatchRecord) -> Dict[str, Any]:
+    """Aggregate view of a batch, read from its child records (results are
+    left out; fetch them per child from `/api/jobs/{job_id}`)."""
+    records = await asyncio.gather(*(_store_call(store.get, c["job_id"]) for c in batch.children))
+    counts = {"queued": 0, "running": 0, "done": 0, "error": 0}
+    children = []
+    progress = 0
+    for child, record in zip(batch.children, records):
+        status = record.status if record else "error"
+        counts[status] = counts.get(status, 0) + 1
+        progress += record.progress if record else 100
+        children.append(
+            {
+                **child,
+                "status": status,
+                "stage": record.stage if record else "OUTPUT",
+                "progress": record.progress if record else 100,
+                "error": record.error if record else {"message": "Job record expired."},
+            }
+        )
+    # A batch whose dispatcher is gone (e.g. an API restart in queue mode)
+    # is still done once every child is.
+    finished = counts["done"] + counts["error"] == len(children)
+    return {
+        "batch_id": batch.batch_id,
+        "status": "done" if finished else batch.status,
+        "concurrency": batch.concurrency,
+        "total": len(children),
+        "counts": counts,
+        "progress": round(progress / len(children)) if children else 100,
+        "children": children,
+    }
+
+
+class BatchDispatcher:
+    """Runs each child of a batch as an ordinary job and publishes each
+    finished child, with its result, on the batch's channel.
+
+    Inline, children run through the job runner here, at most
+    `batch.concurrency` at a time per batch and `global_limit` across every
+    batch this process dispatches. In queue mode `enqueue` stages the batch:
+    the first `batch.concurrency` children go on the queue and the rest are
+    kept in the store, and each worker that finishes a child queues the next
+    one, so an API restart strands none of it. The workers' own concurrency
+    is the bound across batches there; the dispatcher only waits.
+
+    Children waiting for a slot write nothing to the store, so while a batch
+    runs the dispatcher refreshes their records and the batch's before the
+    store's TTL can expire them.
+    """
+
+    def __init__(self, runner: JobRunner, global_limit: int) -> None:
+        self.runner = runner
+        self.global_limit = max(1, global_limit)
+        self._global: Optional[asyncio.Semaphore] = None
+
+    def _slots(self) -> asyncio.Semaphore:
+        if self._global is None:
+            self._global = asyncio.Semaphore(self.global_limit)
+        return self._global
+
+    async def enqueue(
+        self, batch: BatchRecord, children: List[Tuple[JobRecord, List[Any]]], bypass_cache: bool = False
+    ) -> None:
+        """Queue mode: queue the first `batch.concurrency` children and store
+        the rest for the workers to queue as slots free up. `files` is each
+        child's persisted-upload manifest."""
+        queue = get_job_queue()
+        staged = []
+        for record, files in children:
+            with tracing.span("enqueue", job_id=record.job_id, files=len(files)):
+                payload = {
+                    "files": files,
+                    "no_cache": bypass_cache,
+                    "batch_id": batch.batch_id,
+                    "traceparent": tracing.traceparent(),
+                }
+            staged.append({"job_id": record.job_id, "payload": payload})
+        # Store the tail before queueing the head, so a child that finishes
+        # at once already finds its successor.
+        await _store_call(self.runner.store.push_batch_children, batch.batch_id, staged[batch.concurrency :])
+        for child in staged[: batch.concurrency]:
+            await asyncio.to_thread(queue.enqueue, child["job_id"], child["payload"])
+
+    async def _wait(self, record: JobRecord) -> JobRecord:
+        subscription = await self.runner.events.subscribe(record.job_id)
+        try:
+            while True:
+                current = await _store_call(self.runner.store.get, record.job_id)
+                if current is None or current.status in ("done", "error"):
+                    return current or record
+                event = await subscription.get(timeout=WAIT_POLL_SECONDS)
+                while event is not None and event["type"] not in FINAL_EVENTS:
+                    event = await subscription.get(timeout=WAIT_POLL_SECONDS)
+        finally:
+            await subscription.close()
+
+    async def _execute(
+        self, record: JobRecord, files: List[Any], settings: Settings, bypass_cache: bool
+    ) -> JobRecord:
+        try:
+            await self.runner.run(record, files, settings, bypass_cache=bypass_cache)
+        except Exception as exc:
+            await self.runner.fail(record, exc)
+        finally:
+            cleanup_sources(source for _, source, _ in files)
+        return record
+
+    async def _keep_alive(self, batch: BatchRecord, pending: Set[str]) -> None:
+        store = self.runner.store
+        interval = max(0.05, store.ttl_seconds / 3)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                for job_id in list(pending):
+                    # An empty update only bumps `updated_at` (and the Redis expiry).
+                    await _store_call(store.update, job_id, {})
+                await _store_call(store.set_batch, batch)
+            except Exception as exc:
+                logger.warning("batch_refresh_failed", extra={"batch_id": batch.batch_id, "error": str(exc)})
+
+    async def run(
+        self,
+        batch: BatchRecord,
+        children: List[Tuple[JobRecord, List[Any]]],
+        settings: Settings,
+        bypass_cache: bool = False,
+    ) -> None:
+        queued = settings.queue_enabled()
+        local = asyncio.Semaphore(batch.concurrency)
+        names = {child["job_id"]: child["name"] for child in batch.children}
+        pending = {record.job_id for record, _ in children}
+
+        async def one(record: JobRecord, files: List[Any]) -> None:
+            try:
+                if queued:
+                    finished = await self._wait(record)
+                else:
+                    # Take the batch's own slot first so a batch waiting on
+                    # itself does not hold global slots other batches could use.
+                    async with local, self._slots():
+                        finished = await self._execute(record, files, settings, bypass_cache)
+            finally:
+                pending.discard(record.job_id)
+            self.runner.events.publish(
+                batch.batch_id,
+                {"type": "child", "batch_id": batch.batch_id, "name": names[record.job_id], **finished.to_dict()},
+            )
+
+        keep_alive = asyncio.create_task(self._keep_alive(batch, pending))
+        try:
+            results = await asyncio.gather(*(one(r, f) for r, f in children), return_exceptions=True)
+            for record, result in zip((r for r, _ in children), results):
+                if isinstance(result, Exception):
+                    logger.error("batch_child_failed", extra={"job_id": record.job_id, "error": str(result)})
+        finally:
+            keep_alive.cancel()
+            batch.status = "done"
+            await _store_call(self.runner.store.set_batch, batch)
+            summary = await batch_summary(self.runner.store, batch)
+            self.runner.events.publish(batch.batch_id, {"type": "done", **summary})
+
+
+@lru_cache
+def get_batch_dispatcher() -> BatchDispatcher:
+    return BatchDispatcher(get_job_runner(), get_settings().batch_global_concurrency)
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from functools import lru_cache
+from typing import Any, Dict, Optional, Set
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+
+logger = get_logger("events")
+
+# Terminal event types; a subscriber stops after receiving one.
+FINAL_EVENTS = ("done", "failed")
+
+
+class Subscription:
+    def __init__(self, bus: "InProcessEventBus", job_id: str) -> None:
+        self.bus = bus
+        self.job_id = job_id
+        self.queue: asyncio.Queue[Dict[str, Any]] = asyncio.Queue()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next event, or None if `timeout` elapses first."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self) -> None:
+        await self.bus.unsubscribe(self)
+
+
+class InProcessEventBus:
+    """Fans job events out to subscribers in this process.
+
+    `publish` is synchronous so it can be called straight from a stage
+    callback; events for a job reach each subscriber in publish order.
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+
+    def publish(self, job_id: str, event: Dict[str, Any]) -> None:
+        self._deliver(job_id, event)
+
+    def _deliver(self, job_id: str, event: Dict[str, Any]) -> None:
+        for subscription in self._subscribers.get(job_id, ()):
+            subscription.queue.put_nowait(event)
+
+    async def subscribe(self, job_id: str) -> Subscription:
+        subscription = Subscription(self, job_id)
+        first = job_id not in self._subscribers
+        self._subscribers.setdefault(job_id, set()).add(subscription)
+        if first:
+            await self._watch(job_id)
+        return subscription
+
+    async def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.job_id)
+        if not subscribers or subscription not in subscribers:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.job_id]
+            await self._unwatch(subscription.job_id)
+
+    async def _watch(self, job_id: str) -> None:
+        pass
+
+    async def _unwatch(self, job_id: str) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        self._subscribers.clear()
+
+
+class RedisEventBus(InProcessEventBus):
+    """Publishes through Redis pub/sub so any API process can serve a stream.
+
+    Each process holds one pub/sub connection, subscribed only to channels of
+    jobs it has local subscribers for. Publishes go through a single outbox
+    task, which keeps them in order without blocking the caller.
+    """
+
+    channel_prefix = "jobevents:"
+
+    def __init__(self, redis_url: str) -> None:
+        super().__init__()
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(redis_url, decode_responses=True)
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._outbox: Optional[asyncio.Queue] = None
+        self._sender: Optional[asyncio.Task] = None
+
+    def publish(self, job_id: str, event: Dict[str, Any]) -> None:
+        if self._outbox is None:
+            self._outbox = asyncio.Queue()
+            self._sender = asyncio.get_running_loop().create_task(self._send())
+        self._outbox.put_nowait((job_id, event))
+
+    async def _send(self) -> None:
+        while True:
+            job_id, event = await self._outbox.get()
+            try:
+                await self.redis.publish(self.channel_prefix + job_id, json.dumps(event))
+            except Exception as exc:
+                logger.warning("event_publish_failed", extra={"job_id": job_id, "error": str(exc)})
+                # Local subscribers still get the event.
+                self._deliver(job_id, event)
+
+    async def _watch(self, job_id: str) -> None:
+        if self._pubsub is None:
+            self._pubsub = self.redis.pubsub()
+        await self._pubsub.subscribe(self.channel_prefix + job_id)
+        if self._listener is None:
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def _unwatch(self, job_id: str) -> None:
+        if self._pubsub is not None:
+            await self._pubsub.unsubscribe(self.channel_prefix + job_id)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except Exception as exc:
+                logger.warning("event_listen_failed", extra={"error": str(exc)})
+                await asyncio.sleep(1.0)
+                continue
+            if not message or message.get("type") != "message":
+                continue
+            job_id = message["channel"][len(self.channel_prefix) :]
+            self._deliver(job_id, json.loads(message["data"]))
+
+    async def aclose(self) -> None:
+        for task in (self._sender, self._listener):
+            if task is not None:
+                task.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        await self.redis.aclose()
+        await super().aclose()
+
+
+@lru_cache
+def get_event_bus() -> InProcessEventBus:
+    settings = get_settings()
+    if settings.redis_url:
+        try:
+            return RedisEventBus(settings.redis_url)
+        except Exception as exc:
+            logger.warning("redis_unavailable", extra={"error": str(exc)})
+    return InProcessEventBus()
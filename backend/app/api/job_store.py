@@ -1,9 +1,13 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import os
+import sqlite3
 import time
+from contextlib import closing
 from dataclasses import asdict, dataclass, field
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Set
 
 from functools import lru_cache
 
@@ -22,6 +26,8 @@ class JobRecord:
     source_files: list[str] = field(default_factory=list)
     raw_text_preview: str = ""
     result: Optional[Dict[str, Any]] = None
+    # Sections of a result still being generated, keyed by section name.
+    partial: Optional[Dict[str, Any]] = None
     error: Optional[Dict[str, Any]] = None
     updated_at: float = field(default_factory=lambda: time.time())
 
@@ -30,15 +36,40 @@ class JobRecord:
         return payload
 
 
+@dataclass
+class BatchRecord:
+    """A portfolio run: one child job per document group. Child state lives in
+    the child records; only the batch's own status is kept here."""
+
+    batch_id: str
+    children: list[Dict[str, str]] = field(default_factory=list)  # {"name", "job_id"}
+    concurrency: int = 1
+    status: str = "running"
+    updated_at: float = field(default_factory=lambda: time.time())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
 class InMemoryJobStore:
     def __init__(self, ttl_seconds: int) -> None:
         self.ttl_seconds = ttl_seconds
         self._store: Dict[str, JobRecord] = {}
+        self._batches: Dict[str, BatchRecord] = {}
+        self._pending: Dict[str, List[Dict[str, Any]]] = {}
 
     def set(self, job: JobRecord) -> None:
         job.updated_at = time.time()
         self._store[job.job_id] = job
 
+    def update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        job = self._store.get(job_id)
+        if job is None:
+            return
+        for name, value in fields.items():
+            setattr(job, name, value)
+        job.updated_at = time.time()
+
     def get(self, job_id: str) -> Optional[JobRecord]:
         job = self._store.get(job_id)
         if not job:
@@ -48,24 +79,275 @@ class InMemoryJobStore:
             return None
         return job
 
+    def count(self) -> int:
+        return len(self._store)
+
+    def set_batch(self, batch: BatchRecord) -> None:
+        batch.updated_at = time.time()
+        self._batches[batch.batch_id] = batch
+
+    def get_batch(self, batch_id: str) -> Optional[BatchRecord]:
+        batch = self._batches.get(batch_id)
+        if batch and time.time() - batch.updated_at > self.ttl_seconds:
+            self._batches.pop(batch_id, None)
+            self._pending.pop(batch_id, None)
+            return None
+        return batch
+
+    def push_batch_children(self, batch_id: str, children: List[Dict[str, Any]]) -> None:
+        self._pending.setdefault(batch_id, []).extend(children)
+
+    def pop_batch_child(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        pending = self._pending.get(batch_id)
+        return pending.pop(0) if pending else None
+
 
 class RedisJobStore:
+    """Status fields live in a hash so progress is a small `HSET`; the result
+    blob is a separate key written once, when the job finishes."""
+
+    prefix = "job:"
+    # Stored JSON-encoded in the hash; everything else is a plain string.
+    _json_fields = ("source_files", "error", "partial")
+
     def __init__(self, redis_url: str, ttl_seconds: int) -> None:
         import redis.asyncio as redis
 
         self.redis = redis.from_url(redis_url, decode_responses=True)
         self.ttl_seconds = ttl_seconds
 
+    def _encode(self, fields: Dict[str, Any]) -> Dict[str, str]:
+        return {
+            name: json.dumps(value) if name in self._json_fields else str(value)
+            for name, value in fields.items()
+        }
+
     async def set(self, job: JobRecord) -> None:
-        payload = json.dumps(job.to_dict())
-        await self.redis.setex(job.job_id, self.ttl_seconds, payload)
+        job.updated_at = time.time()
+        fields = job.to_dict()
+        result = fields.pop("result")
+        key = self.prefix + job.job_id
+        pipe = self.redis.pipeline()
+        pipe.hset(key, mapping=self._encode(fields))
+        pipe.expire(key, self.ttl_seconds)
+        if result is not None:
+            pipe.set(f"{key}:result", json.dumps(result), ex=self.ttl_seconds)
+        await pipe.execute()
+
+    async def update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        key = self.prefix + job_id
+        pipe = self.redis.pipeline()
+        pipe.hset(key, mapping=self._encode({**fields, "updated_at": time.time()}))
+        pipe.expire(key, self.ttl_seconds)
+        await pipe.execute()
 
     async def get(self, job_id: str) -> Optional[JobRecord]:
-        payload = await self.redis.get(job_id)
-        if not payload:
+        key = self.prefix + job_id
+        pipe = self.redis.pipeline()
+        pipe.hgetall(key)
+        pipe.get(f"{key}:result")
+        fields, result = await pipe.execute()
+        if not fields:
             return None
-        data = json.loads(payload)
-        return JobRecord(**data)
+        return JobRecord(
+            job_id=job_id,
+            status=fields.get("status", "queued"),
+            stage=fields.get("stage", "UPLOAD"),
+            progress=int(fields.get("progress", 0)),
+            source_files=json.loads(fields.get("source_files", "[]")),
+            raw_text_preview=fields.get("raw_text_preview", ""),
+            result=json.loads(result) if result else None,
+            partial=json.loads(fields.get("partial", "null")),
+            error=json.loads(fields.get("error", "null")),
+            updated_at=float(fields.get("updated_at", 0.0)),
+        )
+
+    async def count(self) -> int:
+        # Only called on a metrics scrape; SCAN does not block the server.
+        total = 0
+        async for key in self.redis.scan_iter(match=self.prefix + "*", count=1000):
+            if not key.endswith(":result"):
+                total += 1
+        return total
+
+    async def set_batch(self, batch: BatchRecord) -> None:
+        batch.updated_at = time.time()
+        pipe = self.redis.pipeline()
+        pipe.set(f"batch:{batch.batch_id}", json.dumps(batch.to_dict()), ex=self.ttl_seconds)
+        pipe.expire(f"batch:{batch.batch_id}:pending", self.ttl_seconds)
+        await pipe.execute()
+
+    async def get_batch(self, batch_id: str) -> Optional[BatchRecord]:
+        payload = await self.redis.get(f"batch:{batch_id}")
+        return BatchRecord(**json.loads(payload)) if payload else None
+
+    async def push_batch_children(self, batch_id: str, children: List[Dict[str, Any]]) -> None:
+        if not children:
+            return
+        key = f"batch:{batch_id}:pending"
+        pipe = self.redis.pipeline()
+        pipe.rpush(key, *[json.dumps(child) for child in children])
+        pipe.expire(key, self.ttl_seconds)
+        await pipe.execute()
+
+    async def pop_batch_child(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        payload = await self.redis.lpop(f"batch:{batch_id}:pending")
+        return json.loads(payload) if payload else None
+
+
+class SqliteJobStore:
+    """Records in a local SQLite file, so the API and queue workers on one
+    host share job state without Redis."""
+
+    def __init__(self, path: str, ttl_seconds: int) -> None:
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, record TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS batches (batch_id TEXT PRIMARY KEY, record TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS batch_pending"
+                " (id INTEGER PRIMARY KEY AUTOINCREMENT, batch_id TEXT NOT NULL, child TEXT NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def set(self, job: JobRecord) -> None:
+        job.updated_at = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, record, updated_at) VALUES (?, ?, ?)",
+                (job.job_id, json.dumps(job.to_dict()), job.updated_at),
+            )
+
+    def update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT record FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return
+            record = {**json.loads(row[0]), **fields, "updated_at": time.time()}
+            conn.execute(
+                "UPDATE jobs SET record = ?, updated_at = ? WHERE job_id = ?",
+                (json.dumps(record), record["updated_at"], job_id),
+            )
+            conn.execute("COMMIT")
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT record, updated_at FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if not row:
+                return None
+            if time.time() - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+                return None
+        return JobRecord(**json.loads(row[0]))
+
+    def count(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def set_batch(self, batch: BatchRecord) -> None:
+        batch.updated_at = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO batches (batch_id, record, updated_at) VALUES (?, ?, ?)",
+                (batch.batch_id, json.dumps(batch.to_dict()), batch.updated_at),
+            )
+
+    def get_batch(self, batch_id: str) -> Optional[BatchRecord]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT record FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+        if not row:
+            return None
+        batch = BatchRecord(**json.loads(row[0]))
+        return None if time.time() - batch.updated_at > self.ttl_seconds else batch
+
+    def push_batch_children(self, batch_id: str, children: List[Dict[str, Any]]) -> None:
+        with closing(self._connect()) as conn:
+            conn.executemany(
+                "INSERT INTO batch_pending (batch_id, child) VALUES (?, ?)",
+                [(batch_id, json.dumps(child)) for child in children],
+            )
+
+    def pop_batch_child(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, child FROM batch_pending WHERE batch_id = ? ORDER BY id LIMIT 1", (batch_id,)
+            ).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM batch_pending WHERE id = ?", (row[0],))
+            conn.execute("COMMIT")
+        return json.loads(row[1]) if row else None
+
+
+async def _store_call(fn, *args) -> Any:
+    if asyncio.iscoroutinefunction(fn):
+        return await fn(*args)
+    # Synchronous stores (SQLite) can wait up to 30 s on a worker's write
+    # lock; keep them off the event loop.
+    return await asyncio.to_thread(fn, *args)
+
+
+class ProgressWriter:
+    """Coalesces progress updates per job: latest value wins, written at most
+    once per `interval` by a single task per job, so writes land in order.
+
+    Call `close(job_id)` before the job's final `set` so no progress write
+    can overtake it.
+    """
+
+    def __init__(self, store, interval: float) -> None:
+        self.store = store
+        self.interval = interval
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._writing: Set[str] = set()
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        self._pending.setdefault(job_id, {}).update(fields)
+        if job_id not in self._tasks:
+            self._tasks[job_id] = asyncio.get_running_loop().create_task(self._flush_loop(job_id))
+
+    async def _flush_loop(self, job_id: str) -> None:
+        try:
+            while job_id in self._pending:
+                await asyncio.sleep(self.interval)
+                fields = self._pending.pop(job_id, None)
+                if not fields:
+                    continue
+                self._writing.add(job_id)
+                try:
+                    await _store_call(self.store.update, job_id, fields)
+                except Exception as exc:
+                    logger.warning("progress_write_failed", extra={"job_id": job_id, "error": str(exc)})
+                finally:
+                    self._writing.discard(job_id)
+        finally:
+            self._tasks.pop(job_id, None)
+
+    async def close(self, job_id: str) -> None:
+        self._pending.pop(job_id, None)
+        task = self._tasks.get(job_id)
+        if task is None:
+            return
+        if job_id not in self._writing:
+            task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
 
 
 @lru_cache
@@ -76,4 +358,12 @@ def get_job_store():
             return RedisJobStore(settings.redis_url, settings.job_poll_ttl_seconds)
         except Exception as exc:
             logger.warning("redis_unavailable", extra={"error": str(exc)})
+    if settings.queue_enabled():
+        # Workers run in other processes; in-memory records would be invisible to them.
+        return SqliteJobStore(os.path.join(settings.state_dir, "jobs.db"), settings.job_poll_ttl_seconds)
     return InMemoryJobStore(settings.job_poll_ttl_seconds)
+
+
+@lru_cache
+def get_progress_writer() -> ProgressWriter:
+    return ProgressWriter(get_job_store(), get_settings().job_progress_flush_seconds)
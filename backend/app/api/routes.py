@@ -1,32 +1,142 @@
 from __future__ import annotations
 
 import asyncio
+import json
 import uuid
-from typing import Any, Dict, List, Tuple
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi import APIRouter, File, Form, HTTPException, Query, Request, UploadFile
+from fastapi.responses import Response, StreamingResponse
+from fastapi.routing import APIRoute
+from pydantic import ValidationError
 
-from app.core.config import get_settings
+from app.core import tracing
+from app.core.config import Settings, get_settings
 from app.core.logging import get_logger
-from app.api.job_store import JobRecord, get_job_store
-from app.pipeline.orchestrator import run_pipeline
+from app.core.metrics import CONTENT_TYPE, JOB_STORE_SIZE, render
+from app.api.batches import BatchManifest, batch_summary, get_batch_dispatcher
+from app.api.events import FINAL_EVENTS, get_event_bus
+from app.api.job_store import BatchRecord, JobRecord, _store_call, get_job_store
+from app.api.runner import final_event, get_job_runner, progress_event, section_event
+from app.core.queue import get_job_queue
+from app.pipeline.executor import get_pipeline_executor
+from app.pipeline.storage import (
+    Source,
+    SpooledUploadWriter,
+    UploadTooLarge,
+    cleanup_sources,
+    get_upload_storage,
+)
 
 
-router = APIRouter()
 logger = get_logger("api")
 
+SSE_KEEPALIVE_SECONDS = 15.0
+# Idle streams re-read the store this often, which covers queue workers whose
+# events cannot reach this process (no Redis).
+SSE_POLL_SECONDS = 2.0
+# Room for multipart boundaries, part headers and form fields on top of the
+# file bytes an upload route accepts.
+MULTIPART_OVERHEAD_BYTES = 1024 * 1024
+
+_UPLOAD_LIMITS = {
+    "/api/extract": Settings.max_total_bytes,
+    "/api/extract_sync": Settings.max_total_bytes,
+    "/api/batches": Settings.batch_max_total_bytes,
+}
+
+
+def _capped(receive, limit: int):
+    received = 0
+
+    async def capped_receive():
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > limit:
+                raise HTTPException(status_code=413, detail="Total upload exceeds max size.")
+        return message
+
+    return capped_receive
+
+
+class UploadLimitRoute(APIRoute):
+    """Bounds upload bodies before FastAPI parses the form, which would
+    otherwise spool the whole body to disk before the handler runs. A
+    declared Content-Length over the limit is refused outright, and a
+    chunked body is cut off once it passes the limit; `_receive_uploads`
+    still enforces the exact per-file and total sizes."""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        limit_of = _UPLOAD_LIMITS.get(self.path)
+        if limit_of is None:
+            return handler
+
+        async def bounded(request: Request) -> Response:
+            limit = limit_of(get_settings()) + MULTIPART_OVERHEAD_BYTES
+            length = request.headers.get("content-length", "")
+            if length.isdigit() and int(length) > limit:
+                raise HTTPException(status_code=413, detail="Total upload exceeds max size.")
+            return await handler(Request(request.scope, _capped(request.receive, limit)))
+
+        return bounded
+
+
+router = APIRouter(route_class=UploadLimitRoute)
+
 
 async def _store_set(store, job: JobRecord) -> None:
-    if hasattr(store, "set") and asyncio.iscoroutinefunction(store.set):
-        await store.set(job)
-    else:
-        store.set(job)
+    await _store_call(store.set, job)
 
 
 async def _store_get(store, job_id: str):
-    if hasattr(store, "get") and asyncio.iscoroutinefunction(store.get):
-        return await store.get(job_id)
-    return store.get(job_id)
+    return await _store_call(store.get, job_id)
+
+
+def _persist_uploads(
+    storage, job_id: str, buffers: List[Tuple[str, Source, str | None]]
+) -> List[Dict[str, Any]]:
+    manifest = []
+    for index, (filename, source, content_type) in enumerate(buffers):
+        key = storage.save(f"{job_id}/{index:03d}", source)
+        manifest.append({"filename": filename, "key": key, "content_type": content_type})
+    return manifest
+
+
+def _sse(event: Dict[str, Any]) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def _receive_uploads(
+    files: List[UploadFile], settings, max_total_bytes: Optional[int] = None
+) -> List[Tuple[str, Source, str | None]]:
+    received: List[Tuple[str, Source, str | None]] = []
+    total_bytes = 0
+    max_total_bytes = max_total_bytes or settings.max_total_bytes()
+    try:
+        for f in files:
+            if f.size is not None and f.size > settings.max_file_bytes():
+                raise HTTPException(status_code=413, detail=f"{f.filename} exceeds max file size.")
+            writer = SpooledUploadWriter(
+                min(settings.max_file_bytes(), max_total_bytes - total_bytes),
+                settings.upload_spool_bytes,
+                settings.upload_tmp_dir,
+            )
+            try:
+                while chunk := await f.read(settings.upload_chunk_bytes):
+                    writer.write(chunk)
+            except UploadTooLarge:
+                if writer.size > settings.max_file_bytes():
+                    raise HTTPException(status_code=413, detail=f"{f.filename} exceeds max file size.")
+                raise HTTPException(status_code=413, detail="Total upload exceeds max size.")
+            total_bytes += writer.size
+            received.append((f.filename, writer.finish(), f.content_type))
+    except BaseException:
+        cleanup_sources(source for _, source, _ in received)
+        raise
+    return received
 
 
 @router.get("/")
@@ -34,26 +144,39 @@ async def health() -> Dict[str, str]:
     return {"status": "ok", "service": "AxiomESG"}
 
 
+@router.get("/metrics")
+async def metrics() -> Response:
+    try:
+        JOB_STORE_SIZE.set(await _store_call(get_job_store().count))
+    except Exception as exc:
+        logger.warning("job_store_count_failed", extra={"error": str(exc)})
+    return Response(render(), media_type=CONTENT_TYPE)
+
+
+@router.get("/api/debug/traces")
+async def debug_traces(
+    job_id: Optional[str] = None, limit: int = Query(500, ge=1, le=10000)
+) -> Dict[str, Any]:
+    """Recent spans from this process's ring buffer, oldest first; `job_id`
+    narrows them to that job's trace."""
+    buffer = tracing.ring_buffer()
+    if buffer is None:
+        raise HTTPException(status_code=404, detail="The memory trace exporter is not enabled.")
+    spans = buffer.spans(tracing.job_trace_id(job_id) if job_id else None)
+    return {"spans": spans[-limit:]}
+
+
 @router.post("/api/extract")
-async def extract(files: List[UploadFile] = File(...)) -> Dict[str, Any]:
+async def extract(
+    files: List[UploadFile] = File(...), no_cache: bool = Query(False)
+) -> Dict[str, Any]:
     settings = get_settings()
     store = get_job_store()
 
     if not files:
         raise HTTPException(status_code=400, detail="No files uploaded.")
 
-    total_bytes = 0
-    buffers: List[Tuple[str, bytes, str | None]] = []
-    for f in files:
-        data = await f.read()
-        size = len(data)
-        if size > settings.max_file_bytes():
-            raise HTTPException(status_code=413, detail=f"{f.filename} exceeds max file size.")
-        total_bytes += size
-        buffers.append((f.filename, data, f.content_type))
-
-    if total_bytes > settings.max_total_bytes():
-        raise HTTPException(status_code=413, detail="Total upload exceeds max size.")
+    buffers = await _receive_uploads(files, settings)
 
     job_id = str(uuid.uuid4())
     record = JobRecord(
@@ -63,62 +186,52 @@ async def extract(files: List[UploadFile] = File(...)) -> Dict[str, Any]:
         progress=5,
         source_files=[b[0] for b in buffers],
     )
+
+    if settings.queue_enabled():
+        # Workers read the uploads from shared storage; nothing runs here.
+        storage = get_upload_storage()
+        try:
+            manifest = await asyncio.to_thread(_persist_uploads, storage, job_id, buffers)
+        finally:
+            cleanup_sources(b[1] for b in buffers)
+        await _store_set(store, record)
+        with tracing.span("enqueue", job_id=job_id, files=len(manifest)):
+            payload = {"files": manifest, "no_cache": no_cache, "traceparent": tracing.traceparent()}
+            await asyncio.to_thread(get_job_queue().enqueue, job_id, payload)
+        return {"job_id": job_id, "status": "queued"}
+
     await _store_set(store, record)
 
     async def run_job() -> None:
+        runner = get_job_runner()
         try:
-            record.status = "running"
-            record.stage = "EXTRACT"
-            record.progress = 20
-            await _store_set(store, record)
-
-            def stage_update(stage: str, progress: int) -> None:
-                record.stage = stage
-                record.progress = progress
-                asyncio.create_task(_store_set(store, record))
-
-            output, raw_text, usage = run_pipeline(buffers, settings, job_id, stage_update)
-
-            record.stage = "OUTPUT"
-            record.progress = 100
-            record.status = "done"
-            record.raw_text_preview = raw_text[: settings.preview_chars]
-            record.result = output.model_dump()
-            record.error = None
-            await _store_set(store, record)
+            await runner.run(record, buffers, settings, bypass_cache=no_cache)
         except Exception as exc:
-            record.status = "error"
-            record.stage = "OUTPUT"
-            record.progress = 100
-            record.error = {"message": "Pipeline failed.", "detail": str(exc)}
-            await _store_set(store, record)
-            logger.error("job_failed", extra={"job_id": job_id, "error": str(exc)})
+            await runner.fail(record, exc)
+        finally:
+            cleanup_sources(b[1] for b in buffers)
 
     asyncio.create_task(run_job())
     return {"job_id": job_id, "status": "queued"}
 
 
 @router.post("/api/extract_sync")
-async def extract_sync(files: List[UploadFile] = File(...)) -> Dict[str, Any]:
+async def extract_sync(
+    files: List[UploadFile] = File(...), no_cache: bool = Query(False)
+) -> Dict[str, Any]:
     settings = get_settings()
     if not files:
         raise HTTPException(status_code=400, detail="No files uploaded.")
 
-    total_bytes = 0
-    buffers: List[Tuple[str, bytes, str | None]] = []
-    for f in files:
-        data = await f.read()
-        size = len(data)
-        if size > settings.max_file_bytes():
-            raise HTTPException(status_code=413, detail=f"{f.filename} exceeds max file size.")
-        total_bytes += size
-        buffers.append((f.filename, data, f.content_type))
-
-    if total_bytes > settings.max_total_bytes():
-        raise HTTPException(status_code=413, detail="Total upload exceeds max size.")
+    buffers = await _receive_uploads(files, settings)
 
     job_id = str(uuid.uuid4())
-    output, raw_text, usage = run_pipeline(buffers, settings, job_id)
+    try:
+        output, raw_text, usage = await get_pipeline_executor().run(
+            buffers, settings, job_id, bypass_cache=no_cache
+        )
+    finally:
+        cleanup_sources(b[1] for b in buffers)
     return {
         "job_id": job_id,
         "status": "done",
@@ -139,3 +252,207 @@ async def job_status(job_id: str) -> Dict[str, Any]:
     if not record:
         raise HTTPException(status_code=404, detail="Job not found.")
     return record.to_dict()
+
+
+@router.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str) -> StreamingResponse:
+    """Server-sent events: the current state, each progress change, then the
+    final record (with the result) once, after which the stream ends."""
+    store = get_job_store()
+    events = get_event_bus()
+    # Subscribe before reading the snapshot so no transition falls in between.
+    subscription = await events.subscribe(job_id)
+    try:
+        record = await _store_get(store, job_id)
+    except Exception:
+        await subscription.close()
+        raise
+    if not record:
+        await subscription.close()
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    async def stream() -> AsyncIterator[str]:
+        try:
+            if record.status in ("done", "error"):
+                yield _sse(final_event(record))
+                return
+            last = progress_event(record)
+            yield _sse(last)
+            sent = set()
+            for section in record.partial or {}:
+                sent.add(section)
+                yield _sse(section_event(record, section))
+            idle = 0.0
+            while True:
+                event = await subscription.get(timeout=SSE_POLL_SECONDS)
+                if event is None:
+                    current = await _store_get(store, job_id)
+                    if current and current.status in ("done", "error"):
+                        yield _sse(final_event(current))
+                        return
+                    # Sections written by a worker that has no bus to this process.
+                    fresh = [s for s in (current.partial or {}) if s not in sent] if current else []
+                    for section in fresh:
+                        sent.add(section)
+                        yield _sse(section_event(current, section))
+                    if current and progress_event(current) != last:
+                        event = progress_event(current)
+                    else:
+                        idle += SSE_POLL_SECONDS
+                        if idle >= SSE_KEEPALIVE_SECONDS:
+                            idle = 0.0
+                            yield ": keepalive\n\n"
+                        continue
+                idle = 0.0
+                if event["type"] == "section":
+                    sent.add(event["section"])
+                yield _sse(event)
+                if event["type"] in FINAL_EVENTS:
+                    return
+                if event["type"] == "progress":
+                    last = event
+        finally:
+            await subscription.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _validate_manifest(manifest: str, files: List[UploadFile], settings) -> BatchManifest:
+    try:
+        parsed = BatchManifest.model_validate_json(manifest)
+    except ValidationError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid manifest: {exc.errors()[0]['msg']}")
+    if len(parsed.groups) > settings.batch_max_groups:
+        raise HTTPException(status_code=400, detail=f"At most {settings.batch_max_groups} groups per batch.")
+    uploaded = [f.filename for f in files]
+    if len(set(uploaded)) != len(uploaded):
+        raise HTTPException(status_code=400, detail="Uploaded file names must be unique.")
+    referenced = [name for group in parsed.groups for name in group.files]
+    if len(set(referenced)) != len(referenced):
+        raise HTTPException(status_code=400, detail="Each file may belong to only one group.")
+    if set(referenced) != set(uploaded):
+        missing = sorted(set(referenced) - set(uploaded))
+        extra = sorted(set(uploaded) - set(referenced))
+        raise HTTPException(
+            status_code=400, detail=f"Manifest and uploads differ (missing: {missing}, unassigned: {extra})."
+        )
+    return parsed
+
+
+@router.post("/api/batches")
+async def create_batch(
+    manifest: str = Form(...), files: List[UploadFile] = File(...), no_cache: bool = Query(False)
+) -> Dict[str, Any]:
+    """Fan a manifest of document groups (one per company) out as child jobs.
+
+    `manifest` is JSON: `{"groups": [{"name": "...", "files": ["a.pdf", ...]}],
+    "concurrency": 4}`; every uploaded file belongs to exactly one group.
+    """
+    settings = get_settings()
+    store = get_job_store()
+    parsed = _validate_manifest(manifest, files, settings)
+    concurrency = min(parsed.concurrency or settings.batch_concurrency, settings.batch_concurrency)
+
+    buffers = await _receive_uploads(files, settings, settings.batch_max_total_bytes())
+    by_name = {b[0]: b for b in buffers}
+
+    batch = BatchRecord(batch_id=str(uuid.uuid4()), concurrency=concurrency)
+    children = []
+    try:
+        for group in parsed.groups:
+            group_buffers = [by_name[name] for name in group.files]
+            record = JobRecord(
+                job_id=str(uuid.uuid4()),
+                status="queued",
+                stage="UPLOAD",
+                progress=5,
+                source_files=list(group.files),
+            )
+            if settings.queue_enabled():
+                manifest_files = await asyncio.to_thread(
+                    _persist_uploads, get_upload_storage(), record.job_id, group_buffers
+                )
+                children.append((record, manifest_files))
+            else:
+                children.append((record, group_buffers))
+            batch.children.append({"name": group.name, "job_id": record.job_id})
+    except BaseException:
+        cleanup_sources(b[1] for b in buffers)
+        raise
+    if settings.queue_enabled():
+        cleanup_sources(b[1] for b in buffers)
+
+    for record, _ in children:
+        await _store_set(store, record)
+    await _store_call(store.set_batch, batch)
+
+    dispatcher = get_batch_dispatcher()
+    if settings.queue_enabled():
+        await dispatcher.enqueue(batch, children, bypass_cache=no_cache)
+    asyncio.create_task(dispatcher.run(batch, children, settings, bypass_cache=no_cache))
+    return {"batch_id": batch.batch_id, "status": batch.status, "children": batch.children}
+
+
+@router.get("/api/batches/{batch_id}")
+async def batch_status(batch_id: str) -> Dict[str, Any]:
+    store = get_job_store()
+    batch = await _store_call(store.get_batch, batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found.")
+    return await batch_summary(store, batch)
+
+
+@router.get("/api/batches/{batch_id}/events")
+async def batch_events(batch_id: str) -> StreamingResponse:
+    """Server-sent events: the aggregate summary, then one `child` event (with
+    the child's result) as each child finishes, then `done` with the final
+    summary."""
+    store = get_job_store()
+    events = get_event_bus()
+    subscription = await events.subscribe(batch_id)
+    try:
+        batch = await _store_call(store.get_batch, batch_id)
+    except Exception:
+        await subscription.close()
+        raise
+    if not batch:
+        await subscription.close()
+        raise HTTPException(status_code=404, detail="Batch not found.")
+
+    async def stream() -> AsyncIterator[str]:
+        try:
+            summary = await batch_summary(store, batch)
+            if summary["status"] == "done":
+                yield _sse({"type": "done", **summary})
+                return
+            yield _sse({"type": "progress", **summary})
+            idle = 0.0
+            while True:
+                event = await subscription.get(timeout=SSE_POLL_SECONDS)
+                if event is None:
+                    current = await _store_call(store.get_batch, batch_id)
+                    summary = await batch_summary(store, current) if current else None
+                    if summary and summary["status"] == "done":
+                        yield _sse({"type": "done", **summary})
+                        return
+                    idle += SSE_POLL_SECONDS
+                    if idle >= SSE_KEEPALIVE_SECONDS:
+                        idle = 0.0
+                        yield ": keepalive\n\n"
+                    continue
+                idle = 0.0
+                yield _sse(event)
+                if event["type"] in FINAL_EVENTS:
+                    return
+        finally:
+            await subscription.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
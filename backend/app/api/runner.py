@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+from app.api.events import get_event_bus
+from app.api.job_store import JobRecord, _store_call, get_job_store, get_progress_writer
+from app.core import tracing
+from app.core.config import Settings
+from app.core.logging import get_logger
+from app.core.metrics import JOBS, JOBS_IN_FLIGHT
+from app.pipeline.executor import get_pipeline_executor
+from app.pipeline.storage import Source
+
+logger = get_logger("runner")
+
+
+def progress_event(record: JobRecord) -> Dict[str, Any]:
+    return {
+        "type": "progress",
+        "job_id": record.job_id,
+        "status": record.status,
+        "stage": record.stage,
+        "progress": record.progress,
+    }
+
+
+def section_event(record: JobRecord, section: str) -> Dict[str, Any]:
+    return {"type": "section", "job_id": record.job_id, "section": section, "data": record.partial[section]}
+
+
+def final_event(record: JobRecord) -> Dict[str, Any]:
+    return {"type": "done" if record.status == "done" else "failed", **record.to_dict()}
+
+
+class JobRunner:
+    """Runs a job's pipeline against the job store: progress goes through the
+    coalescing writer and the event bus, the final record is stored whole.
+
+    Used by the API for in-process jobs and by `app.worker` for queued ones;
+    `run` raises on failure so the caller can choose between `retry` and `fail`.
+    """
+
+    def __init__(self, store, events, progress_writer, executor) -> None:
+        self.store = store
+        self.events = events
+        self.progress_writer = progress_writer
+        self.executor = executor
+
+    async def _publish(self, record: JobRecord) -> None:
+        await _store_call(self.store.set, record)
+        self.events.publish(record.job_id, progress_event(record))
+
+    async def run(
+        self,
+        record: JobRecord,
+        files: List[Tuple[str, Source, str | None]],
+        settings: Settings,
+        bypass_cache: bool = False,
+    ) -> None:
+        job_id = record.job_id
+        record.status = "running"
+        record.stage = "EXTRACT"
+        record.progress = 20
+        await _store_call(self.store.update, job_id, {"status": "running", "stage": "EXTRACT", "progress": 20})
+        self.events.publish(job_id, progress_event(record))
+
+        def stage_update(stage: str, progress: int) -> None:
+            if record.status != "running" or (stage, progress) == (record.stage, record.progress):
+                return
+            record.stage = stage
+            record.progress = progress
+            self.progress_writer.update(job_id, stage=stage, progress=progress)
+            self.events.publish(job_id, progress_event(record))
+
+        def section_update(section: str, body: Dict[str, Any]) -> None:
+            if record.status != "running":
+                return
+            record.partial = {**(record.partial or {}), section: body}
+            self.progress_writer.update(job_id, partial=record.partial)
+            self.events.publish(job_id, section_event(record, section))
+
+        JOBS_IN_FLIGHT.inc()
+        try:
+            with tracing.span("job", job_id=job_id, files=len(files)):
+                output, raw_text, usage = await self.executor.run(
+                    files, settings, job_id, stage_update, bypass_cache=bypass_cache, section_callback=section_update
+                )
+        finally:
+            JOBS_IN_FLIGHT.dec()
+            await self.progress_writer.close(job_id)
+
+        record.stage = "OUTPUT"
+        record.progress = 100
+        record.status = "done"
+        record.raw_text_preview = raw_text[: settings.preview_chars]
+        record.result = output.model_dump()
+        record.partial = None
+        record.error = None
+        await _store_call(self.store.set, record)
+        self.events.publish(job_id, final_event(record))
+        JOBS.inc(status="done")
+
+    async def retry(self, record: JobRecord, exc: BaseException, attempt: int) -> None:
+        """Put the record back to queued, keeping the error for visibility."""
+        record.status = "queued"
+        record.stage = "UPLOAD"
+        record.progress = 5
+        record.error = {"message": "Pipeline failed; retrying.", "detail": str(exc), "attempt": attempt}
+        await self._publish(record)
+        JOBS.inc(status="retry")
+        logger.warning("job_retry", extra={"job_id": record.job_id, "attempt": attempt, "error": str(exc)})
+
+    async def fail(self, record: JobRecord, exc: BaseException) -> None:
+        record.status = "error"
+        record.stage = "OUTPUT"
+        record.progress = 100
+        record.error = {"message": "Pipeline failed.", "detail": str(exc)}
+        await _store_call(self.store.set, record)
+        self.events.publish(record.job_id, final_event(record))
+        JOBS.inc(status="error")
+        logger.error("job_failed", extra={"job_id": record.job_id, "error": str(exc)})
+
+
+@lru_cache
+def get_job_runner() -> JobRunner:
+    return JobRunner(get_job_store(), get_event_bus(), get_progress_writer(), get_pipeline_executor())
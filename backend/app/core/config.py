@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from functools import lru_cache
-from typing import List
+from typing import Dict, List
 
 from pydantic import Field
 from pydantic_settings import BaseSettings
@@ -15,9 +15,59 @@ class Settings(BaseSettings):
 
     max_file_mb: int = Field(default=25, alias="MAX_FILE_MB")
     max_total_mb: int = Field(default=50, alias="MAX_TOTAL_MB")
+    upload_tmp_dir: str = Field(default="", alias="UPLOAD_TMP_DIR")
+    upload_spool_bytes: int = Field(default=1024 * 1024, alias="UPLOAD_SPOOL_BYTES")
+    upload_chunk_bytes: int = Field(default=256 * 1024, alias="UPLOAD_CHUNK_BYTES")
     job_poll_ttl_seconds: int = Field(default=3600, alias="JOB_POLL_TTL_SECONDS")
+    job_progress_flush_seconds: float = Field(default=0.25, alias="JOB_PROGRESS_FLUSH_SECONDS")
+
+    job_execution: str = Field(default="inline", alias="JOB_EXECUTION")
+    queue_backend: str = Field(default="", alias="QUEUE_BACKEND")
+    state_dir: str = Field(default="./data", alias="STATE_DIR")
+    queue_visibility_timeout_seconds: int = Field(default=900, alias="QUEUE_VISIBILITY_TIMEOUT_SECONDS")
+    queue_max_attempts: int = Field(default=3, alias="QUEUE_MAX_ATTEMPTS")
+    queue_retry_backoff_seconds: float = Field(default=10.0, alias="QUEUE_RETRY_BACKOFF_SECONDS")
+    queue_poll_seconds: float = Field(default=1.0, alias="QUEUE_POLL_SECONDS")
+    worker_concurrency: int = Field(default=2, alias="WORKER_CONCURRENCY")
+    worker_metrics_port: int = Field(default=0, alias="WORKER_METRICS_PORT")
+
+    tracing_exporters: str = Field(default="memory", alias="TRACING_EXPORTERS")
+    trace_buffer_spans: int = Field(default=2048, alias="TRACE_BUFFER_SPANS")
+    trace_file_path: str = Field(default="", alias="TRACE_FILE_PATH")
+
+    batch_max_groups: int = Field(default=200, alias="BATCH_MAX_GROUPS")
+    batch_max_total_mb: int = Field(default=2048, alias="BATCH_MAX_TOTAL_MB")
+    batch_concurrency: int = Field(default=4, alias="BATCH_CONCURRENCY")
+    batch_global_concurrency: int = Field(default=8, alias="BATCH_GLOBAL_CONCURRENCY")
+
+    pipeline_execution: str = Field(default="thread", alias="PIPELINE_EXECUTION")
+    pipeline_workers: int = Field(default=4, alias="PIPELINE_WORKERS")
+
+    pipeline_streaming: bool = Field(default=False, alias="PIPELINE_STREAMING")
+    stream_max_sentence_chars: int = Field(default=4000, alias="STREAM_MAX_SENTENCE_CHARS")
+    extract_concurrency: int = Field(default=1, alias="EXTRACT_CONCURRENCY")
+    pdf_shard_min_pages: int = Field(default=200, alias="PDF_SHARD_MIN_PAGES")
+    pdf_shard_workers: int = Field(default=4, alias="PDF_SHARD_WORKERS")
+    extract_cache_enabled: bool = Field(default=True, alias="EXTRACT_CACHE_ENABLED")
+    extract_cache_max_entries: int = Field(default=256, alias="EXTRACT_CACHE_MAX_ENTRIES")
+    extract_cache_dir: str = Field(default="", alias="EXTRACT_CACHE_DIR")
+    extract_cache_max_mb: int = Field(default=512, alias="EXTRACT_CACHE_MAX_MB")
+    awfa_near_dup: bool = Field(default=False, alias="AWFA_NEAR_DUP")
+    awfa_near_dup_threshold: float = Field(default=0.8, alias="AWFA_NEAR_DUP_THRESHOLD")
+    evidence_candidates: int = Field(default=300, alias="EVIDENCE_CANDIDATES")
+    evidence_token_budget: int = Field(default=4000, alias="EVIDENCE_TOKEN_BUDGET")
+    evidence_token_budgets: str = Field(default="", alias="EVIDENCE_TOKEN_BUDGETS")
+    evidence_min_per_category: int = Field(default=5, alias="EVIDENCE_MIN_PER_CATEGORY")
+    token_estimator: str = Field(default="heuristic", alias="TOKEN_ESTIMATOR")
 
     llm_provider: str = Field(default="openrouter", alias="LLM_PROVIDER")
+    llm_providers: str = Field(default="", alias="LLM_PROVIDERS")
+    llm_hedge_percentile: float = Field(default=95.0, alias="LLM_HEDGE_PERCENTILE")
+    llm_hedge_delay_seconds: float = Field(default=8.0, alias="LLM_HEDGE_DELAY_SECONDS")
+    llm_hedge_threads: int = Field(default=32, alias="LLM_HEDGE_THREADS")
+    llm_stats_window_seconds: float = Field(default=300.0, alias="LLM_STATS_WINDOW_SECONDS")
+    llm_prompt_mode: str = Field(default="single", alias="LLM_PROMPT_MODE")
+    llm_streaming: bool = Field(default=False, alias="LLM_STREAMING")
     openrouter_api_key: str = Field(default="", alias="OPENROUTER_API_KEY")
     openrouter_model: str = Field(default="openrouter/auto", alias="OPENROUTER_MODEL")
 
@@ -29,8 +79,29 @@ class Settings(BaseSettings):
     gemini_api_key: str = Field(default="", alias="GEMINI_API_KEY")
     gemini_model: str = Field(default="gemini-1.5-flash", alias="GEMINI_MODEL")
 
+    llm_cache_enabled: bool = Field(default=True, alias="LLM_CACHE_ENABLED")
+    llm_cache_backend: str = Field(default="", alias="LLM_CACHE_BACKEND")
+    llm_cache_ttl_seconds: int = Field(default=86400, alias="LLM_CACHE_TTL_SECONDS")
+    llm_cache_max_entries: int = Field(default=1024, alias="LLM_CACHE_MAX_ENTRIES")
+
+    llm_rpm: str = Field(default="", alias="LLM_RPM")
+    llm_tpm: str = Field(default="", alias="LLM_TPM")
+    llm_max_in_flight: str = Field(default="", alias="LLM_MAX_IN_FLIGHT")
+    llm_completion_tokens: int = Field(default=1024, alias="LLM_COMPLETION_TOKENS")
+    llm_limiter_backend: str = Field(default="", alias="LLM_LIMITER_BACKEND")
+
     azure_docintel_endpoint: str = Field(default="", alias="AZURE_DOCINTEL_ENDPOINT")
     azure_docintel_key: str = Field(default="", alias="AZURE_DOCINTEL_KEY")
+    ocr_concurrency: int = Field(default=8, alias="OCR_CONCURRENCY")
+    ocr_page_min_chars: int = Field(default=50, alias="OCR_PAGE_MIN_CHARS")
+    ocr_poll_timeout_seconds: float = Field(default=120.0, alias="OCR_POLL_TIMEOUT_SECONDS")
+    ocr_poll_max_interval_seconds: float = Field(default=5.0, alias="OCR_POLL_MAX_INTERVAL_SECONDS")
+    ocr_poll_retries: int = Field(default=5, alias="OCR_POLL_RETRIES")
+
+    http_max_connections: int = Field(default=100, alias="HTTP_MAX_CONNECTIONS")
+    http_max_keepalive: int = Field(default=20, alias="HTTP_MAX_KEEPALIVE")
+    http_keepalive_expiry_seconds: float = Field(default=30.0, alias="HTTP_KEEPALIVE_EXPIRY_SECONDS")
+    http2_enabled: bool = Field(default=True, alias="HTTP2_ENABLED")
 
     redis_url: str = Field(default="", alias="REDIS_URL")
 
@@ -53,6 +124,46 @@ class Settings(BaseSettings):
     def max_total_bytes(self) -> int:
         return self.max_total_mb * 1024 * 1024
 
+    def batch_max_total_bytes(self) -> int:
+        return self.batch_max_total_mb * 1024 * 1024
+
+    def queue_enabled(self) -> bool:
+        return self.job_execution.lower() == "queue"
+
+    def llm_provider_names(self) -> List[str]:
+        """`LLM_PROVIDERS` in preference order, else just `LLM_PROVIDER`."""
+        names = [p.strip().lower() for p in self.llm_providers.split(",") if p.strip()]
+        return names or [self.llm_provider.lower()]
+
+    def evidence_token_budget_for(self, provider: str) -> int:
+        """`EVIDENCE_TOKEN_BUDGETS` entries (`provider=tokens,...`) override
+        `EVIDENCE_TOKEN_BUDGET` for their provider."""
+        for entry in self.evidence_token_budgets.split(","):
+            name, _, tokens = entry.partition("=")
+            if name.strip().lower() == provider.lower() and tokens.strip():
+                return int(tokens)
+        return self.evidence_token_budget
+
+    def provider_setting(self, raw: str, provider: str, model: str) -> int:
+        """Reads a per-deployment limit such as `LLM_RPM`: a bare number
+        applies to every provider, `provider=n` to one provider and
+        `provider:model=n` to one deployment, the most specific entry winning.
+        0 (or no entry) means unlimited."""
+        values: Dict[str, int] = {}
+        for entry in raw.split(","):
+            name, sep, value = entry.partition("=")
+            if not sep:
+                name, value = "", name
+            if value.strip():
+                values[name.strip().lower()] = int(value)
+        for name in (f"{provider}:{model}".lower(), provider.lower(), ""):
+            if name in values:
+                return values[name]
+        return 0
+
+    def near_duplicate_threshold(self) -> float:
+        return self.awfa_near_dup_threshold if self.awfa_near_dup else 0.0
+
 
 @lru_cache
 def get_settings() -> Settings:
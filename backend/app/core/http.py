@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, Tuple
+
+import httpx
+
+from app.core.config import Settings, get_settings
+from app.core.logging import get_logger
+
+logger = get_logger("http")
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class HttpClientPool:
+    """Long-lived, keep-alive httpx clients, one per upstream provider.
+
+    Async clients are bound to the event loop that created them, so each loop
+    (the server's, and the long-lived one each OCR thread keeps) gets its own;
+    sync clients are per process and are used by pipeline workers that run
+    outside the loop.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        self.limits = httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive,
+            keepalive_expiry=settings.http_keepalive_expiry_seconds,
+        )
+        self.http2 = settings.http2_enabled and _http2_available()
+        self._async: Dict[Tuple[str, asyncio.AbstractEventLoop], httpx.AsyncClient] = {}
+        self._sync: Dict[str, httpx.Client] = {}
+        self._lock = threading.Lock()
+
+    def get_async(self, name: str) -> httpx.AsyncClient:
+        key = (name, asyncio.get_running_loop())
+        with self._lock:
+            client = self._async.get(key)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(limits=self.limits, http2=self.http2)
+                self._async[key] = client
+            return client
+
+    def get_sync(self, name: str) -> httpx.Client:
+        with self._lock:
+            client = self._sync.get(name)
+            if client is None or client.is_closed:
+                client = httpx.Client(limits=self.limits, http2=self.http2)
+                self._sync[name] = client
+            return client
+
+    async def astart(self, names: Iterable[str]) -> None:
+        names = sorted(set(names))
+        for name in names:
+            self.get_async(name)
+        logger.info("http_pool_started", extra={"clients": names, "http2": self.http2})
+
+    async def aclose(self) -> None:
+        """Close the clients of the running loop; other loops' are left alone."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            owned = [key for key in self._async if key[1] is loop]
+            clients = [self._async.pop(key) for key in owned]
+        for client in clients:
+            await client.aclose()
+
+    def close(self) -> None:
+        with self._lock:
+            clients, self._sync = self._sync, {}
+        for client in clients.values():
+            client.close()
+
+
+@lru_cache
+def get_http_pool() -> HttpClientPool:
+    return HttpClientPool(get_settings())
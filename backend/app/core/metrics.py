@@ -0,0 +1,224 @@
+"""Prometheus metrics in the text exposition format, without a client library.
+
+Recording is a dict lookup and an add under a per-metric lock, so it is
+cheap enough for every request path. Each process keeps its own values:
+the API serves them on `/metrics`, a queue worker on `WORKER_METRICS_PORT`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+from app.core.logging import get_logger
+
+logger = get_logger("metrics")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Stage latencies run from cached extractions (milliseconds) to OCR-heavy
+# reports and LLM calls (minutes).
+STAGE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self._samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("Counters only go up.")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = STAGE_BUCKETS
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: a count per bucket (the last one is +Inf), and the sum.
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    def count(self, **labels: str) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS: Histogram = REGISTRY.register(
+    Histogram(
+        "axiomesg_stage_seconds",
+        "Pipeline stage latency per job.",
+        ("stage", "ext", "provider"),
+    )
+)
+FILE_EXTRACT_SECONDS: Histogram = REGISTRY.register(
+    Histogram("axiomesg_file_extract_seconds", "Extraction latency per file, cache hits excluded.", ("ext",))
+)
+JOBS: Counter = REGISTRY.register(Counter("axiomesg_jobs_total", "Jobs finished, by outcome.", ("status",)))
+OCR_DOCUMENTS: Counter = REGISTRY.register(
+    Counter("axiomesg_ocr_documents_total", "Documents sent to Azure Document Intelligence.")
+)
+OCR_PAGES: Counter = REGISTRY.register(Counter("axiomesg_ocr_pages_total", "Pages recognised by OCR."))
+CACHE_REQUESTS: Counter = REGISTRY.register(
+    Counter("axiomesg_cache_requests_total", "Extraction and LLM response cache lookups.", ("cache", "result"))
+)
+LLM_TOKENS: Counter = REGISTRY.register(
+    Counter("axiomesg_llm_tokens_total", "Tokens billed by LLM providers.", ("provider", "kind"))
+)
+JOBS_IN_FLIGHT: Gauge = REGISTRY.register(Gauge("axiomesg_jobs_in_flight", "Jobs running in this process."))
+JOB_STORE_SIZE: Gauge = REGISTRY.register(Gauge("axiomesg_job_store_size", "Job records in the job store."))
+
+
+def file_extension(filename: str) -> str:
+    return os.path.splitext(filename)[1].lower().lstrip(".") or "none"
+
+
+def job_extension(filenames: Sequence[str]) -> str:
+    """The label for a job's stages: its files' extension, or `mixed`."""
+    extensions = {file_extension(name) for name in filenames}
+    if len(extensions) == 1:
+        return extensions.pop()
+    return "mixed" if extensions else "none"
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+async def serve_metrics(host: str, port: int) -> asyncio.AbstractServer:
+    """A minimal HTTP endpoint for processes without the API, such as queue
+    workers: every request gets the current metrics."""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            # Only the request head matters; drain it up to the blank line.
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            body = render().encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: " + CONTENT_TYPE.encode()
+                + b"\r\nContent-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info("metrics_listening", extra={"host": host, "port": port})
+    return server
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from app.core.config import get_settings
+
+
+@dataclass
+class QueueMessage:
+    """A leased job. `receipt` identifies this lease: once the visibility
+    timeout lapses the job is handed out again under a new receipt, and
+    `ack`/`extend`/`release` for the stale one are ignored."""
+
+    id: str
+    job_id: str
+    payload: Dict[str, Any] = field(default_factory=dict)
+    attempts: int = 0
+    receipt: str = ""
+
+
+class SqliteJobQueue:
+    """Durable queue in a local SQLite file; needs no outside service.
+
+    A reserved row stays in the table with `visible_at` pushed out by the
+    visibility timeout, so a job whose worker dies is delivered again.
+    """
+
+    def __init__(self, path: str, visibility_timeout: float, max_attempts: int) -> None:
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS job_queue (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    visible_at REAL NOT NULL,
+                    receipt TEXT,
+                    dead INTEGER NOT NULL DEFAULT 0,
+                    error TEXT
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS job_queue_ready ON job_queue (dead, visible_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def enqueue(self, job_id: str, payload: Dict[str, Any]) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO job_queue (job_id, payload, visible_at) VALUES (?, ?, ?)",
+                (job_id, json.dumps(payload), time.time()),
+            )
+
+    def reserve(self) -> Optional[QueueMessage]:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, job_id, payload, attempts FROM job_queue"
+                " WHERE dead = 0 AND visible_at <= ? ORDER BY id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            receipt = uuid.uuid4().hex
+            conn.execute(
+                "UPDATE job_queue SET attempts = attempts + 1, visible_at = ?, receipt = ? WHERE id = ?",
+                (now + self.visibility_timeout, receipt, row[0]),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return QueueMessage(str(row[0]), row[1], json.loads(row[2]), row[3] + 1, receipt)
+
+    def _leased(self, message: QueueMessage, sql: str, *params: Any) -> bool:
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                f"{sql} WHERE id = ? AND receipt = ?", (*params, int(message.id), message.receipt)
+            )
+            return cursor.rowcount > 0
+
+    def ack(self, message: QueueMessage) -> bool:
+        return self._leased(message, "DELETE FROM job_queue")
+
+    def extend(self, message: QueueMessage) -> bool:
+        return self._leased(
+            message, "UPDATE job_queue SET visible_at = ?", time.time() + self.visibility_timeout
+        )
+
+    def release(self, message: QueueMessage, delay: float = 0.0) -> bool:
+        """Give the job back to be retried after `delay` seconds."""
+        return self._leased(
+            message, "UPDATE job_queue SET visible_at = ?, receipt = NULL", time.time() + delay
+        )
+
+    def dead_letter(self, message: QueueMessage, error: str) -> bool:
+        """Park a job that will not be retried; the row is kept for inspection."""
+        return self._leased(message, "UPDATE job_queue SET dead = 1, error = ?, receipt = NULL", error)
+
+    def close(self) -> None:
+        pass
+
+
+# KEYS: ready list, delayed zset, leases zset. ARGV: now, visibility timeout,
+# receipt, message key prefix. Expired leases go back to the front of the
+# ready list, due retries to the back; then one job is leased.
+_RESERVE = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[1])
+for _, id in ipairs(expired) do
+    redis.call('ZREM', KEYS[3], id)
+    redis.call('RPUSH', KEYS[1], id)
+end
+local due = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, id in ipairs(due) do
+    redis.call('ZREM', KEYS[2], id)
+    redis.call('LPUSH', KEYS[1], id)
+end
+local id = redis.call('RPOP', KEYS[1])
+if not id then
+    return false
+end
+local key = ARGV[4] .. id
+redis.call('ZADD', KEYS[3], tonumber(ARGV[1]) + tonumber(ARGV[2]), id)
+local attempts = redis.call('HINCRBY', key, 'attempts', 1)
+redis.call('HSET', key, 'receipt', ARGV[3])
+return {id, redis.call('HGET', key, 'job_id'), redis.call('HGET', key, 'payload'), attempts}
+"""
+
+# KEYS: message hash, leases zset, target (unused for ack/extend). ARGV: id,
+# receipt, action, score or error.
+_SETTLE = """
+if redis.call('HGET', KEYS[1], 'receipt') ~= ARGV[2] then
+    return 0
+end
+if ARGV[3] == 'extend' then
+    redis.call('ZADD', KEYS[2], ARGV[4], ARGV[1])
+    return 1
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+if ARGV[3] == 'ack' then
+    redis.call('DEL', KEYS[1])
+elseif ARGV[3] == 'release' then
+    redis.call('HDEL', KEYS[1], 'receipt')
+    redis.call('ZADD', KEYS[3], ARGV[4], ARGV[1])
+else
+    redis.call('HDEL', KEYS[1], 'receipt')
+    redis.call('HSET', KEYS[1], 'error', ARGV[4])
+    redis.call('LPUSH', KEYS[3], ARGV[1])
+end
+return 1
+"""
+
+
+class RedisJobQueue:
+    """Reliable queue on Redis: a ready list, a lease zset scored by deadline
+    and a delayed zset for backed-off retries, moved atomically by scripts."""
+
+    prefix = "queue:"
+
+    def __init__(self, redis_url: str, visibility_timeout: float, max_attempts: int) -> None:
+        import redis
+
+        self.redis = redis.from_url(redis_url, decode_responses=True)
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._ready = self.prefix + "ready"
+        self._delayed = self.prefix + "delayed"
+        self._leases = self.prefix + "leases"
+        self._dead = self.prefix + "dead"
+        self._reserve = self.redis.register_script(_RESERVE)
+        self._settle = self.redis.register_script(_SETTLE)
+
+    def _key(self, message_id: str) -> str:
+        return f"{self.prefix}msg:{message_id}"
+
+    def enqueue(self, job_id: str, payload: Dict[str, Any]) -> None:
+        pipe = self.redis.pipeline()
+        pipe.hset(self._key(job_id), mapping={"job_id": job_id, "payload": json.dumps(payload), "attempts": 0})
+        pipe.lpush(self._ready, job_id)
+        pipe.execute()
+
+    def reserve(self) -> Optional[QueueMessage]:
+        receipt = uuid.uuid4().hex
+        leased = self._reserve(
+            keys=[self._ready, self._delayed, self._leases],
+            args=[time.time(), self.visibility_timeout, receipt, self.prefix + "msg:"],
+        )
+        if not leased:
+            return None
+        message_id, job_id, payload, attempts = leased
+        return QueueMessage(message_id, job_id, json.loads(payload), int(attempts), receipt)
+
+    def _apply(self, message: QueueMessage, action: str, target: str, value: Any = "") -> bool:
+        return bool(
+            self._settle(
+                keys=[self._key(message.id), self._leases, target],
+                args=[message.id, message.receipt, action, value],
+            )
+        )
+
+    def ack(self, message: QueueMessage) -> bool:
+        return self._apply(message, "ack", self._leases)
+
+    def extend(self, message: QueueMessage) -> bool:
+        return self._apply(message, "extend", self._leases, time.time() + self.visibility_timeout)
+
+    def release(self, message: QueueMessage, delay: float = 0.0) -> bool:
+        return self._apply(message, "release", self._delayed, time.time() + delay)
+
+    def dead_letter(self, message: QueueMessage, error: str) -> bool:
+        return self._apply(message, "dead", self._dead, error)
+
+    def close(self) -> None:
+        self.redis.close()
+
+
+@lru_cache
+def get_job_queue():
+    settings = get_settings()
+    backend = (settings.queue_backend or ("redis" if settings.redis_url else "sqlite")).lower()
+    if backend == "redis":
+        return RedisJobQueue(
+            settings.redis_url, settings.queue_visibility_timeout_seconds, settings.queue_max_attempts
+        )
+    if backend == "sqlite":
+        return SqliteJobQueue(
+            os.path.join(settings.state_dir, "queue.db"),
+            settings.queue_visibility_timeout_seconds,
+            settings.queue_max_attempts,
+        )
+    raise ValueError(f"Unsupported QUEUE_BACKEND: {settings.queue_backend}")
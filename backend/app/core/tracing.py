@@ -0,0 +1,288 @@
+"""Lightweight tracing: nested spans per job, per file and per external call.
+
+A span is opened with `span(name, **attributes)` and nests under the one
+open in the current context (asyncio tasks inherit it). A span opened with
+`job_id=` and no parent starts the job's trace, whose ID is derived from the
+job ID, so every process that works on a job lands in the same trace. The
+parent span crosses process boundaries as a W3C `traceparent` string:
+`traceparent()` on one side, `attach()` on the other.
+
+Finished spans go to the exporters named in `TRACING_EXPORTERS`: `memory`
+(a ring buffer served at `/api/debug/traces`), `otlp_file` (OTLP/JSON lines
+in `TRACE_FILE_PATH`), or `package.module:factory` for a custom one. Pool
+workers wrap their work in `collect()` and hand the spans back to the parent
+process, which exports them.
+"""
+
+from __future__ import annotations
+
+import importlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Deque, Dict, Iterator, List, Optional, Protocol, Tuple
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+
+logger = get_logger("tracing")
+
+SpanDict = Dict[str, Any]
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str = ""
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: str = ""
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def add(self, key: str, amount: int = 1) -> None:
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def to_dict(self) -> SpanDict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": dict(self.attributes),
+            "error": self.error,
+        }
+
+
+class SpanExporter(Protocol):
+    def export(self, spans: List[SpanDict]) -> None:
+        ...
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+# (trace_id, span_id) of a parent span in another process.
+_remote: ContextVar[Optional[Tuple[str, str]]] = ContextVar("trace_remote", default=None)
+_collector: ContextVar[Optional[List[SpanDict]]] = ContextVar("trace_collector", default=None)
+
+
+def job_trace_id(job_id: str) -> str:
+    try:
+        return uuid.UUID(job_id).hex
+    except ValueError:
+        return uuid.uuid5(uuid.NAMESPACE_URL, job_id).hex
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def set_attributes(**attributes: Any) -> None:
+    """Set attributes on the open span, if any."""
+    current = _current.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def add_attribute(key: str, amount: int = 1) -> None:
+    """Add to a counting attribute (e.g. `retries`) of the open span, if any."""
+    current = _current.get()
+    if current is not None:
+        current.add(key, amount)
+
+
+@contextmanager
+def span(name: str, job_id: Optional[str] = None, **attributes: Any) -> Iterator[Span]:
+    parent = _current.get()
+    if parent is not None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    elif _remote.get() is not None:
+        trace_id, parent_id = _remote.get()
+    else:
+        trace_id, parent_id = (job_trace_id(job_id) if job_id else uuid.uuid4().hex), ""
+    if job_id:
+        attributes["job_id"] = job_id
+    opened = Span(name, trace_id, uuid.uuid4().hex[:16], parent_id, attributes=attributes)
+    token = _current.set(opened)
+    try:
+        yield opened
+    except BaseException as exc:
+        opened.error = str(exc) or type(exc).__name__
+        raise
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Closed from another context, e.g. an abandoned generator
+            # finalised elsewhere.
+            _current.set(parent)
+        opened.end_ns = time.time_ns()
+        _finish(opened.to_dict())
+
+
+def traceparent() -> Optional[str]:
+    """The open span as a W3C `traceparent` header value, to hand to another process."""
+    current = _current.get()
+    if current is not None:
+        return f"00-{current.trace_id}-{current.span_id}-01"
+    remote = _remote.get()
+    return f"00-{remote[0]}-{remote[1]}-01" if remote else None
+
+
+@contextmanager
+def attach(parent: Optional[str]) -> Iterator[None]:
+    """Open spans under `parent`, a `traceparent` from another process."""
+    match = _TRACEPARENT.match(parent or "")
+    if match is None:
+        yield
+        return
+    token = _remote.set((match.group(1), match.group(2)))
+    try:
+        yield
+    finally:
+        _remote.reset(token)
+
+
+@contextmanager
+def collect() -> Iterator[List[SpanDict]]:
+    """Keep spans finished in this context instead of exporting them, so a
+    pool worker can return them to the process that owns the exporters."""
+    spans: List[SpanDict] = []
+    token = _collector.set(spans)
+    try:
+        yield spans
+    finally:
+        _collector.reset(token)
+
+
+def _finish(finished: SpanDict) -> None:
+    collector = _collector.get()
+    if collector is not None:
+        collector.append(finished)
+    else:
+        export([finished])
+
+
+def export(spans: List[SpanDict]) -> None:
+    """Send finished spans to every configured exporter; exporter errors are logged, not raised."""
+    collector = _collector.get()
+    if collector is not None:
+        collector.extend(spans)
+        return
+    for exporter in get_exporters():
+        try:
+            exporter.export(spans)
+        except Exception as exc:
+            logger.warning("trace_export_failed", extra={"exporter": type(exporter).__name__, "error": str(exc)})
+
+
+class RingBufferExporter:
+    """The last `max_spans` spans of this process, for the debug endpoint."""
+
+    def __init__(self, max_spans: int) -> None:
+        self._spans: Deque[SpanDict] = deque(maxlen=max(1, max_spans))
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[SpanDict]) -> None:
+        with self._lock:
+            self._spans.extend(spans)
+
+    def spans(self, trace_id: Optional[str] = None) -> List[SpanDict]:
+        with self._lock:
+            spans = list(self._spans)
+        return [s for s in spans if trace_id is None or s["trace_id"] == trace_id]
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_span(finished: SpanDict) -> Dict[str, Any]:
+    span_json: Dict[str, Any] = {
+        "traceId": finished["trace_id"],
+        "spanId": finished["span_id"],
+        "name": finished["name"],
+        "kind": 1,
+        "startTimeUnixNano": str(finished["start_ns"]),
+        "endTimeUnixNano": str(finished["end_ns"]),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in finished["attributes"].items()],
+        "status": {"code": 2, "message": finished["error"]} if finished["error"] else {"code": 1},
+    }
+    if finished["parent_id"]:
+        span_json["parentSpanId"] = finished["parent_id"]
+    return span_json
+
+
+class OTLPFileExporter:
+    """Appends one OTLP/JSON `ExportTraceServiceRequest` per batch, one per
+    line, which the OpenTelemetry Collector's `otlpjsonfile` receiver reads.
+    Lines are single appends, so several processes can share the file."""
+
+    def __init__(self, path: str, service_name: str = "axiomesg") -> None:
+        self.path = path
+        self.service_name = service_name
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, spans: List[SpanDict]) -> None:
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": _otlp_value(self.service_name)}]},
+                    "scopeSpans": [{"scope": {"name": "app.core.tracing"}, "spans": [otlp_span(s) for s in spans]}],
+                }
+            ]
+        }
+        line = (json.dumps(request, separators=(",", ":")) + "\n").encode()
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+
+@lru_cache
+def get_exporters() -> Tuple[SpanExporter, ...]:
+    settings = get_settings()
+    exporters: List[SpanExporter] = []
+    for name in (n.strip() for n in settings.tracing_exporters.split(",")):
+        if not name:
+            continue
+        if name == "memory":
+            exporters.append(RingBufferExporter(settings.trace_buffer_spans))
+        elif name == "otlp_file":
+            path = settings.trace_file_path or os.path.join(settings.state_dir, "traces.jsonl")
+            exporters.append(OTLPFileExporter(path))
+        else:
+            module, _, attr = name.partition(":")
+            if not attr:
+                raise ValueError(f"Unsupported tracing exporter: {name}")
+            exporters.append(getattr(importlib.import_module(module), attr)())
+    return tuple(exporters)
+
+
+def ring_buffer() -> Optional[RingBufferExporter]:
+    return next((e for e in get_exporters() if isinstance(e, RingBufferExporter)), None)
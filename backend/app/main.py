@@ -1,17 +1,44 @@
 from __future__ import annotations
 
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.api.events import get_event_bus
 from app.api.routes import router
 from app.core.config import get_settings
+from app.core.http import get_http_pool
 from app.core.logging import configure_logging
+from app.core.queue import get_job_queue
+from app.pipeline.executor import get_pipeline_executor
+from app.pipeline.extractor import shutdown_extraction_pool
 
 
 settings = get_settings()
 configure_logging(settings.log_level)
 
-app = FastAPI(title="AxiomESG", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    executor = get_pipeline_executor()
+    http_pool = get_http_pool()
+    clients = settings.llm_provider_names()
+    if settings.azure_docintel_endpoint:
+        clients.append("azure_docintel")
+    await http_pool.astart(clients)
+    yield
+    await asyncio.to_thread(executor.shutdown)
+    await asyncio.to_thread(shutdown_extraction_pool)
+    await http_pool.aclose()
+    http_pool.close()
+    await get_event_bus().aclose()
+    if settings.queue_enabled():
+        get_job_queue().close()
+
+
+app = FastAPI(title="AxiomESG", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -1,42 +1,341 @@
 from __future__ import annotations
 
+import hashlib
+import heapq
 import re
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+_NON_WORD = re.compile(r"[^a-z0-9\s]+")
 
 
 def _normalize(text: str) -> str:
-    text = text.lower()
-    text = re.sub(r"[^a-z0-9\s]", "", text)
-    return re.sub(r"\s+", " ", text).strip()
+    # split/join collapses the same (Unicode) whitespace as `\s+`.
+    return " ".join(_NON_WORD.sub("", text.lower()).split())
 
 
-def _weight(sentence: str, category: str) -> float:
+_WEIGHT_KEYWORDS = {
+    "E": ("emission", "carbon", "climate", "energy", "water", "waste"),
+    "S": ("diversity", "inclusion", "safety", "labor", "community", "privacy"),
+    "G": ("governance", "board", "ethics", "compliance", "audit", "risk"),
+}
+# Length stops adding weight at 120 characters (120 / 200 == 0.6).
+_LENGTH_CAP = 120
+
+
+def _combine(length: int, hits: int) -> float:
     base = 0.4
-    length_bonus = min(len(sentence) / 200.0, 0.6)
+    length_bonus = min(length / 200.0, 0.6)
     keyword_bonus = 0.0
-    lowered = sentence.lower()
-    if category == "E":
-        keywords = ["emission", "carbon", "climate", "energy", "water", "waste"]
-    elif category == "S":
-        keywords = ["diversity", "inclusion", "safety", "labor", "community", "privacy"]
-    else:
-        keywords = ["governance", "board", "ethics", "compliance", "audit", "risk"]
-    for kw in keywords:
-        if kw in lowered:
-            keyword_bonus += 0.1
+    for _ in range(hits):
+        keyword_bonus += 0.1
     return round(min(base + length_bonus + keyword_bonus, 1.0), 3)
 
 
-def apply_awfa(category_sentences: Dict[str, List[str]]) -> List[Tuple[str, str, float]]:
+def _weight(sentence: str, category: str) -> float:
+    lowered = sentence.lower()
+    keywords = _WEIGHT_KEYWORDS.get(category, _WEIGHT_KEYWORDS["G"])
+    return _combine(len(sentence), sum(kw in lowered for kw in keywords))
+
+
+# Every weight `_weight` can return, indexed by [min(length, cap), hits]; built
+# with the same arithmetic, so table lookups are bit-identical to it.
+_WEIGHT_TABLE = np.array(
+    [
+        [_combine(length, hits) for hits in range(max(map(len, _WEIGHT_KEYWORDS.values())) + 1)]
+        for length in range(_LENGTH_CAP + 1)
+    ]
+)
+
+
+def weigh_batch(sentences: Sequence[str], categories: Sequence[str]) -> np.ndarray:
+    """`_weight` for many sentences at once, as a float64 array.
+
+    Lengths and the final weights are NumPy operations; keyword presence is
+    one `in` test per keyword over the category's sentences, which measured
+    faster than `np.strings.find`.
+    """
+    n = len(sentences)
+    lengths = np.fromiter(map(len, sentences), dtype=np.int64, count=n)
+    labels = np.array(categories, dtype=object)
+    lowered = [sentence.lower() for sentence in sentences]
+    hits = np.zeros(n, dtype=np.int64)
+    for category, keywords in _WEIGHT_KEYWORDS.items():
+        if category == "G":
+            index = np.flatnonzero((labels != "E") & (labels != "S"))
+        else:
+            index = np.flatnonzero(labels == category)
+        if not index.size:
+            continue
+        group = [lowered[i] for i in index]
+        for kw in keywords:
+            hits[index] += np.fromiter((kw in text for text in group), dtype=np.int64, count=len(group))
+    return _WEIGHT_TABLE[np.minimum(lengths, _LENGTH_CAP), hits]
+
+
+def _text(sentence: Any) -> str:
+    return sentence if isinstance(sentence, str) else sentence.text
+
+
+def _bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    # LSH candidates pass at roughly (1/bands)^(1/rows); take the highest such
+    # point not above the threshold so verification, not banding, decides.
+    layouts = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    below = [(b, r) for b, r in layouts if (1 / b) ** (1 / r) <= threshold]
+    if not below:
+        return layouts[0]
+    return max(below, key=lambda layout: (1 / layout[0]) ** (1 / layout[1]))
+
+
+class NearDuplicateIndex:
+    """MinHash/LSH index over character shingles of normalized sentences.
+
+    Signatures use one-permutation hashing: each shingle is hashed once and
+    lands in one of `num_perm` bins, and empty bins borrow from the next
+    filled one. That keeps signing O(shingles) and fully vectorized; `add`
+    then touches only the LSH buckets of its bands, so deduplicating n
+    sentences stays close to O(n). Candidates are confirmed by signature
+    agreement against `threshold`.
+    """
+
+    def __init__(self, threshold: float, num_perm: int = 64, shingle: int = 5, seed: int = 1) -> None:
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle = shingle
+        self.bands, self.rows = _bands(threshold, num_perm)
+        rng = np.random.default_rng(seed)
+        self._salt = rng.integers(0, 2**32, dtype=np.uint32)
+        self._band_mix = rng.integers(1, 2**63, size=self.rows, dtype=np.uint64) | np.uint64(1)
+        self._buckets: List[Dict[int, Any]] = [{} for _ in range(self.bands)]
+        self._signatures = np.empty((0, num_perm), dtype=np.uint64)
+        self._size = 0
+
+    def _shingle_hashes(self, keys: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        k = self.shingle
+        encoded = [key.encode("utf-8").ljust(k) for key in keys]
+        lengths = np.fromiter((len(key) for key in encoded), dtype=np.int64, count=len(encoded))
+        buf = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint32)
+        span = len(buf) - k + 1
+        hashes = np.full(span, self._salt, dtype=np.uint32)
+        for j in range(k):
+            hashes *= np.uint32(16777619)
+            hashes ^= buf[j : j + span]
+        # Drop the k-1 shingles that straddle each pair of keys, then mix.
+        ends = np.cumsum(lengths)
+        keep = np.ones(span, dtype=bool)
+        keep[(ends[:-1, None] - np.arange(1, k)).ravel()] = False
+        hashes = hashes[keep]
+        hashes ^= hashes >> np.uint32(16)
+        hashes *= np.uint32(0x85EBCA6B)
+        hashes ^= hashes >> np.uint32(13)
+        hashes *= np.uint32(0xC2B2AE35)
+        hashes ^= hashes >> np.uint32(16)
+        return hashes, np.repeat(np.arange(len(encoded)), lengths - k + 1)
+
+    def signatures(self, keys: Sequence[str]) -> np.ndarray:
+        """MinHash signatures, one row per normalized key."""
+        n, bins = len(keys), self.num_perm
+        if not n:
+            return np.empty((0, bins), dtype=np.uint64)
+        hashes, owner = self._shingle_hashes(keys)
+        empty = np.uint64(1 << 32)
+        owner *= bins
+        owner += hashes % np.uint32(bins)
+        signatures = np.full(n * bins, empty, dtype=np.uint64)
+        # Same dtype on both sides keeps ufunc.at on its fast path.
+        np.minimum.at(signatures, owner, hashes.astype(np.uint64))
+        signatures = signatures.reshape(n, bins)
+        # Densify: an empty bin takes the next filled bin's value, offset by
+        # the distance so borrowed values only match identically placed ones.
+        filled = np.tile(signatures != empty, 2)
+        positions = np.where(filled, np.arange(2 * bins), 4 * bins)
+        donor = np.minimum.accumulate(positions[:, ::-1], axis=1)[:, ::-1][:, :bins]
+        distance = (donor - np.arange(bins)).astype(np.uint64)
+        return np.take_along_axis(signatures, donor % bins, axis=1) + distance * empty
+
+    def _band_keys(self, signatures: np.ndarray) -> List[List[int]]:
+        bands = signatures.reshape(len(signatures), self.bands, self.rows) * self._band_mix
+        return bands.sum(axis=2, dtype=np.uint64).tolist()
+
+    def _insert(self, signature: np.ndarray, band_keys: List[int]) -> bool:
+        candidates = set()
+        for members in map(dict.get, self._buckets, band_keys):
+            if members is None:
+                continue
+            if isinstance(members, list):
+                candidates.update(members)
+            else:
+                candidates.add(members)
+        if candidates:
+            agreement = np.count_nonzero(self._signatures[list(candidates)] == signature, axis=1)
+            if agreement.max() >= self.threshold * self.num_perm:
+                return True
+        index = self._size
+        if index == len(self._signatures):
+            grown = np.empty((max(64, 2 * index), self.num_perm), dtype=np.uint64)
+            grown[:index] = self._signatures
+            self._signatures = grown
+        self._signatures[index] = signature
+        self._size += 1
+        # Almost every bucket holds one sentence, so singletons are stored bare.
+        for buckets, key in zip(self._buckets, band_keys):
+            members = buckets.get(key)
+            if members is None:
+                buckets[key] = index
+            elif isinstance(members, list):
+                members.append(index)
+            else:
+                buckets[key] = [members, index]
+        return False
+
+    def add(self, key: str) -> bool:
+        """Index `key` unless a near duplicate is already indexed.
+
+        Returns True when it was a near duplicate (and so was not indexed).
+        """
+        return self.add_many([key])[0]
+
+    def add_many(self, keys: Sequence[str]) -> List[bool]:
+        signatures = self.signatures(keys)
+        return [
+            self._insert(signature, band_keys)
+            for signature, band_keys in zip(signatures, self._band_keys(signatures))
+        ]
+
+
+def _dedup(category_sentences: Dict[str, List[Any]], near_duplicate_threshold: float) -> List[Tuple[str, Any, str]]:
     seen = set()
-    weighted: List[Tuple[str, str, float]] = []
+    unique: List[Tuple[str, Any, str]] = []
+    keys: List[str] = []
     for category, sentences in category_sentences.items():
         for sentence in sentences:
-            key = _normalize(sentence)
+            text = _text(sentence)
+            key = _normalize(text)
             if not key or key in seen:
                 continue
             seen.add(key)
-            weight = _weight(sentence, category)
-            weighted.append((category, sentence, weight))
-    weighted.sort(key=lambda x: (-x[2], x[1]))
+            unique.append((category, sentence, text))
+            keys.append(key)
+    if near_duplicate_threshold > 0 and unique:
+        duplicates = NearDuplicateIndex(near_duplicate_threshold).add_many(keys)
+        unique = [item for item, duplicate in zip(unique, duplicates) if not duplicate]
+    return unique
+
+
+def apply_awfa(
+    category_sentences: Dict[str, List[Any]], near_duplicate_threshold: float = 0.0
+) -> List[Tuple[str, Any, float]]:
+    """Dedup and weight sentences, best first.
+
+    Sentences may be strings or segmented `Sentence`s; each is returned as
+    passed in, so provenance survives weighting. With a threshold in (0, 1]
+    sentences whose MinHash similarity to an earlier one reaches it are also
+    dropped.
+    """
+    unique = _dedup(category_sentences, near_duplicate_threshold)
+    weights = weigh_batch([text for _, _, text in unique], [category for category, _, _ in unique]).tolist()
+    weighted = [(category, sentence, weight) for (category, sentence, _), weight in zip(unique, weights)]
+    weighted.sort(key=lambda x: (-x[2], _text(x[1])))
     return weighted
+
+
+def top_awfa(
+    category_sentences: Dict[str, List[Any]], top_k: int, near_duplicate_threshold: float = 0.0
+) -> Tuple[List[Tuple[str, Any, float]], int]:
+    """`apply_awfa(...)[:top_k]` plus the full weighted count, without a full sort.
+
+    A partition finds the k-th best weight; only sentences at or above it
+    (ties included) are ordered by `(-weight, sentence)`.
+    """
+    unique = _dedup(category_sentences, near_duplicate_threshold)
+    if not unique or top_k <= 0:
+        return [], len(unique)
+    texts = [text for _, _, text in unique]
+    weights = weigh_batch(texts, [category for category, _, _ in unique])
+    if len(unique) > top_k:
+        cutoff = np.partition(weights, len(weights) - top_k)[len(weights) - top_k]
+        candidates = np.flatnonzero(weights >= cutoff).tolist()
+    else:
+        candidates = range(len(unique))
+    values = weights.tolist()
+    best = heapq.nsmallest(top_k, candidates, key=lambda i: (-values[i], texts[i]))
+    return [(unique[i][0], unique[i][1], values[i]) for i in best], len(unique)
+
+
+class _Ranked:
+    """Heap entry ordered worst-first under the `(-weight, sentence)` rule."""
+
+    __slots__ = ("weight", "sentence", "item")
+
+    def __init__(self, weight: float, sentence: str, item: Tuple[Any, ...]) -> None:
+        self.weight = weight
+        self.sentence = sentence
+        self.item = item
+
+    def __lt__(self, other: "_Ranked") -> bool:
+        return (-self.weight, self.sentence) > (-other.weight, other.sentence)
+
+
+class StreamingAWFA:
+    """Incremental `apply_awfa` that only retains the best `top_k` blocks.
+
+    Dedup keys are kept as 8-byte digests so memory grows slowly with the
+    number of unique ESG sentences, not with their length. Near-duplicate
+    checks are batched so signatures are computed vectorized; the outcome is
+    the same as checking one sentence at a time.
+    """
+
+    _NEAR_BATCH = 1024
+
+    def __init__(self, top_k: int, near_duplicate_threshold: float = 0.0) -> None:
+        self.top_k = top_k
+        self._total = 0
+        self._seen: set[bytes] = set()
+        self._heap: List[_Ranked] = []
+        self._near = NearDuplicateIndex(near_duplicate_threshold) if near_duplicate_threshold > 0 else None
+        self._pending: List[Tuple[str, str, Any, str]] = []
+
+    @property
+    def total(self) -> int:
+        self._flush()
+        return self._total
+
+    def add(self, category: str, sentence: str, source: Any = None) -> None:
+        key = _normalize(sentence)
+        if not key:
+            return
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+        if digest in self._seen:
+            return
+        self._seen.add(digest)
+        if self._near is None:
+            self._push(category, sentence, source)
+            return
+        self._pending.append((category, sentence, source, key))
+        if len(self._pending) >= self._NEAR_BATCH:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        duplicates = self._near.add_many([key for _, _, _, key in pending])
+        for (category, sentence, source, _), duplicate in zip(pending, duplicates):
+            if not duplicate:
+                self._push(category, sentence, source)
+
+    def _push(self, category: str, sentence: str, source: Any) -> None:
+        self._total += 1
+        weight = _weight(sentence, category)
+        entry = _Ranked(weight, sentence, (category, sentence, weight, source))
+        if len(self._heap) < self.top_k:
+            heapq.heappush(self._heap, entry)
+        elif self._heap[0] < entry:
+            heapq.heapreplace(self._heap, entry)
+
+    def ranked(self) -> List[Tuple[str, str, float, Any]]:
+        self._flush()
+        entries = sorted(self._heap, key=lambda e: (-e.weight, e.sentence))
+        return [entry.item for entry in entries]
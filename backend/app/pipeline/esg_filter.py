@@ -1,10 +1,15 @@
 from __future__ import annotations
 
 import re
-from typing import Dict, List, Tuple
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from app.core.config import Settings
 
+if TYPE_CHECKING:
+    from app.pipeline.extractor import TextBlock
+
 DEFAULT_E = [
     "emission",
     "carbon",
@@ -43,19 +48,95 @@ DEFAULT_G = [
 ]
 
 
-def _load_keywords(settings: Settings) -> Dict[str, List[str]]:
-    def parse(value: str, fallback: List[str]) -> List[str]:
-        if not value.strip():
-            return fallback
-        return [v.strip().lower() for v in value.split(",") if v.strip()]
+def _parse_keywords(value: str, fallback: List[str]) -> List[str]:
+    if not value.strip():
+        return fallback
+    return [v.strip().lower() for v in value.split(",") if v.strip()]
+
 
+def _load_keywords(settings: Settings) -> Dict[str, List[str]]:
     return {
-        "E": parse(settings.esg_keywords_env, DEFAULT_E),
-        "S": parse(settings.esg_keywords_soc, DEFAULT_S),
-        "G": parse(settings.esg_keywords_gov, DEFAULT_G),
+        "E": _parse_keywords(settings.esg_keywords_env, DEFAULT_E),
+        "S": _parse_keywords(settings.esg_keywords_soc, DEFAULT_S),
+        "G": _parse_keywords(settings.esg_keywords_gov, DEFAULT_G),
     }
 
 
+def _trie_pattern(words: Iterable[str]) -> str:
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        terminal = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not terminal:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        return group + "?" if terminal else group
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Single-pass E/S/G keyword matcher.
+
+    All keywords are compiled into one trie-shaped regex. A zero-width
+    lookahead tries it at every offset and yields the longest keyword starting
+    there; shorter keywords that are prefixes of it are added from a
+    precomputed table, so hits equal the per-keyword substring test.
+    """
+
+    def __init__(self, keywords: Dict[str, List[str]]) -> None:
+        self.keywords = {category: tuple(words) for category, words in keywords.items()}
+        self._owners: Dict[str, Tuple[str, ...]] = {}
+        for category, words in self.keywords.items():
+            for word in words:
+                if word and category not in self._owners.get(word, ()):
+                    self._owners[word] = self._owners.get(word, ()) + (category,)
+        self._prefixes = {
+            word: tuple(other for other in self._owners if word.startswith(other))
+            for word in self._owners
+        }
+        pattern = _trie_pattern(self._owners)
+        self._gate = re.compile(pattern) if self._owners else None
+        self._regex = re.compile("(?=(" + pattern + "))") if self._owners else None
+
+    def match(self, lowered: str) -> Dict[str, List[str]]:
+        hits: Dict[str, List[str]] = {category: [] for category in self.keywords}
+        # Most sentences carry no keyword; a plain search rejects them cheaply.
+        first = self._gate.search(lowered) if self._gate else None
+        if first is None:
+            return hits
+        found = set()
+        for m in self._regex.finditer(lowered, first.start()):
+            found.update(self._prefixes[m.group(1)])
+        for word in sorted(found):
+            for category in self._owners[word]:
+                hits[category].append(word)
+        return hits
+
+
+@lru_cache(maxsize=16)
+def _matcher_for(env: str, soc: str, gov: str) -> KeywordMatcher:
+    return KeywordMatcher(
+        {
+            "E": _parse_keywords(env, DEFAULT_E),
+            "S": _parse_keywords(soc, DEFAULT_S),
+            "G": _parse_keywords(gov, DEFAULT_G),
+        }
+    )
+
+
+def get_keyword_matcher(settings: Settings) -> KeywordMatcher:
+    return _matcher_for(settings.esg_keywords_env, settings.esg_keywords_soc, settings.esg_keywords_gov)
+
+
 def _split_sentences(text: str) -> List[str]:
     text = re.sub(r"\s+", " ", text.strip())
     if not text:
@@ -64,14 +145,106 @@ def _split_sentences(text: str) -> List[str]:
     return [p.strip() for p in parts if p.strip()]
 
 
+_WHITESPACE = re.compile(r"\s+")
+_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+
+@dataclass
+class Sentence:
+    """A segmented sentence and where it came from.
+
+    `start`/`end` index the file's extracted text (blocks joined by newlines);
+    `location` is the page, slide or row the sentence starts on, if known.
+    """
+
+    text: str
+    file: str
+    start: int = 0
+    end: int = 0
+    location: str = ""
+
+
+def _span(buffer: str, start: int, end: int, base: int, file: str, location: str) -> Optional[Sentence]:
+    chunk = buffer[start:end]
+    text = _WHITESPACE.sub(" ", chunk).strip()
+    if not text:
+        return None
+    lead = len(chunk) - len(chunk.lstrip())
+    trail = len(chunk) - len(chunk.rstrip())
+    return Sentence(text, file, base + start + lead, base + end - trail, location)
+
+
+def _cut(carry: str, max_chars: int) -> int:
+    cut = max(carry.rfind(" ", 0, max_chars), carry.rfind("\n", 0, max_chars))
+    return cut if cut > 0 else max_chars
+
+
+def iter_sentences(blocks: Iterable["TextBlock"], max_chars: int = 4000) -> Iterator[Sentence]:
+    """Incremental `_split_sentences` over text blocks, with provenance.
+
+    A sentence never spans two files, and text without terminators is cut at
+    `max_chars` (0 disables the cap) so the carried remainder stays bounded.
+    """
+    current = None
+    carry = ""  # unterminated text, kept verbatim so offsets stay exact
+    carry_start = 0
+    carry_location = ""
+    position = 0
+    for block in blocks:
+        if block.file != current:
+            if carry:
+                sentence = _span(carry, 0, len(carry), carry_start, current, carry_location)
+                if sentence:
+                    yield sentence
+            carry, current, position = "", block.file, 0
+        block_start = position
+        position += len(block.text) + 1
+        if carry:
+            carry = f"{carry}\n{block.text}"
+        elif block.text.strip():
+            carry, carry_start, carry_location = block.text, block_start, block.location
+        else:
+            continue
+        pos = 0
+        for m in _BOUNDARY.finditer(carry):
+            location = carry_location if pos == 0 else block.location
+            sentence = _span(carry, pos, m.start(), carry_start, current, location)
+            if sentence:
+                yield sentence
+            pos = m.end()
+        if pos:
+            carry, carry_start, carry_location = carry[pos:], carry_start + pos, block.location
+        while max_chars and len(carry) > max_chars:
+            cut = _cut(carry, max_chars)
+            sentence = _span(carry, 0, cut, carry_start, current, carry_location)
+            if sentence:
+                yield sentence
+            carry, carry_start, carry_location = carry[cut:], carry_start + cut, block.location
+    if carry:
+        sentence = _span(carry, 0, len(carry), carry_start, current, carry_location)
+        if sentence:
+            yield sentence
+
+
+def iter_esg_sentences(
+    sentences: Iterable[Sentence], settings: Settings
+) -> Iterator[Tuple[str, Sentence]]:
+    matcher = get_keyword_matcher(settings)
+    for sentence in sentences:
+        hits = matcher.match(sentence.text.lower())
+        for category in ("E", "S", "G"):
+            if hits[category]:
+                yield category, sentence
+
+
 def filter_esg_sentences(text: str, settings: Settings) -> Dict[str, List[str]]:
-    keywords = _load_keywords(settings)
+    matcher = get_keyword_matcher(settings)
     sentences = _split_sentences(text)
     result: Dict[str, List[str]] = {"E": [], "S": [], "G": []}
     for sentence in sentences:
-        lowered = sentence.lower()
+        hits = matcher.match(sentence.lower())
         for category in ("E", "S", "G"):
-            if any(k in lowered for k in keywords[category]):
+            if hits[category]:
                 result[category].append(sentence)
     return result
 
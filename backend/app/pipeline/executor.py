@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import multiprocessing
+import pickle
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from tenacity import RetryError
+
+from app.core import tracing
+from app.core.config import Settings, get_settings
+from app.core.logging import get_logger
+from app.pipeline import extractor
+from app.pipeline.orchestrator import PreparedRun, complete_run_async, prepare_run
+from app.pipeline.schema import ESGOutput
+from app.pipeline.storage import Source
+
+
+logger = get_logger("executor")
+
+StageCallback = Callable[[str, int], None]
+SectionCallback = Callable[[str, Dict[str, Any]], None]
+
+_worker_progress = None
+# Progress-queue stage marker for a batch of spans finished in a worker.
+_SPANS = "__spans__"
+
+
+def _init_worker(progress_queue) -> None:
+    global _worker_progress
+    _worker_progress = progress_queue
+    # PIPELINE_WORKERS processes each with an extraction pool of their own
+    # would multiply the process count; the pipeline pool is the parallelism.
+    extractor._mark_pool_worker()
+
+
+def _prepare_in_worker(
+    files: List[Tuple[str, Source, str | None]], settings: Settings, job_id: str, parent: Optional[str] = None
+) -> PreparedRun:
+    def stage_callback(stage: str, progress: int) -> None:
+        if _worker_progress is not None:
+            _worker_progress.put((job_id, stage, progress))
+
+    with tracing.attach(parent), tracing.collect() as spans:
+        try:
+            return prepare_run(files, settings, job_id, stage_callback)
+        except Exception as exc:
+            raise _portable_error(exc) from None
+        finally:
+            # Progress and spans travel on their own queue; the last marker
+            # tells the parent that every update for the job has been flushed
+            # ahead of the result.
+            if _worker_progress is not None:
+                if spans:
+                    _worker_progress.put((job_id, _SPANS, spans))
+                _worker_progress.put((job_id, None, 0))
+
+
+def _portable_error(exc: BaseException) -> BaseException:
+    if isinstance(exc, RetryError) and exc.last_attempt.failed:
+        exc = exc.last_attempt.exception()
+    try:
+        pickle.loads(pickle.dumps(exc))
+        return exc
+    except Exception:
+        return RuntimeError(str(exc))
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class PipelineExecutor:
+    """Runs the CPU-bound pipeline stages off the event loop, in threads or a
+    bounded process pool; the LLM stage then awaits the shared async clients."""
+
+    def __init__(self, mode: str, max_workers: int) -> None:
+        self.mode = mode.lower()
+        if self.mode not in ("thread", "process"):
+            raise ValueError(f"Unsupported PIPELINE_EXECUTION: {mode}")
+        self.max_workers = max(1, max_workers)
+        self._callbacks: Dict[str, Tuple[asyncio.AbstractEventLoop, StageCallback, asyncio.Future]] = {}
+        self._pool: Optional[Executor] = None
+        self._progress = None
+        self._listener: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_pool(self) -> Executor:
+        with self._lock:
+            if self._pool is None and self.mode == "thread":
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="pipeline"
+                )
+            elif self._pool is None:
+                ctx = multiprocessing.get_context("spawn")
+                self._progress = ctx.Queue()
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=ctx,
+                    initializer=_init_worker,
+                    initargs=(self._progress,),
+                )
+                self._listener = threading.Thread(
+                    target=self._drain_progress, name="pipeline-progress", daemon=True
+                )
+                self._listener.start()
+            return self._pool
+
+    def _drain_progress(self) -> None:
+        while True:
+            item = self._progress.get()
+            if item is None:
+                return
+            job_id, stage, progress = item
+            if stage == _SPANS:
+                tracing.export(progress)
+                continue
+            target = self._callbacks.get(job_id)
+            if not target:
+                continue
+            loop, callback, flushed = target
+            try:
+                if stage is None:
+                    loop.call_soon_threadsafe(_resolve, flushed)
+                else:
+                    loop.call_soon_threadsafe(callback, stage, progress)
+            except RuntimeError:
+                continue
+
+    async def run(
+        self,
+        files: List[Tuple[str, Source, str | None]],
+        settings: Settings,
+        job_id: str,
+        stage_callback: Optional[StageCallback] = None,
+        bypass_cache: bool = False,
+        section_callback: Optional[SectionCallback] = None,
+    ) -> Tuple[ESGOutput, str, Dict[str, Any]]:
+        prepared = await self.prepare(files, settings, job_id, stage_callback)
+        return await complete_run_async(
+            prepared, settings, job_id, stage_callback, bypass_cache, section_callback
+        )
+
+    async def prepare(
+        self,
+        files: List[Tuple[str, Source, str | None]],
+        settings: Settings,
+        job_id: str,
+        stage_callback: Optional[StageCallback] = None,
+    ) -> PreparedRun:
+        loop = asyncio.get_running_loop()
+        pool = self._ensure_pool()
+        if self.mode == "thread":
+            def threadsafe_callback(stage: str, progress: int) -> None:
+                if stage_callback:
+                    loop.call_soon_threadsafe(stage_callback, stage, progress)
+
+            # Run in a copy of this context so the job's open span is the parent.
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(
+                pool, context.run, prepare_run, files, settings, job_id, threadsafe_callback
+            )
+
+        parent = tracing.traceparent()
+        if not stage_callback:
+            return await loop.run_in_executor(pool, _prepare_in_worker, files, settings, job_id, parent)
+        flushed = loop.create_future()
+        self._callbacks[job_id] = (loop, stage_callback, flushed)
+        try:
+            prepared = await loop.run_in_executor(pool, _prepare_in_worker, files, settings, job_id, parent)
+            try:
+                await asyncio.wait_for(flushed, timeout=5)
+            except asyncio.TimeoutError:
+                logger.warning("progress_flush_timeout", extra={"job_id": job_id})
+            return prepared
+        except Exception:
+            if not flushed.done():
+                flushed.cancel()
+            raise
+        finally:
+            self._callbacks.pop(job_id, None)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        pool.shutdown(wait=True, cancel_futures=True)
+        if self._progress is not None:
+            self._progress.put(None)
+            if self._listener:
+                self._listener.join(timeout=5)
+            self._progress.close()
+            self._progress = None
+        logger.info("pipeline_executor_stopped", extra={"mode": self.mode})
+
+
+@lru_cache
+def get_pipeline_executor() -> PipelineExecutor:
+    settings = get_settings()
+    return PipelineExecutor(settings.pipeline_execution, settings.pipeline_workers)
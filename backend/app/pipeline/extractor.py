@@ -1,100 +1,808 @@
 from __future__ import annotations
 
+import bisect
 import csv
+import hashlib
 import io
-from typing import Dict, List, Tuple
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from docx import Document
 from PIL import Image
-from pypdf import PdfReader
+from pypdf import PdfReader, PdfWriter
 from pptx import Presentation
 from openpyxl import load_workbook
 
+from app.core import tracing
 from app.core.config import Settings
-from app.pipeline.ocr_azure import azure_read_document
+from app.core.logging import get_logger
+from app.pipeline.ocr_azure import OcrResult, ocr_documents
+from app.pipeline.storage import Source, StoredUpload, open_source, source_bytes, source_size, source_view
 
 
+logger = get_logger("extractor")
+
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".xlsx", ".csv", ".pptx", ".png", ".jpg", ".jpeg"}
 
+# Bump whenever extraction output changes so stale cache entries are ignored.
+EXTRACTOR_VERSION = "4"
+
+
+@dataclass
+class CachedExtraction:
+    """Extracted text plus what is needed to map an offset back to its origin.
+
+    `markers` are `(offset, location)` pairs for paginated formats (PDF pages,
+    slides); line-oriented formats set `unit` instead, with `line_starts`
+    holding the offset of every row or paragraph. OCR output carries neither.
+    """
+
+    text: str
+    ocr_used: bool
+    pages: int = 0
+    markers: List[Tuple[int, str]] = field(default_factory=list)
+    unit: str = ""
+    line_starts: List[int] = field(default_factory=list)
+
+    def location(self, offset: int) -> str:
+        if self.markers:
+            index = bisect.bisect_right(self.markers, (offset, "\uffff")) - 1
+            return self.markers[max(index, 0)][1]
+        if self.unit:
+            line = bisect.bisect_right(self.line_starts, offset)
+            return f"{self.unit} {max(line, 1)}"
+        return ""
+
+    def blocks(self) -> Iterator[Tuple[str, str]]:
+        """Split the text back into the blocks the streaming extractors yield."""
+        if self.markers:
+            bounds = [start for start, _ in self.markers[1:]] + [len(self.text) + 1]
+            for (start, location), stop in zip(self.markers, bounds):
+                yield self.text[start : stop - 1], location
+        elif self.unit:
+            for index, line in enumerate(self.text.split("\n"), start=1):
+                yield line, f"{self.unit} {index}"
+        else:
+            yield self.text, ""
+
+
+class ExtractionCache:
+    """Content-addressed cache of extracted text.
+
+    Entries live in a bounded in-memory LRU and, when `disk_dir` is set, in
+    JSON files that are evicted oldest-first once `disk_max_bytes` is exceeded.
+    """
+
+    def __init__(self, max_entries: int, disk_dir: str = "", disk_max_bytes: int = 0) -> None:
+        self.max_entries = max_entries
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: OrderedDict[str, CachedExtraction] = OrderedDict()
+        self._lock = threading.Lock()
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(source: Source, ext: str, ocr_enabled: bool) -> str:
+        with source_view(source) as view:
+            digest = hashlib.sha256(view).hexdigest()
+        return f"{digest}-{ext.lstrip('.')}-v{EXTRACTOR_VERSION}-{'ocr' if ocr_enabled else 'text'}"
+
+    def get(self, key: str) -> Optional[CachedExtraction]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+        entry = self._disk_get(key)
+        if entry is not None:
+            self._memory_put(key, entry)
+        return entry
+
+    def put(self, key: str, entry: CachedExtraction) -> None:
+        self._memory_put(key, entry)
+        self._disk_put(key, entry)
+
+    def _memory_put(self, key: str, entry: CachedExtraction) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str) -> Optional[CachedExtraction]:
+        if not self.disk_dir:
+            return None
+        path = self.disk_dir / f"{key}.json"
+        try:
+            payload = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return CachedExtraction(
+            text=payload["text"],
+            ocr_used=bool(payload["ocr_used"]),
+            pages=int(payload.get("pages", 0)),
+            markers=[(int(offset), location) for offset, location in payload.get("markers", [])],
+            unit=payload.get("unit", ""),
+            line_starts=[int(offset) for offset in payload.get("line_starts", [])],
+        )
+
+    def _disk_put(self, key: str, entry: CachedExtraction) -> None:
+        if not self.disk_dir or self.disk_max_bytes <= 0:
+            return
+        path = self.disk_dir / f"{key}.json"
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            tmp.write_text(json.dumps(asdict(entry)), encoding="utf-8")
+            os.replace(tmp, path)
+            self._disk_evict()
+        except OSError as exc:
+            logger.warning("extract_cache_write_failed", extra={"error": str(exc)})
+
+    def _disk_evict(self) -> None:
+        entries = []
+        total = 0
+        for path in self.disk_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                path.unlink()
+                total -= size
+            except OSError:
+                continue
+
+
+@lru_cache
+def _cache_for(max_entries: int, disk_dir: str, disk_max_bytes: int) -> ExtractionCache:
+    return ExtractionCache(max_entries, disk_dir, disk_max_bytes)
+
+
+def get_extraction_cache(settings: Settings) -> Optional[ExtractionCache]:
+    if not settings.extract_cache_enabled:
+        return None
+    return _cache_for(
+        settings.extract_cache_max_entries,
+        settings.extract_cache_dir,
+        settings.extract_cache_max_mb * 1024 * 1024,
+    )
+
 
 def _extension(filename: str) -> str:
     dot = filename.lower().rfind(".")
     return filename[dot:] if dot >= 0 else ""
 
 
-def _extract_pdf(data: bytes) -> str:
-    reader = PdfReader(io.BytesIO(data))
-    texts = []
-    for page in reader.pages:
-        page_text = page.extract_text() or ""
-        texts.append(page_text)
-    return "\n".join(t.strip() for t in texts if t.strip())
+def _extract_pdf_pages(reader: PdfReader, start: int, stop: int) -> List[str]:
+    return [(reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+
+def _extract_pdf_shard(source: Source | str, size: int, start: int, stop: int) -> List[str]:
+    # Spooled uploads are reopened by path; in-memory bytes arrive via shared memory.
+    if isinstance(source, StoredUpload):
+        with source.open() as fh:
+            return _extract_pdf_pages(PdfReader(fh), start, stop)
+    shm = shared_memory.SharedMemory(name=source)
+    try:
+        reader = PdfReader(io.BytesIO(shm.buf[:size]))
+        return _extract_pdf_pages(reader, start, stop)
+    finally:
+        shm.close()
+
+
+def _extract_pdf_sharded(source: Source, page_count: int, workers: int, pool_size: int) -> List[str]:
+    shm = None
+    size = source_size(source)
+    handle: Source | str = source
+    if not isinstance(source, StoredUpload):
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        shm.buf[:size] = source
+        handle = shm.name
+    try:
+        step = -(-page_count // workers)
+        bounds = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        pool = _extraction_pool(pool_size)
+        futures = [pool.submit(_extract_pdf_shard, handle, size, a, b) for a, b in bounds]
+        texts: List[str] = []
+        for future in futures:
+            texts.extend(future.result())
+        return texts
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
 
 
-def _extract_docx(data: bytes) -> str:
-    doc = Document(io.BytesIO(data))
+def _join_pages(pages: List[Tuple[str, str]]) -> Tuple[str, List[Tuple[int, str]]]:
+    """Join non-empty `(text, location)` pages with newlines, recording where each starts."""
+    parts: List[str] = []
+    markers: List[Tuple[int, str]] = []
+    offset = 0
+    for text, location in pages:
+        text = text.strip()
+        if not text:
+            continue
+        markers.append((offset, location))
+        parts.append(text)
+        offset += len(text) + 1
+    return "\n".join(parts), markers
+
+
+def _pdf_page_texts(reader: PdfReader, source: Source, settings: Optional[Settings]) -> List[str]:
+    page_count = len(reader.pages)
+    # Pool workers (extraction or pipeline) never shard: that would nest pools.
+    shard_workers = 0 if settings is None or _in_pool_worker else _shard_workers(settings)
+    if shard_workers > 1 and settings.pdf_shard_min_pages <= page_count:
+        return _extract_pdf_sharded(source, page_count, shard_workers, _pool_size(settings))
+    return _extract_pdf_pages(reader, 0, page_count)
+
+
+def _line_starts(text: str) -> List[int]:
+    starts = [0]
+    index = text.find("\n")
+    while index != -1:
+        starts.append(index + 1)
+        index = text.find("\n", index + 1)
+    return starts
+
+
+def _label_pages(texts: List[str]) -> List[Tuple[str, str]]:
+    return [(t, f"page {i}") for i, t in enumerate(texts, start=1)]
+
+
+def _extract_pdf(
+    source: Source, settings: Optional[Settings] = None
+) -> Tuple[str, int, List[Tuple[int, str]]]:
+    with open_source(source) as fh:
+        texts = _pdf_page_texts(PdfReader(fh), source, settings)
+    text, markers = _join_pages(_label_pages(texts))
+    return text, len(texts), markers
+
+
+def _has_images(page) -> bool:
+    resources = page.get("/Resources")
+    xobjects = resources.get_object().get("/XObject") if resources is not None else None
+    if xobjects is None:
+        return False
+    xobjects = xobjects.get_object()
+    return any(xobjects[name].get_object().get("/Subtype") in ("/Image", "/Form") for name in xobjects)
+
+
+def _needs_page_ocr(page, text: str, settings: Settings) -> bool:
+    # A thin text layer over images: a scanned page inside a digital PDF.
+    return 0 < settings.ocr_page_min_chars and len(text.strip()) < settings.ocr_page_min_chars and _has_images(page)
+
+
+def _ocr_page_numbers(reader: PdfReader, texts: List[str], settings: Settings) -> List[int]:
+    return [
+        number
+        for number, text in enumerate(texts, start=1)
+        if _needs_page_ocr(reader.pages[number - 1], text, settings)
+    ]
+
+
+def _sub_pdf(reader: PdfReader, numbers: List[int]) -> bytes:
+    writer = PdfWriter()
+    for number in numbers:
+        writer.add_page(reader.pages[number - 1])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def _extract_docx(source: Source) -> str:
+    with open_source(source) as fh:
+        doc = Document(fh)
     return "\n".join(p.text for p in doc.paragraphs if p.text)
 
 
-def _extract_pptx(data: bytes) -> str:
-    prs = Presentation(io.BytesIO(data))
-    texts: List[str] = []
-    for slide in prs.slides:
-        for shape in slide.shapes:
-            if hasattr(shape, "text"):
-                text = shape.text.strip()
-                if text:
-                    texts.append(text)
-    return "\n".join(texts)
+def _extract_pptx(source: Source) -> Tuple[str, List[Tuple[int, str]]]:
+    with open_source(source) as fh:
+        prs = Presentation(fh)
+    slides: List[Tuple[str, str]] = []
+    for index, slide in enumerate(prs.slides, start=1):
+        texts = [shape.text.strip() for shape in slide.shapes if hasattr(shape, "text")]
+        slides.append(("\n".join(t for t in texts if t), f"slide {index}"))
+    return _join_pages(slides)
 
 
-def _extract_csv(data: bytes) -> str:
-    decoded = data.decode("utf-8", errors="ignore")
+def _extract_csv(source: Source) -> str:
+    decoded = source_bytes(source).decode("utf-8", errors="ignore")
     return decoded
 
 
-def _extract_xlsx(data: bytes) -> str:
-    workbook = load_workbook(io.BytesIO(data), data_only=True)
+def _extract_xlsx(source: Source) -> str:
+    with open_source(source) as fh:
+        workbook = load_workbook(fh, data_only=True)
     sheet = workbook.active
     output = io.StringIO()
-    writer = csv.writer(output)
+    writer = csv.writer(output, lineterminator="\n")
     for row in sheet.iter_rows(values_only=True):
         writer.writerow([cell if cell is not None else "" for cell in row])
     return output.getvalue()
 
 
-def _extract_image(data: bytes) -> None:
-    Image.open(io.BytesIO(data))
+def _extract_image(source: Source) -> None:
+    with open_source(source) as fh:
+        Image.open(fh)
+
+
+def _ocr_enabled(settings: Settings) -> bool:
+    return bool(settings.azure_docintel_endpoint and settings.azure_docintel_key)
+
+
+@dataclass
+class OcrRequest:
+    """Content local extraction could not read; it is OCR'd together with the
+    job's other OCR-bound files once local extraction is done.
+
+    For PDFs, `page_numbers` are the pages to recognize and `page_texts` the
+    text layer of every page; `data` holds a sub-PDF of just those pages, or
+    is None when the whole file goes (scanned documents, images).
+    """
+
+    content_type: str
+    pages: int = 0
+    page_numbers: List[int] = field(default_factory=list)
+    page_texts: List[str] = field(default_factory=list)
+    data: Optional[bytes] = None
+
+    def merge(self, result: OcrResult) -> CachedExtraction:
+        """Put recognized pages back in page order, next to the text pages."""
+        if not self.page_numbers:
+            return CachedExtraction(text=result.content, ocr_used=True)
+        texts = list(self.page_texts) or [""] * self.pages
+        for number, text in zip(self.page_numbers, result.pages):
+            texts[number - 1] = text
+        text, markers = _join_pages(_label_pages(texts))
+        return CachedExtraction(text=text, ocr_used=True, pages=self.pages, markers=markers)
+
+
+def _extract_one(
+    filename: str, data: Source, content_type: str | None, settings: Settings
+) -> CachedExtraction | OcrRequest:
+    ext = _extension(filename)
+    pages = 0
+    markers: List[Tuple[int, str]] = []
+    unit = ""
+    if ext == ".pdf":
+        with open_source(data) as fh:
+            reader = PdfReader(fh)
+            texts = _pdf_page_texts(reader, data, settings)
+            pages = len(texts)
+            extracted, markers = _join_pages(_label_pages(texts))
+            if _ocr_enabled(settings):
+                content_type = content_type or "application/pdf"
+                if len(extracted.strip()) < 200:
+                    return OcrRequest(content_type, pages, list(range(1, pages + 1)))
+                numbers = _ocr_page_numbers(reader, texts, settings)
+                if numbers:
+                    return OcrRequest(content_type, pages, numbers, texts, _sub_pdf(reader, numbers))
+    elif ext == ".docx":
+        extracted, unit = _extract_docx(data), "paragraph"
+    elif ext == ".pptx":
+        extracted, markers = _extract_pptx(data)
+    elif ext == ".csv":
+        extracted, unit = _extract_csv(data), "row"
+    elif ext == ".xlsx":
+        extracted, unit = _extract_xlsx(data), "row"
+    else:
+        _extract_image(data)
+        if not _ocr_enabled(settings):
+            raise ValueError("OCR not configured for image extraction.")
+        return OcrRequest(content_type or "image/png")
+    line_starts = _line_starts(extracted) if unit else []
+    return CachedExtraction(
+        text=extracted, ocr_used=False, pages=pages, markers=markers, unit=unit, line_starts=line_starts
+    )
+
+
+def _extract_timed(
+    filename: str, data: Source, content_type: str | None, settings: Settings, parent: Optional[str] = None
+) -> Tuple[CachedExtraction | OcrRequest | None, Optional[str], float, List[tracing.SpanDict]]:
+    # Runs in pool workers too: errors are returned as text because not every
+    # exception (e.g. tenacity's RetryError) survives pickling, and spans are
+    # returned for the parent process to export.
+    started = time.perf_counter()
+    attributes = {"file_name": filename, "ext": _extension(filename), "bytes": source_size(data)}
+    with tracing.attach(parent), tracing.collect() as spans:
+        with tracing.span("extract_file", **attributes) as span:
+            try:
+                entry = _extract_one(filename, data, content_type, settings)
+            except Exception as exc:
+                span.error = str(exc) or type(exc).__name__
+                return None, span.error, time.perf_counter() - started, spans
+            span.set(pages=entry.pages, needs_ocr=isinstance(entry, OcrRequest))
+            if isinstance(entry, CachedExtraction):
+                span.set(chars=len(entry.text))
+    return entry, None, time.perf_counter() - started, spans
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_in_pool_worker = False
+
+
+def _mark_pool_worker() -> None:
+    """Initializer for processes of the extraction pool and of the
+    process-mode pipeline pool: they extract in-process rather than spawn an
+    extraction pool of their own."""
+    global _in_pool_worker
+    _in_pool_worker = True
+
+
+def _extraction_pool(max_workers: int) -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_mark_pool_worker,
+            )
+        return _pool
+
+
+def _shard_workers(settings: Settings) -> int:
+    return settings.pdf_shard_workers if settings.pdf_shard_min_pages > 0 else 0
+
+
+def _pool_size(settings: Settings) -> int:
+    return max(settings.extract_concurrency, settings.pdf_shard_workers)
+
+
+def shutdown_extraction_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
 
 
 def extract_documents(
-    files: List[Tuple[str, bytes, str | None]], settings: Settings
+    files: List[Tuple[str, Source, str | None]],
+    settings: Settings,
+    stats: Optional[Dict[str, Any]] = None,
 ) -> Tuple[Dict[str, str], bool]:
-    texts: Dict[str, str] = {}
-    ocr_used = False
-    for filename, data, content_type in files:
-        ext = _extension(filename)
-        if ext not in SUPPORTED_EXTENSIONS:
+    entries = extract_document_entries(files, settings, stats)
+    texts = {filename: entry.text for filename, entry in entries.items()}
+    return texts, any(entry.ocr_used for entry in entries.values())
+
+
+def extract_document_entries(
+    files: List[Tuple[str, Source, str | None]],
+    settings: Settings,
+    stats: Optional[Dict[str, Any]] = None,
+) -> Dict[str, CachedExtraction]:
+    """Extract every file, keeping per-file provenance alongside the text."""
+    stats = stats if stats is not None else {}
+    total_bytes = sum(source_size(source) for _, source, _ in files)
+    with tracing.span("extract_documents", files=len(files), bytes=total_bytes) as span:
+        extracted = _extract_entries(files, settings, stats)
+        span.set(
+            cache_hits=stats["cache_hits"],
+            pages=stats.get("pdf_pages", 0),
+            ocr_documents=stats.get("ocr_documents", 0),
+            ocr_pages=stats.get("ocr_pages", 0),
+            errors=len(stats["file_errors"]),
+        )
+        return extracted
+
+
+def _extract_entries(
+    files: List[Tuple[str, Source, str | None]],
+    settings: Settings,
+    stats: Dict[str, Any],
+) -> Dict[str, CachedExtraction]:
+    cache = get_extraction_cache(settings)
+    stats.setdefault("cache_hits", 0)
+    stats.setdefault("cache_misses", 0)
+    file_timings: Dict[str, float] = stats.setdefault("file_timings", {})
+    file_errors: Dict[str, str] = stats.setdefault("file_errors", {})
+
+    for filename, _, _ in files:
+        if _extension(filename) not in SUPPORTED_EXTENSIONS:
             raise ValueError(f"Unsupported file type: {filename}")
 
-        if ext == ".pdf":
-            extracted = _extract_pdf(data)
-            if len(extracted.strip()) < 200 and settings.azure_docintel_endpoint and settings.azure_docintel_key:
-                extracted = azure_read_document(data, content_type or "application/pdf", settings)
-                ocr_used = True
-        elif ext == ".docx":
-            extracted = _extract_docx(data)
-        elif ext == ".pptx":
-            extracted = _extract_pptx(data)
-        elif ext == ".csv":
-            extracted = _extract_csv(data)
-        elif ext == ".xlsx":
-            extracted = _extract_xlsx(data)
+    entries: List[Optional[CachedExtraction]] = [None] * len(files)
+    keys: List[str] = [""] * len(files)
+    pending: List[int] = []
+    duplicates: Dict[int, int] = {}
+    first_pending: Dict[str, int] = {}
+    for index, (filename, data, _) in enumerate(files):
+        if cache:
+            keys[index] = ExtractionCache.key(data, _extension(filename), _ocr_enabled(settings))
+            entries[index] = cache.get(keys[index])
+        if entries[index] is not None:
+            stats["cache_hits"] += 1
+            file_timings[filename] = 0.0
+        elif cache and keys[index] in first_pending:
+            duplicates[index] = first_pending[keys[index]]
+        else:
+            if cache:
+                first_pending[keys[index]] = index
+            pending.append(index)
+
+    workers = 1 if _in_pool_worker else min(settings.extract_concurrency, len(pending))
+    parent = tracing.traceparent()
+    if workers > 1:
+        pool = _extraction_pool(_pool_size(settings))
+        futures = {i: pool.submit(_extract_timed, *files[i], settings, parent) for i in pending}
+        outcomes = {i: future.result() for i, future in futures.items()}
+    else:
+        outcomes = {i: _extract_timed(*files[i], settings, parent) for i in pending}
+
+    ocr_pending: List[Tuple[int, OcrRequest]] = []
+    for index in pending:
+        filename = files[index][0]
+        entry, error, elapsed, spans = outcomes[index]
+        tracing.export(spans)
+        file_timings[filename] = round(elapsed, 3)
+        if error is not None:
+            file_errors[filename] = error
+            logger.warning("file_extract_failed", extra={"file_name": filename, "error": error})
+            continue
+        if entry.pages:
+            stats["pdf_pages"] = stats.get("pdf_pages", 0) + entry.pages
+            stats["pdf_s"] = stats.get("pdf_s", 0.0) + elapsed
+        if isinstance(entry, OcrRequest):
+            ocr_pending.append((index, entry))
+            continue
+        entries[index] = entry
+        if cache:
+            stats["cache_misses"] += 1
+            cache.put(keys[index], entry)
+
+    if ocr_pending:
+        # Every OCR-bound file is submitted at once; the engine bounds concurrency.
+        started = time.perf_counter()
+        documents = [
+            (request.data if request.data is not None else source_bytes(files[index][1]), request.content_type)
+            for index, request in ocr_pending
+        ]
+        results = ocr_documents(documents, settings)
+        elapsed = time.perf_counter() - started
+        stats["ocr_documents"] = stats.get("ocr_documents", 0) + len(ocr_pending)
+        stats["ocr_pages"] = stats.get("ocr_pages", 0) + sum(len(r.page_numbers) for _, r in ocr_pending)
+        stats["ocr_bytes"] = stats.get("ocr_bytes", 0) + sum(len(data) for data, _ in documents)
+        stats["ocr_s"] = round(stats.get("ocr_s", 0.0) + elapsed, 3)
+        for (index, request), result in zip(ocr_pending, results):
+            filename = files[index][0]
+            file_timings[filename] = round(file_timings[filename] + elapsed, 3)
+            if isinstance(result, BaseException):
+                file_errors[filename] = str(result) or type(result).__name__
+                logger.warning("file_extract_failed", extra={"file_name": filename, "error": file_errors[filename]})
+                continue
+            entries[index] = request.merge(result)
+            if cache:
+                stats["cache_misses"] += 1
+                cache.put(keys[index], entries[index])
+
+    for index, original in duplicates.items():
+        filename = files[index][0]
+        entries[index] = entries[original]
+        if entries[index] is None:
+            file_errors[filename] = file_errors[files[original][0]]
         else:
-            _extract_image(data)
-            if settings.azure_docintel_endpoint and settings.azure_docintel_key:
-                extracted = azure_read_document(data, content_type or "image/png", settings)
-                ocr_used = True
-            else:
-                raise ValueError("OCR not configured for image extraction.")
-        texts[filename] = extracted
-    return texts, ocr_used
+            stats["cache_hits"] += 1
+        file_timings[filename] = 0.0
+
+    extracted: Dict[str, CachedExtraction] = {}
+    for (filename, _, _), entry in zip(files, entries):
+        if entry is not None:
+            extracted[filename] = entry
+    if not extracted and file_errors:
+        raise ValueError(next(iter(file_errors.values())))
+    return extracted
+
+
+@dataclass
+class TextBlock:
+    file: str
+    text: str
+    location: str = ""
+
+
+# Streaming extractors yield `(text, location)` pairs; joined with newlines the
+# texts equal what the materialised extractors return, so offsets agree.
+
+
+def _iter_pdf(source: Source) -> Iterator[Tuple[str, str]]:
+    with open_source(source) as fh:
+        for index, page in enumerate(PdfReader(fh).pages, start=1):
+            text = (page.extract_text() or "").strip()
+            if text:
+                yield text, f"page {index}"
+
+
+def _ocr_one(data: bytes, content_type: str, settings: Settings, stats: Dict[str, Any]) -> OcrResult:
+    stats["ocr_used"] = True
+    stats["ocr_documents"] = stats.get("ocr_documents", 0) + 1
+    result = ocr_documents([(data, content_type)], settings)[0]
+    if isinstance(result, BaseException):
+        raise result
+    stats["ocr_pages"] = stats.get("ocr_pages", 0) + len(result.pages)
+    return result
+
+
+def _iter_pdf_ocr(
+    source: Source, content_type: str, settings: Settings, stats: Dict[str, Any]
+) -> Iterator[Tuple[str, str]]:
+    """Streaming counterpart of the PDF OCR routing in `_extract_one`.
+
+    Pages are held back until the text layer reaches 200 characters, so a
+    scanned document is still OCR'd whole. After that, pages stream until the
+    first thin page with images; from there the rest are held, and every thin
+    page goes to OCR in one sub-PDF (one submit and poll per file, as in the
+    materialised path) before they are yielded in page order.
+    """
+    with open_source(source) as fh:
+        reader = PdfReader(fh)
+        held: List[str] = []
+        held_chars = 0
+        for page in reader.pages:
+            if held_chars >= 200:
+                break
+            text = (page.extract_text() or "").strip()
+            held.append(text)
+            held_chars += len(text) + 1 if text else 0
+        if held_chars < 200:
+            request = OcrRequest(content_type, len(held), list(range(1, len(held) + 1)))
+            yield from request.merge(_ocr_one(source_bytes(source), content_type, settings, stats)).blocks()
+            return
+        rest: List[str] = []
+        numbers: List[int] = []
+        for number, page in enumerate(reader.pages, start=1):
+            text = held[number - 1] if number <= len(held) else (page.extract_text() or "").strip()
+            if _needs_page_ocr(page, text, settings):
+                numbers.append(number)
+            if numbers:
+                rest.append(text)
+            elif text:
+                yield text, f"page {number}"
+        if not numbers:
+            return
+        first = numbers[0]
+        result = _ocr_one(_sub_pdf(reader, numbers), content_type, settings, stats)
+        for number, text in zip(numbers, result.pages):
+            rest[number - first] = text
+        for number, text in enumerate(rest, start=first):
+            if text:
+                yield text, f"page {number}"
+
+
+def _iter_docx(source: Source) -> Iterator[Tuple[str, str]]:
+    with open_source(source) as fh:
+        doc = Document(fh)
+    index = 0
+    for paragraph in doc.paragraphs:
+        if paragraph.text:
+            index += 1
+            yield paragraph.text, f"paragraph {index}"
+
+
+def _iter_pptx(source: Source) -> Iterator[Tuple[str, str]]:
+    with open_source(source) as fh:
+        prs = Presentation(fh)
+    for index, slide in enumerate(prs.slides, start=1):
+        for shape in slide.shapes:
+            if hasattr(shape, "text") and shape.text.strip():
+                yield shape.text.strip(), f"slide {index}"
+
+
+def _iter_csv(source: Source) -> Iterator[Tuple[str, str]]:
+    with open_source(source) as fh:
+        lines = io.TextIOWrapper(fh, encoding="utf-8", errors="ignore", newline="")
+        for index, line in enumerate(lines, start=1):
+            # Only the "\n" goes: it is the block separator, "\r" is content.
+            yield line.rstrip("\n"), f"row {index}"
+
+
+def _iter_xlsx(source: Source) -> Iterator[Tuple[str, str]]:
+    with open_source(source) as fh:
+        workbook = load_workbook(fh, data_only=True, read_only=True)
+        try:
+            for index, row in enumerate(workbook.active.iter_rows(values_only=True), start=1):
+                line = io.StringIO()
+                csv.writer(line, lineterminator="\n").writerow([cell if cell is not None else "" for cell in row])
+                yield line.getvalue().rstrip("\n"), f"row {index}"
+        finally:
+            workbook.close()
+
+
+def _iter_one(
+    filename: str, source: Source, content_type: str | None, settings: Settings, stats: Dict[str, Any]
+) -> Iterator[Tuple[str, str]]:
+    ext = _extension(filename)
+    if ext == ".pdf":
+        if _ocr_enabled(settings):
+            yield from _iter_pdf_ocr(source, content_type or "application/pdf", settings, stats)
+        else:
+            yield from _iter_pdf(source)
+    elif ext == ".docx":
+        yield from _iter_docx(source)
+    elif ext == ".pptx":
+        yield from _iter_pptx(source)
+    elif ext == ".csv":
+        yield from _iter_csv(source)
+    elif ext == ".xlsx":
+        yield from _iter_xlsx(source)
+    else:
+        _extract_image(source)
+        if not _ocr_enabled(settings):
+            raise ValueError("OCR not configured for image extraction.")
+        yield _ocr_one(source_bytes(source), content_type or "image/png", settings, stats).content, ""
+
+
+def iter_document_blocks(
+    files: List[Tuple[str, Source, str | None]],
+    settings: Settings,
+    stats: Optional[Dict[str, Any]] = None,
+) -> Iterator[TextBlock]:
+    """Yield text blocks (pages, paragraphs, slides' shapes, rows) file by file.
+
+    Cache hits are replayed block by block from the cached text; misses are
+    streamed and not cached, since that would mean holding the whole text again.
+    A file that fails partway has already handed its first blocks on, so it
+    stays in `documents` and its error is recorded as partial.
+    """
+    cache = get_extraction_cache(settings)
+    stats = stats if stats is not None else {}
+    stats.setdefault("cache_hits", 0)
+    stats.setdefault("ocr_used", False)
+    documents: List[str] = stats.setdefault("documents", [])
+    file_errors: Dict[str, str] = stats.setdefault("file_errors", {})
+
+    for filename, _, _ in files:
+        if _extension(filename) not in SUPPORTED_EXTENSIONS:
+            raise ValueError(f"Unsupported file type: {filename}")
+
+    for filename, source, content_type in files:
+        entry = None
+        if cache:
+            entry = cache.get(ExtractionCache.key(source, _extension(filename), _ocr_enabled(settings)))
+        if entry is not None:
+            stats["cache_hits"] += 1
+            stats["ocr_used"] = stats["ocr_used"] or entry.ocr_used
+            documents.append(filename)
+            for text, location in entry.blocks():
+                yield TextBlock(file=filename, text=text, location=location)
+            continue
+        attributes = {"file_name": filename, "ext": _extension(filename), "bytes": source_size(source)}
+        with tracing.span("extract_file", **attributes) as span:
+            blocks = 0
+            try:
+                for text, location in _iter_one(filename, source, content_type, settings, stats):
+                    blocks += 1
+                    yield TextBlock(file=filename, text=text, location=location)
+            except Exception as exc:
+                error = str(exc) or type(exc).__name__
+                if blocks:
+                    error = f"Partial: extraction stopped after {blocks} blocks: {error}"
+                file_errors[filename] = span.error = error
+                logger.warning("file_extract_failed", extra={"file_name": filename, "error": error, "blocks": blocks})
+                if not blocks:
+                    continue
+            span.set(blocks=blocks)
+        documents.append(filename)
+    if not documents and file_errors:
+        raise ValueError(next(iter(file_errors.values())))
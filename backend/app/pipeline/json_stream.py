@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Callable, List, Optional
+
+from app.pipeline.llm.base import StreamAborted
+
+MemberCallback = Callable[[str, Any], None]
+
+_SCALAR_START = set("-0123456789tfn")
+_SCALAR_CHARS = set("+-.0123456789eEtrufalsn")
+_WHITESPACE = set(" \t\r\n")
+
+
+class JSONStreamParser:
+    """Checks a streamed completion against JSON grammar as it arrives.
+
+    Feed text deltas to `feed` (it fits a stream's `on_text` callback). The
+    reply must be one JSON object, optionally after a markdown fence line;
+    anything else, such as leading prose or a grammar error, raises
+    `StreamAborted` at the offending character so the caller can stop the
+    completion instead of waiting for it to finish. Each top-level member is
+    handed to `on_member(key, value)` as soon as its value closes. Text after
+    the object closes (a closing fence, a sign-off) is ignored.
+    """
+
+    def __init__(self, on_member: Optional[MemberCallback] = None) -> None:
+        self.on_member = on_member
+        self.done = False
+        self._text: List[str] = []
+        self._pos = 0
+        self._expect = "start"
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_is_key = False
+        self._scalar: List[str] = []
+        self._token_start = 0
+        self._key: Optional[str] = None
+        self._member_start = 0
+        self._object_start = 0
+        self._object_end = 0
+
+    @property
+    def text(self) -> str:
+        return "".join(self._text)
+
+    def feed(self, chunk: str) -> None:
+        self._text.append(chunk)
+        for char in chunk:
+            if self.done:
+                return
+            self._step(char)
+            self._pos += 1
+
+    def _fail(self, reason: str) -> None:
+        raise StreamAborted(f"Reply is not a JSON object: {reason} at offset {self._pos}.", self.text)
+
+    def _step(self, char: str) -> None:
+        if self._in_string:
+            self._string_char(char)
+            return
+        if self._scalar:
+            if char in _SCALAR_CHARS:
+                self._scalar.append(char)
+                return
+            self._end_scalar()
+        expect = self._expect
+        if expect == "fence":
+            if char == "\n":
+                self._expect = "start"
+            return
+        if char in _WHITESPACE:
+            return
+        if expect == "start":
+            if char == "`":
+                self._expect = "fence"
+            elif char == "{":
+                self._stack.append("{")
+                self._object_start = self._pos
+                self._expect = "key_or_end"
+            else:
+                self._fail(f"unexpected {char!r} before the object")
+        elif expect in ("key_or_end", "key"):
+            if char == '"':
+                self._start_string(key=True)
+            elif char == "}" and expect == "key_or_end":
+                self._close("{")
+            else:
+                self._fail(f"expected a key, got {char!r}")
+        elif expect == "colon":
+            if char != ":":
+                self._fail(f"expected ':', got {char!r}")
+            self._expect = "value"
+        elif expect in ("value", "value_or_end"):
+            if char == "]" and expect == "value_or_end":
+                self._close("[")
+            else:
+                self._start_value(char)
+        elif expect == "comma_or_end":
+            if char == ",":
+                self._expect = "key" if self._stack[-1] == "{" else "value"
+            elif char in "}]":
+                self._close("{" if char == "}" else "[")
+            else:
+                self._fail(f"expected ',' or a closing bracket, got {char!r}")
+
+    def _start_value(self, char: str) -> None:
+        if len(self._stack) == 1:
+            self._member_start = self._pos
+        if char == "{":
+            self._stack.append("{")
+            self._expect = "key_or_end"
+        elif char == "[":
+            self._stack.append("[")
+            self._expect = "value_or_end"
+        elif char == '"':
+            self._start_string(key=False)
+        elif char in _SCALAR_START:
+            self._scalar = [char]
+        else:
+            self._fail(f"unexpected {char!r} where a value belongs")
+
+    def _start_string(self, key: bool) -> None:
+        self._in_string = True
+        self._string_is_key = key
+        self._token_start = self._pos
+
+    def _string_char(self, char: str) -> None:
+        if self._escape:
+            self._escape = False
+        elif char == "\\":
+            self._escape = True
+        elif char == '"':
+            self._in_string = False
+            if self._string_is_key:
+                if len(self._stack) == 1:
+                    self._key = json.loads(self.text[self._token_start : self._pos + 1])
+                self._expect = "colon"
+            else:
+                self._end_value()
+
+    def _end_scalar(self) -> None:
+        token = "".join(self._scalar)
+        self._scalar = []
+        try:
+            json.loads(token)
+        except json.JSONDecodeError:
+            self._fail(f"invalid literal {token!r}")
+        self._end_value(self._pos - 1)
+
+    def _close(self, opener: str) -> None:
+        if not self._stack or self._stack[-1] != opener:
+            self._fail("mismatched closing bracket")
+        self._stack.pop()
+        if not self._stack:
+            self.done = True
+            self._object_end = self._pos + 1
+            return
+        self._end_value()
+
+    def _end_value(self, end: Optional[int] = None) -> None:
+        self._expect = "comma_or_end"
+        if len(self._stack) != 1 or self._key is None or self.on_member is None:
+            return
+        end = self._pos if end is None else end
+        self.on_member(self._key, json.loads(self.text[self._member_start : end + 1]))
+
+    def close(self) -> None:
+        """Call when the stream ends: an object that never closed is an error."""
+        if self._scalar:
+            self._end_scalar()
+        if not self.done:
+            self._fail("reply ended before the object closed")
+
+    def value(self) -> Any:
+        """The parsed object, once `done`."""
+        return json.loads(self.text[self._object_start : self._object_end])
@@ -2,16 +2,35 @@ from __future__ import annotations
 
 from app.core.config import Settings
 from app.pipeline.llm.azure_openai import AzureOpenAIClient
+from app.pipeline.llm.cache import CachedLLMClient, get_response_cache
 from app.pipeline.llm.gemini import GeminiClient
+from app.pipeline.llm.limiter import RateLimitedClient, get_rate_limiter
 from app.pipeline.llm.openrouter import OpenRouterClient
+from app.pipeline.llm.router import RoutingLLMClient
 
 
-def get_llm_client(settings: Settings):
-    provider = settings.llm_provider.lower()
+def _provider_client(settings: Settings, provider: str):
     if provider == "openrouter":
         return OpenRouterClient(settings)
     if provider == "azure_openai":
         return AzureOpenAIClient(settings)
     if provider == "gemini":
         return GeminiClient(settings)
-    raise ValueError(f"Unsupported LLM_PROVIDER: {settings.llm_provider}")
+    raise ValueError(f"Unsupported LLM provider: {provider}")
+
+
+def _limited_client(settings: Settings, provider: str):
+    client = _provider_client(settings, provider)
+    limiter = get_rate_limiter(settings, client.provider, client.model)
+    return RateLimitedClient(client, limiter, settings) if limiter else client
+
+
+def get_llm_client(settings: Settings, bypass_cache: bool = False):
+    providers = settings.llm_provider_names()
+    if len(providers) > 1:
+        client = RoutingLLMClient([_limited_client(settings, name) for name in providers], settings)
+    else:
+        client = _limited_client(settings, providers[0])
+    if settings.llm_cache_enabled:
+        client = CachedLLMClient(client, get_response_cache(settings), bypass=bypass_cache)
+    return client
@@ -1,20 +1,27 @@
 from __future__ import annotations
 
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
 
 import httpx
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 from app.core.config import Settings
-from app.pipeline.llm.base import LLMResult
+from app.core.http import get_http_pool
+from app.pipeline.llm.base import LLMResult, TextCallback, count_retry, openai_chunk, stream_completion, traced
 
 
 class AzureOpenAIClient:
+    provider = "azure_openai"
+    temperature = 0.1
+
     def __init__(self, settings: Settings) -> None:
         self.settings = settings
 
-    @retry(stop=stop_after_attempt(2), wait=wait_exponential(multiplier=1, min=1, max=4))
-    def generate(self, prompt: str, request_id: str) -> LLMResult:
+    @property
+    def model(self) -> str:
+        return self.settings.azure_openai_deployment
+
+    def _request(self, prompt: str) -> Tuple[str, Dict[str, str], Dict[str, str], Dict[str, Any]]:
         if not self.settings.azure_openai_endpoint or not self.settings.azure_openai_api_key:
             raise ValueError("Azure OpenAI is not configured.")
         if not self.settings.azure_openai_deployment:
@@ -32,14 +39,54 @@ class AzureOpenAIClient:
                 {"role": "system", "content": "You are a strict JSON generator."},
                 {"role": "user", "content": prompt},
             ],
-            "temperature": 0.1,
+            "temperature": self.temperature,
         }
-        timeout = httpx.Timeout(45.0)
-        with httpx.Client(timeout=timeout) as client:
-            resp = client.post(url, headers=headers, params=params, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-            text = data["choices"][0]["message"]["content"]
-            usage = data.get("usage", {})
-            model = data.get("model", self.settings.azure_openai_deployment)
-            return LLMResult(text=text, usage=usage, model_name=model)
+        return url, params, headers, payload
+
+    def _result(self, data: Dict[str, Any]) -> LLMResult:
+        text = data["choices"][0]["message"]["content"]
+        usage = data.get("usage", {})
+        model = data.get("model", self.settings.azure_openai_deployment)
+        return LLMResult(text=text, usage=usage, model_name=model)
+
+    @traced
+    @retry(
+        stop=stop_after_attempt(2),
+        wait=wait_exponential(multiplier=1, min=1, max=4),
+        before_sleep=count_retry,
+        reraise=True,
+    )
+    def generate(self, prompt: str, request_id: str) -> LLMResult:
+        url, params, headers, payload = self._request(prompt)
+        client = get_http_pool().get_sync(self.provider)
+        resp = client.post(url, headers=headers, params=params, json=payload, timeout=httpx.Timeout(45.0))
+        resp.raise_for_status()
+        return self._result(resp.json())
+
+    @traced
+    @retry(
+        stop=stop_after_attempt(2),
+        wait=wait_exponential(multiplier=1, min=1, max=4),
+        before_sleep=count_retry,
+        reraise=True,
+    )
+    async def agenerate(self, prompt: str, request_id: str) -> LLMResult:
+        url, params, headers, payload = self._request(prompt)
+        client = get_http_pool().get_async(self.provider)
+        resp = await client.post(
+            url, headers=headers, params=params, json=payload, timeout=httpx.Timeout(45.0)
+        )
+        resp.raise_for_status()
+        return self._result(resp.json())
+
+    @traced
+    async def astream(self, prompt: str, request_id: str, on_text: TextCallback) -> LLMResult:
+        url, params, headers, payload = self._request(prompt)
+        # Usage is not streamed: `stream_options` needs a newer api-version
+        # than the default one.
+        payload = {**payload, "stream": True}
+        client = get_http_pool().get_async(self.provider)
+        request = {"url": url, "params": params, "headers": headers, "json": payload}
+        return await stream_completion(
+            client, request, openai_chunk, on_text, self.settings.azure_openai_deployment
+        )
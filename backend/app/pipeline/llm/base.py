@@ -1,7 +1,18 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import inspect
+import json
+import time
 from dataclasses import dataclass
-from typing import Any, Dict, Protocol, Tuple
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Protocol, Tuple
+
+import httpx
+
+from app.core import tracing
+
+TextCallback = Callable[[str], None]
 
 
 @dataclass
@@ -9,8 +20,157 @@ class LLMResult:
     text: str
     usage: Dict[str, Any]
     model_name: str
+    # Seconds from request to the first streamed text; None when not streamed.
+    first_token_s: Optional[float] = None
+    # Set by the routing client to the provider that answered.
+    provider: Optional[str] = None
+
+
+class StreamAborted(Exception):
+    """Raised from a stream's text callback to stop the completion early."""
+
+    def __init__(self, message: str, text: str = "") -> None:
+        super().__init__(message)
+        self.text = text
 
 
 class LLMClient(Protocol):
     def generate(self, prompt: str, request_id: str) -> LLMResult:
         ...
+
+
+class AsyncLLMClient(Protocol):
+    async def agenerate(self, prompt: str, request_id: str) -> LLMResult:
+        ...
+
+
+class StreamingLLMClient(Protocol):
+    async def astream(self, prompt: str, request_id: str, on_text: TextCallback) -> LLMResult:
+        ...
+
+
+# Prompt, completion and total token counts under each provider's usage keys.
+_TOKEN_KEYS = {
+    "prompt": ("prompt_tokens", "promptTokenCount"),
+    "completion": ("completion_tokens", "candidatesTokenCount"),
+    "total": ("total_tokens", "totalTokenCount"),
+}
+
+
+def usage_tokens(usage: Dict[str, Any]) -> Dict[str, int]:
+    """Token counts from an OpenAI-style or Gemini usage block, by kind."""
+    counts = {}
+    for kind, keys in _TOKEN_KEYS.items():
+        for key in keys:
+            value = usage.get(key)
+            if isinstance(value, int) and not isinstance(value, bool):
+                counts[kind] = value
+    return counts
+
+
+def count_retry(retry_state) -> None:
+    """tenacity `before_sleep` hook: counts the retry on the open LLM span."""
+    tracing.add_attribute("retries")
+
+
+def _traced_result(span: tracing.Span, result: LLMResult) -> LLMResult:
+    span.set(
+        **{f"{kind}_tokens": value for kind, value in usage_tokens(result.usage).items()},
+        reply_chars=len(result.text),
+    )
+    if result.first_token_s is not None:
+        span.set(first_token_s=round(result.first_token_s, 3))
+    return result
+
+
+def traced(method):
+    """Wraps an adapter call, retries included, in an `llm.<method>` span
+    carrying provider, model, prompt size, tokens and retries."""
+    name = f"llm.{method.__name__}"
+
+    def opened(client, prompt: str, request_id: str):
+        return tracing.span(
+            name, job_id=request_id, provider=client.provider, model=client.model, prompt_chars=len(prompt)
+        )
+
+    if inspect.iscoroutinefunction(method):
+
+        @functools.wraps(method)
+        async def traced_async(self, prompt: str, request_id: str, *args: Any) -> LLMResult:
+            with opened(self, prompt, request_id) as span:
+                return _traced_result(span, await method(self, prompt, request_id, *args))
+
+        return traced_async
+
+    @functools.wraps(method)
+    def traced_sync(self, prompt: str, request_id: str, *args: Any) -> LLMResult:
+        with opened(self, prompt, request_id) as span:
+            return _traced_result(span, method(self, prompt, request_id, *args))
+
+    return traced_sync
+
+
+async def sse_data(resp: httpx.Response) -> AsyncIterator[Dict[str, Any]]:
+    """JSON payloads of a server-sent event stream, up to `[DONE]`."""
+    async for line in resp.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        if data:
+            yield json.loads(data)
+
+
+# (text delta, usage, model) from one streamed chunk; empty values are skipped.
+ChunkReader = Callable[[Dict[str, Any]], Tuple[str, Dict[str, Any], str]]
+
+
+async def stream_completion(
+    client: httpx.AsyncClient,
+    request: Dict[str, Any],
+    read_chunk: ChunkReader,
+    on_text: TextCallback,
+    model_name: str,
+    attempts: int = 2,
+) -> LLMResult:
+    """POST `request` as a stream and hand each text delta to `on_text`.
+
+    A failure before any text arrived is retried, like the adapters'
+    non-streaming calls; once text has been handed out the stream cannot be
+    replayed, so later failures (and `StreamAborted`) propagate.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        started = time.perf_counter()
+        first_token_s: Optional[float] = None
+        parts = []
+        usage: Dict[str, Any] = {}
+        try:
+            async with client.stream("POST", **request, timeout=httpx.Timeout(45.0)) as resp:
+                resp.raise_for_status()
+                async for chunk in sse_data(resp):
+                    text, chunk_usage, chunk_model = read_chunk(chunk)
+                    usage = chunk_usage or usage
+                    model_name = chunk_model or model_name
+                    if not text:
+                        continue
+                    if first_token_s is None:
+                        first_token_s = time.perf_counter() - started
+                    parts.append(text)
+                    on_text(text)
+        except (httpx.HTTPError, json.JSONDecodeError):
+            if parts or attempt >= attempts:
+                raise
+            tracing.add_attribute("retries")
+            await asyncio.sleep(2 ** (attempt - 1))
+            continue
+        return LLMResult(text="".join(parts), usage=usage, model_name=model_name, first_token_s=first_token_s)
+
+
+def openai_chunk(chunk: Dict[str, Any]) -> Tuple[str, Dict[str, Any], str]:
+    """Chunk reader for OpenAI-compatible `chat.completion.chunk` events."""
+    choices = chunk.get("choices") or []
+    delta = (choices[0].get("delta") or {}) if choices else {}
+    return delta.get("content") or "", chunk.get("usage") or {}, chunk.get("model") or ""
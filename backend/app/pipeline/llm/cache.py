@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import Settings
+from app.core.logging import get_logger
+from app.core.metrics import CACHE_REQUESTS
+from app.pipeline.llm.base import LLMResult, TextCallback
+
+logger = get_logger("llm_cache")
+
+
+def cache_key(prompt: str, provider: str, model: str, temperature: float) -> str:
+    normalized = re.sub(r"\s+", " ", prompt).strip()
+    material = json.dumps([provider, model, temperature, normalized], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class MemoryResponseCache:
+    def __init__(self, ttl_seconds: int, max_entries: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._store: OrderedDict[str, Tuple[float, Dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._store.get(key)
+            if not entry:
+                return None
+            expires_at, payload = entry
+            if time.time() > expires_at:
+                self._store.pop(key, None)
+                return None
+            self._store.move_to_end(key)
+            return payload
+
+    def set(self, key: str, payload: Dict[str, Any]) -> None:
+        with self._lock:
+            self._store[key] = (time.time() + self.ttl_seconds, payload)
+            self._store.move_to_end(key)
+            while len(self._store) > self.max_entries:
+                self._store.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._store.pop(key, None)
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.get(key)
+
+    async def aset(self, key: str, payload: Dict[str, Any]) -> None:
+        self.set(key, payload)
+
+    async def adelete(self, key: str) -> None:
+        self.delete(key)
+
+
+class RedisResponseCache:
+    """Redis-backed responses; a sorted-set index caps the entry count."""
+
+    prefix = "llmcache:"
+    index = "llmcache:index"
+
+    def __init__(self, redis_url: str, ttl_seconds: int, max_entries: int) -> None:
+        import redis
+        import redis.asyncio as aredis
+
+        self.redis = redis.from_url(redis_url, decode_responses=True)
+        self.aredis = aredis.from_url(redis_url, decode_responses=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        payload = self.redis.get(self.prefix + key)
+        return json.loads(payload) if payload else None
+
+    def set(self, key: str, payload: Dict[str, Any]) -> None:
+        pipe = self.redis.pipeline()
+        self._queue_set(pipe, key, payload)
+        pipe.execute()
+        stale = self.redis.zrange(self.index, 0, -self.max_entries - 1)
+        if stale:
+            self.redis.delete(*[self.prefix + k for k in stale])
+            self.redis.zrem(self.index, *stale)
+
+    def delete(self, key: str) -> None:
+        pipe = self.redis.pipeline()
+        pipe.delete(self.prefix + key)
+        pipe.zrem(self.index, key)
+        pipe.execute()
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        payload = await self.aredis.get(self.prefix + key)
+        return json.loads(payload) if payload else None
+
+    async def aset(self, key: str, payload: Dict[str, Any]) -> None:
+        pipe = self.aredis.pipeline()
+        self._queue_set(pipe, key, payload)
+        await pipe.execute()
+        stale = await self.aredis.zrange(self.index, 0, -self.max_entries - 1)
+        if stale:
+            await self.aredis.delete(*[self.prefix + k for k in stale])
+            await self.aredis.zrem(self.index, *stale)
+
+    async def adelete(self, key: str) -> None:
+        pipe = self.aredis.pipeline()
+        pipe.delete(self.prefix + key)
+        pipe.zrem(self.index, key)
+        await pipe.execute()
+
+    def _queue_set(self, pipe, key: str, payload: Dict[str, Any]) -> None:
+        pipe.setex(self.prefix + key, self.ttl_seconds, json.dumps(payload))
+        pipe.zadd(self.index, {key: time.time()})
+        pipe.zremrangebyscore(self.index, 0, time.time() - self.ttl_seconds)
+
+
+def _counted(payload: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    CACHE_REQUESTS.inc(cache="llm", result="hit" if payload else "miss")
+    return payload
+
+
+class CachedLLMClient:
+    """Wraps an LLM adapter and serves repeated prompts from a response cache.
+
+    With `bypass=True` lookups are skipped but fresh responses are still stored.
+    A caller that cannot use a reply (it does not parse, or fails validation)
+    calls `forget` with the prompt, so a retry asks the provider again instead
+    of getting the same reply back for the rest of the TTL.
+    """
+
+    def __init__(self, inner, cache, bypass: bool = False) -> None:
+        self.inner = inner
+        self.cache = cache
+        self.bypass = bypass
+        self.provider = inner.provider
+        self.model = inner.model
+        self.temperature = inner.temperature
+
+    def _key(self, prompt: str) -> str:
+        return cache_key(prompt, self.provider, self.model, self.temperature)
+
+    @staticmethod
+    def _payload(result: LLMResult) -> Dict[str, Any]:
+        # Time to first token describes the call that filled the cache, not
+        # any replay of it.
+        return {**asdict(result), "first_token_s": None}
+
+    @staticmethod
+    def _hit(payload: Dict[str, Any]) -> LLMResult:
+        result = LLMResult(**{**payload, "first_token_s": None})
+        result.usage = {**result.usage, "cache_hit": True}
+        return result
+
+    def generate(self, prompt: str, request_id: str) -> LLMResult:
+        key = self._key(prompt)
+        payload = None if self.bypass else _counted(self._safe(self.cache.get, key))
+        if payload:
+            return self._hit(payload)
+        result = self.inner.generate(prompt, request_id)
+        if result.text.strip():
+            self._safe(self.cache.set, key, self._payload(result))
+        return result
+
+    async def agenerate(self, prompt: str, request_id: str) -> LLMResult:
+        key = self._key(prompt)
+        payload = None if self.bypass else _counted(await self._asafe(self.cache.aget, key))
+        if payload:
+            return self._hit(payload)
+        result = await self.inner.agenerate(prompt, request_id)
+        if result.text.strip():
+            await self._asafe(self.cache.aset, key, self._payload(result))
+        return result
+
+    async def astream(self, prompt: str, request_id: str, on_text: TextCallback) -> LLMResult:
+        # A hit is replayed as one chunk; an aborted stream raises and is
+        # never stored.
+        key = self._key(prompt)
+        payload = None if self.bypass else _counted(await self._asafe(self.cache.aget, key))
+        if payload:
+            result = self._hit(payload)
+            on_text(result.text)
+            return result
+        result = await self.inner.astream(prompt, request_id, on_text)
+        if result.text.strip():
+            await self._asafe(self.cache.aset, key, self._payload(result))
+        return result
+
+    def forget(self, prompt: str) -> None:
+        self._safe(self.cache.delete, self._key(prompt))
+
+    async def aforget(self, prompt: str) -> None:
+        await self._asafe(self.cache.adelete, self._key(prompt))
+
+    @staticmethod
+    def _safe(fn, *args):
+        try:
+            return fn(*args)
+        except Exception as exc:
+            logger.warning("llm_cache_unavailable", extra={"error": str(exc)})
+            return None
+
+    @staticmethod
+    async def _asafe(fn, *args):
+        try:
+            return await fn(*args)
+        except Exception as exc:
+            logger.warning("llm_cache_unavailable", extra={"error": str(exc)})
+            return None
+
+
+@lru_cache
+def _cache_for(backend: str, redis_url: str, ttl_seconds: int, max_entries: int):
+    if backend == "redis":
+        try:
+            return RedisResponseCache(redis_url, ttl_seconds, max_entries)
+        except Exception as exc:
+            logger.warning("redis_unavailable", extra={"error": str(exc)})
+    return MemoryResponseCache(ttl_seconds, max_entries)
+
+
+def get_response_cache(settings: Settings):
+    backend = settings.llm_cache_backend.lower() or ("redis" if settings.redis_url else "memory")
+    if backend not in ("memory", "redis"):
+        raise ValueError(f"Unsupported LLM_CACHE_BACKEND: {settings.llm_cache_backend}")
+    if backend == "redis" and not settings.redis_url:
+        backend = "memory"
+    return _cache_for(
+        backend, settings.redis_url, settings.llm_cache_ttl_seconds, settings.llm_cache_max_entries
+    )
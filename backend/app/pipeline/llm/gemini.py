@@ -1,20 +1,27 @@
 from __future__ import annotations
 
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
 
 import httpx
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 from app.core.config import Settings
-from app.pipeline.llm.base import LLMResult
+from app.core.http import get_http_pool
+from app.pipeline.llm.base import LLMResult, TextCallback, count_retry, stream_completion, traced
 
 
 class GeminiClient:
+    provider = "gemini"
+    temperature = 0.1
+
     def __init__(self, settings: Settings) -> None:
         self.settings = settings
 
-    @retry(stop=stop_after_attempt(2), wait=wait_exponential(multiplier=1, min=1, max=4))
-    def generate(self, prompt: str, request_id: str) -> LLMResult:
+    @property
+    def model(self) -> str:
+        return self.settings.gemini_model
+
+    def _request(self, prompt: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
         if not self.settings.gemini_api_key:
             raise ValueError("GEMINI_API_KEY is not configured.")
         model = self.settings.gemini_model
@@ -22,14 +29,55 @@ class GeminiClient:
         params = {"key": self.settings.gemini_api_key}
         payload: Dict[str, Any] = {
             "contents": [{"role": "user", "parts": [{"text": prompt}]}],
-            "generationConfig": {"temperature": 0.1},
+            "generationConfig": {"temperature": self.temperature},
         }
-        timeout = httpx.Timeout(45.0)
-        with httpx.Client(timeout=timeout) as client:
-            resp = client.post(url, params=params, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-            parts = data["candidates"][0]["content"]["parts"]
-            text = "".join(p.get("text", "") for p in parts)
-            usage = data.get("usageMetadata", {})
-            return LLMResult(text=text, usage=usage, model_name=model)
+        return url, params, payload
+
+    def _result(self, data: Dict[str, Any]) -> LLMResult:
+        parts = data["candidates"][0]["content"]["parts"]
+        text = "".join(p.get("text", "") for p in parts)
+        usage = data.get("usageMetadata", {})
+        return LLMResult(text=text, usage=usage, model_name=self.settings.gemini_model)
+
+    @staticmethod
+    def _chunk(chunk: Dict[str, Any]) -> Tuple[str, Dict[str, Any], str]:
+        candidates = chunk.get("candidates") or []
+        parts = ((candidates[0].get("content") or {}).get("parts") or []) if candidates else []
+        # usageMetadata is cumulative, so the last chunk's is the total.
+        return "".join(p.get("text", "") for p in parts), chunk.get("usageMetadata") or {}, ""
+
+    @traced
+    @retry(
+        stop=stop_after_attempt(2),
+        wait=wait_exponential(multiplier=1, min=1, max=4),
+        before_sleep=count_retry,
+        reraise=True,
+    )
+    def generate(self, prompt: str, request_id: str) -> LLMResult:
+        url, params, payload = self._request(prompt)
+        client = get_http_pool().get_sync(self.provider)
+        resp = client.post(url, params=params, json=payload, timeout=httpx.Timeout(45.0))
+        resp.raise_for_status()
+        return self._result(resp.json())
+
+    @traced
+    @retry(
+        stop=stop_after_attempt(2),
+        wait=wait_exponential(multiplier=1, min=1, max=4),
+        before_sleep=count_retry,
+        reraise=True,
+    )
+    async def agenerate(self, prompt: str, request_id: str) -> LLMResult:
+        url, params, payload = self._request(prompt)
+        client = get_http_pool().get_async(self.provider)
+        resp = await client.post(url, params=params, json=payload, timeout=httpx.Timeout(45.0))
+        resp.raise_for_status()
+        return self._result(resp.json())
+
+    @traced
+    async def astream(self, prompt: str, request_id: str, on_text: TextCallback) -> LLMResult:
+        url, params, payload = self._request(prompt)
+        url = url.replace(":generateContent", ":streamGenerateContent")
+        client = get_http_pool().get_async(self.provider)
+        request = {"url": url, "params": {**params, "alt": "sse"}, "json": payload}
+        return await stream_completion(client, request, self._chunk, on_text, self.settings.gemini_model)
@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from app.core.config import Settings
+from app.core.logging import get_logger
+from app.pipeline.llm.base import LLMResult, TextCallback
+from app.pipeline.packer import get_estimator
+
+logger = get_logger("llm_limiter")
+
+WINDOW_S = 60.0
+# Waiters re-check at least this often; in-flight slots free up without a
+# timestamp to wait for.
+POLL_S = 0.05
+# An in-flight slot held by a process that died is reclaimed after this.
+INFLIGHT_LEASE_S = 180.0
+# A Redis waiter that stops polling (its process died) leaves the queue after this.
+STALE_WAITER_S = 5.0
+
+
+@dataclass(frozen=True)
+class Limits:
+    rpm: int = 0
+    tpm: int = 0
+    max_in_flight: int = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.rpm or self.tpm or self.max_in_flight)
+
+
+class MemoryLimiterState:
+    """Sliding one-minute window of admitted requests plus in-flight slots,
+    for one provider deployment in this process."""
+
+    def __init__(self, limits: Limits) -> None:
+        self.limits = limits
+        self._window: Deque[Tuple[float, str]] = deque()
+        self._tokens: Dict[str, int] = {}
+        self._in_flight: set[str] = set()
+        self._queue: Deque[str] = deque()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        while self._window and self._window[0][0] <= now - WINDOW_S:
+            _, ticket = self._window.popleft()
+            self._tokens.pop(ticket, None)
+
+    def enqueue(self, ticket: str) -> None:
+        with self._lock:
+            self._queue.append(ticket)
+
+    def admit(self, ticket: str, tokens: int) -> float:
+        """0 when `ticket` is admitted, else seconds to wait before asking again."""
+        limits = self.limits
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            if self._queue[0] != ticket:
+                return POLL_S
+            if limits.rpm and len(self._window) >= limits.rpm:
+                return self._window[0][0] + WINDOW_S - now
+            # One request larger than the whole budget still runs, alone.
+            if limits.tpm and self._window and sum(self._tokens.values()) + tokens > limits.tpm:
+                return self._window[0][0] + WINDOW_S - now
+            if limits.max_in_flight and len(self._in_flight) >= limits.max_in_flight:
+                return POLL_S
+            self._queue.popleft()
+            self._window.append((now, ticket))
+            self._tokens[ticket] = tokens
+            self._in_flight.add(ticket)
+            return 0.0
+
+    def abandon(self, ticket: str) -> None:
+        with self._lock:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+
+    def release(self, ticket: str, tokens: Optional[int]) -> None:
+        with self._lock:
+            self._in_flight.discard(ticket)
+            if tokens is not None and ticket in self._tokens:
+                self._tokens[ticket] = tokens
+
+
+_ADMIT = """
+local req, tok, inflight, queue, seen = KEYS[1], KEYS[2], KEYS[3], KEYS[4], KEYS[5]
+local now, ticket, tokens = tonumber(ARGV[1]), ARGV[2], tonumber(ARGV[3])
+local rpm, tpm, max_in_flight = tonumber(ARGV[4]), tonumber(ARGV[5]), tonumber(ARGV[6])
+local window, lease, stale, seq = tonumber(ARGV[7]), tonumber(ARGV[8]), tonumber(ARGV[9]), tonumber(ARGV[10])
+-- unpack() fails past a few thousand values, so members go in chunks.
+local function remove(command, key, members)
+  for i = 1, #members, 1000 do
+    redis.call(command, key, unpack(members, i, math.min(i + 999, #members)))
+  end
+end
+remove('HDEL', tok, redis.call('ZRANGEBYSCORE', req, '-inf', now - window))
+redis.call('ZREMRANGEBYSCORE', req, '-inf', now - window)
+redis.call('ZREMRANGEBYSCORE', inflight, '-inf', now)
+remove('ZREM', queue, redis.call('ZRANGEBYSCORE', seen, '-inf', now - stale))
+redis.call('ZREMRANGEBYSCORE', seen, '-inf', now - stale)
+redis.call('ZADD', queue, 'NX', seq, ticket)
+redis.call('ZADD', seen, now, ticket)
+for _, key in ipairs(KEYS) do redis.call('EXPIRE', key, math.ceil(window + lease)) end
+if redis.call('ZRANGE', queue, 0, 0)[1] ~= ticket then return '-1' end
+local count = redis.call('ZCARD', req)
+local oldest = redis.call('ZRANGE', req, 0, 0, 'WITHSCORES')[2]
+if rpm > 0 and count >= rpm then return tostring(tonumber(oldest) + window - now) end
+if tpm > 0 and count > 0 then
+  local used = 0
+  for _, value in ipairs(redis.call('HVALS', tok)) do used = used + tonumber(value) end
+  if used + tokens > tpm then return tostring(tonumber(oldest) + window - now) end
+end
+if max_in_flight > 0 and redis.call('ZCARD', inflight) >= max_in_flight then return '-1' end
+redis.call('ZREM', queue, ticket)
+redis.call('ZREM', seen, ticket)
+redis.call('ZADD', req, now, ticket)
+redis.call('HSET', tok, ticket, tokens)
+redis.call('ZADD', inflight, now + lease, ticket)
+return '0'
+"""
+
+_RELEASE = """
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('ZREM', KEYS[4], ARGV[1])
+redis.call('ZREM', KEYS[5], ARGV[1])
+if ARGV[2] ~= '' and redis.call('HEXISTS', KEYS[2], ARGV[1]) == 1 then
+  redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+end
+return 1
+"""
+
+
+class RedisLimiterState:
+    """The same window, slots and FIFO queue kept in Redis, so every API and
+    worker process draws on one quota. Each check is one Lua script call."""
+
+    prefix = "llmlimit:"
+
+    def __init__(self, redis_url: str, name: str, limits: Limits) -> None:
+        import redis
+        import redis.asyncio as aredis
+
+        self.limits = limits
+        self.redis = redis.from_url(redis_url, decode_responses=True)
+        self.aredis = aredis.from_url(redis_url, decode_responses=True)
+        base = f"{self.prefix}{name}:"
+        self._keys = [base + part for part in ("req", "tok", "inflight", "queue", "seen")]
+        self._seq = base + "seq"
+        self._admit = self.redis.register_script(_ADMIT)
+        self._release = self.redis.register_script(_RELEASE)
+        self._aadmit = self.aredis.register_script(_ADMIT)
+        self._arelease = self.aredis.register_script(_RELEASE)
+        self._order: Dict[str, int] = {}
+
+    def _args(self, ticket: str, tokens: int) -> list:
+        limits = self.limits
+        return [
+            time.time(), ticket, tokens, limits.rpm, limits.tpm, limits.max_in_flight,
+            WINDOW_S, INFLIGHT_LEASE_S, STALE_WAITER_S, self._order[ticket],
+        ]
+
+    @staticmethod
+    def _wait(reply: Any) -> float:
+        wait = float(reply)
+        return POLL_S if wait < 0 else max(wait, 0.001) if wait else 0.0
+
+    def enqueue(self, ticket: str) -> None:
+        self._order[ticket] = self.redis.incr(self._seq)
+
+    async def aenqueue(self, ticket: str) -> None:
+        self._order[ticket] = await self.aredis.incr(self._seq)
+
+    def admit(self, ticket: str, tokens: int) -> float:
+        return self._wait(self._admit(keys=self._keys, args=self._args(ticket, tokens)))
+
+    async def aadmit(self, ticket: str, tokens: int) -> float:
+        return self._wait(await self._aadmit(keys=self._keys, args=self._args(ticket, tokens)))
+
+    def abandon(self, ticket: str) -> None:
+        self._order.pop(ticket, None)
+        self._release(keys=self._keys, args=[ticket, ""])
+
+    async def aabandon(self, ticket: str) -> None:
+        self._order.pop(ticket, None)
+        await self._arelease(keys=self._keys, args=[ticket, ""])
+
+    def release(self, ticket: str, tokens: Optional[int]) -> None:
+        self._order.pop(ticket, None)
+        self._release(keys=self._keys, args=[ticket, "" if tokens is None else tokens])
+
+    async def arelease(self, ticket: str, tokens: Optional[int]) -> None:
+        self._order.pop(ticket, None)
+        await self._arelease(keys=self._keys, args=[ticket, "" if tokens is None else tokens])
+
+
+async def _maybe_await(state, name: str, *args):
+    # Redis state has native async variants; memory state is lock-only.
+    method = getattr(state, f"a{name}", None)
+    if method is not None:
+        return await method(*args)
+    return getattr(state, name)(*args)
+
+
+class RateLimiter:
+    """Requests-per-minute, tokens-per-minute and in-flight limits for one
+    provider deployment.
+
+    Callers wait in one FIFO queue and are admitted in arrival order, so a
+    burst is spread over the window instead of being turned into 429s. A
+    request reserves its estimated tokens on admission; the provider's
+    reported usage replaces the estimate once the call returns.
+    """
+
+    def __init__(self, state) -> None:
+        self.state = state
+        self._tickets = itertools.count()
+
+    def _ticket(self) -> str:
+        return f"{uuid.uuid4().hex[:12]}-{next(self._tickets)}"
+
+    def acquire(self, tokens: int) -> str:
+        ticket = self._ticket()
+        self.state.enqueue(ticket)
+        try:
+            while True:
+                wait = self.state.admit(ticket, tokens)
+                if not wait:
+                    return ticket
+                time.sleep(min(wait, 1.0))
+        except BaseException:
+            self.state.abandon(ticket)
+            raise
+
+    async def aacquire(self, tokens: int) -> str:
+        ticket = self._ticket()
+        await _maybe_await(self.state, "enqueue", ticket)
+        try:
+            while True:
+                wait = await _maybe_await(self.state, "admit", ticket, tokens)
+                if not wait:
+                    return ticket
+                await asyncio.sleep(min(wait, 1.0))
+        except BaseException:
+            await _maybe_await(self.state, "abandon", ticket)
+            raise
+
+    def release(self, ticket: str, tokens: Optional[int] = None) -> None:
+        self.state.release(ticket, tokens)
+
+    async def arelease(self, ticket: str, tokens: Optional[int] = None) -> None:
+        await _maybe_await(self.state, "release", ticket, tokens)
+
+
+def _used_tokens(usage: Dict[str, Any]) -> Optional[int]:
+    for key in ("total_tokens", "totalTokenCount"):
+        if isinstance(usage.get(key), int):
+            return usage[key]
+    return None
+
+
+class RateLimitedClient:
+    """Holds a limiter slot around each call of the wrapped adapter; the
+    adapter's own retry runs inside that slot."""
+
+    def __init__(self, inner, limiter: RateLimiter, settings: Settings) -> None:
+        self.inner = inner
+        self.limiter = limiter
+        self.estimator = get_estimator(settings.token_estimator)
+        self.completion_tokens = settings.llm_completion_tokens
+        self.provider = inner.provider
+        self.model = inner.model
+        self.temperature = inner.temperature
+
+    def _estimate(self, prompt: str) -> int:
+        return self.estimator.count(prompt) + self.completion_tokens
+
+    def generate(self, prompt: str, request_id: str) -> LLMResult:
+        ticket = self.limiter.acquire(self._estimate(prompt))
+        result = None
+        try:
+            result = self.inner.generate(prompt, request_id)
+            return result
+        finally:
+            self.limiter.release(ticket, _used_tokens(result.usage) if result else None)
+
+    async def agenerate(self, prompt: str, request_id: str) -> LLMResult:
+        ticket = await self.limiter.aacquire(self._estimate(prompt))
+        result = None
+        try:
+            result = await self.inner.agenerate(prompt, request_id)
+            return result
+        finally:
+            await self.limiter.arelease(ticket, _used_tokens(result.usage) if result else None)
+
+    async def astream(self, prompt: str, request_id: str, on_text: TextCallback) -> LLMResult:
+        ticket = await self.limiter.aacquire(self._estimate(prompt))
+        result = None
+        try:
+            result = await self.inner.astream(prompt, request_id, on_text)
+            return result
+        finally:
+            await self.limiter.arelease(ticket, _used_tokens(result.usage) if result else None)
+
+
+@lru_cache
+def _limiter_for(backend: str, redis_url: str, name: str, limits: Limits) -> RateLimiter:
+    if backend == "redis":
+        try:
+            return RateLimiter(RedisLimiterState(redis_url, name, limits))
+        except Exception as exc:
+            logger.warning("redis_unavailable", extra={"error": str(exc)})
+    return RateLimiter(MemoryLimiterState(limits))
+
+
+def get_rate_limiter(settings: Settings, provider: str, model: str) -> Optional[RateLimiter]:
+    """The process-wide limiter for `provider`'s `model`, or None when no
+    limit is configured for it."""
+    limits = Limits(
+        rpm=settings.provider_setting(settings.llm_rpm, provider, model),
+        tpm=settings.provider_setting(settings.llm_tpm, provider, model),
+        max_in_flight=settings.provider_setting(settings.llm_max_in_flight, provider, model),
+    )
+    if not limits:
+        return None
+    backend = settings.llm_limiter_backend.lower() or ("redis" if settings.redis_url else "memory")
+    if backend not in ("memory", "redis"):
+        raise ValueError(f"Unsupported LLM_LIMITER_BACKEND: {settings.llm_limiter_backend}")
+    if backend == "redis" and not settings.redis_url:
+        backend = "memory"
+    return _limiter_for(backend, settings.redis_url, f"{provider}:{model}", limits)
@@ -1,20 +1,27 @@
 from __future__ import annotations
 
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
 
 import httpx
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 from app.core.config import Settings
-from app.pipeline.llm.base import LLMResult
+from app.core.http import get_http_pool
+from app.pipeline.llm.base import LLMResult, TextCallback, count_retry, openai_chunk, stream_completion, traced
 
 
 class OpenRouterClient:
+    provider = "openrouter"
+    temperature = 0.1
+
     def __init__(self, settings: Settings) -> None:
         self.settings = settings
 
-    @retry(stop=stop_after_attempt(2), wait=wait_exponential(multiplier=1, min=1, max=4))
-    def generate(self, prompt: str, request_id: str) -> LLMResult:
+    @property
+    def model(self) -> str:
+        return self.settings.openrouter_model
+
+    def _request(self, prompt: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
         if not self.settings.openrouter_api_key:
             raise ValueError("OPENROUTER_API_KEY is not configured.")
         url = "https://openrouter.ai/api/v1/chat/completions"
@@ -29,14 +36,48 @@ class OpenRouterClient:
                 {"role": "system", "content": "You are a strict JSON generator."},
                 {"role": "user", "content": prompt},
             ],
-            "temperature": 0.1,
+            "temperature": self.temperature,
         }
-        timeout = httpx.Timeout(45.0)
-        with httpx.Client(timeout=timeout) as client:
-            resp = client.post(url, headers=headers, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-            text = data["choices"][0]["message"]["content"]
-            usage = data.get("usage", {})
-            model = data.get("model", self.settings.openrouter_model)
-            return LLMResult(text=text, usage=usage, model_name=model)
+        return url, headers, payload
+
+    def _result(self, data: Dict[str, Any]) -> LLMResult:
+        text = data["choices"][0]["message"]["content"]
+        usage = data.get("usage", {})
+        model = data.get("model", self.settings.openrouter_model)
+        return LLMResult(text=text, usage=usage, model_name=model)
+
+    @traced
+    @retry(
+        stop=stop_after_attempt(2),
+        wait=wait_exponential(multiplier=1, min=1, max=4),
+        before_sleep=count_retry,
+        reraise=True,
+    )
+    def generate(self, prompt: str, request_id: str) -> LLMResult:
+        url, headers, payload = self._request(prompt)
+        client = get_http_pool().get_sync(self.provider)
+        resp = client.post(url, headers=headers, json=payload, timeout=httpx.Timeout(45.0))
+        resp.raise_for_status()
+        return self._result(resp.json())
+
+    @traced
+    @retry(
+        stop=stop_after_attempt(2),
+        wait=wait_exponential(multiplier=1, min=1, max=4),
+        before_sleep=count_retry,
+        reraise=True,
+    )
+    async def agenerate(self, prompt: str, request_id: str) -> LLMResult:
+        url, headers, payload = self._request(prompt)
+        client = get_http_pool().get_async(self.provider)
+        resp = await client.post(url, headers=headers, json=payload, timeout=httpx.Timeout(45.0))
+        resp.raise_for_status()
+        return self._result(resp.json())
+
+    @traced
+    async def astream(self, prompt: str, request_id: str, on_text: TextCallback) -> LLMResult:
+        url, headers, payload = self._request(prompt)
+        payload = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+        client = get_http_pool().get_async(self.provider)
+        request = {"url": url, "headers": headers, "json": payload}
+        return await stream_completion(client, request, openai_chunk, on_text, self.settings.openrouter_model)
@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from app.core.config import Settings
+from app.core.logging import get_logger
+from app.pipeline.llm.base import LLMResult, StreamAborted, TextCallback
+
+logger = get_logger("llm_router")
+
+# Percentiles need this many samples in the window; until then the
+# configured hedge delay is used.
+MIN_SAMPLES = 5
+# At or above this error rate (with MIN_SAMPLES calls) a provider is ranked
+# behind every healthy one until its errors age out of the window.
+UNHEALTHY_ERROR_RATE = 0.5
+
+
+class ProviderStats:
+    """Rolling latency and error samples for one provider, kept for
+    `window_seconds`. Shared by every router in the process."""
+
+    def __init__(self, window_seconds: float) -> None:
+        self.window_seconds = window_seconds
+        self._samples: Deque[Tuple[float, str, float, bool]] = deque()
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, seconds: float, ok: bool = True) -> None:
+        """`kind` is `latency` (whole reply) or `ttft` (first streamed text)."""
+        with self._lock:
+            self._samples.append((time.monotonic(), kind, seconds, ok))
+            self._expire()
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.window_seconds
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+
+    def _values(self, kind: str) -> List[float]:
+        with self._lock:
+            self._expire()
+            return sorted(seconds for _, k, seconds, ok in self._samples if k == kind and ok)
+
+    def percentile(self, kind: str, percent: float) -> Optional[float]:
+        values = self._values(kind)
+        if len(values) < MIN_SAMPLES:
+            return None
+        return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+    def median(self, kind: str) -> Optional[float]:
+        values = self._values(kind)
+        return values[len(values) // 2] if values else None
+
+    def healthy(self) -> bool:
+        with self._lock:
+            self._expire()
+            outcomes = [ok for _, _, _, ok in self._samples]
+        if len(outcomes) < MIN_SAMPLES:
+            return True
+        return outcomes.count(False) / len(outcomes) < UNHEALTHY_ERROR_RATE
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy(),
+            "latency_p50": self.median("latency"),
+            "ttft_p50": self.median("ttft"),
+        }
+
+
+def _parses(text: str) -> bool:
+    """Whether a reply holds a JSON object, with the same tolerance for text
+    around it as the orchestrator's parser."""
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return False
+    try:
+        json.loads(text[start : end + 1])
+    except ValueError:
+        return False
+    return True
+
+
+@lru_cache
+def provider_stats(provider: str, window_seconds: float) -> ProviderStats:
+    return ProviderStats(window_seconds)
+
+
+class RoutingLLMClient:
+    """Sends each call to the fastest healthy provider and hedges slow ones.
+
+    Providers are ranked by health, then median latency (time to first
+    token for streams); one without samples ranks as fast so it gets tried.
+    If the first choice has not answered after its `LLM_HEDGE_PERCENTILE`
+    latency (`LLM_HEDGE_DELAY_SECONDS` until it has enough samples), the
+    same prompt goes to the next provider as well. The first reply that
+    parses as JSON wins and the other call is cancelled; one that does not
+    parse is kept in case no other provider does better. A provider that
+    fails, or answers with nothing usable, is replaced by the next one
+    straight away. Blocking calls run on a shared pool of
+    `LLM_HEDGE_THREADS`; while every thread is busy, calls are not hedged.
+
+    Streams are hedged on the first token: whichever stream produces text
+    first is forwarded, the other is cancelled.
+    """
+
+    provider = "router"
+    temperature = 0.1
+
+    def __init__(self, clients: List[Any], settings: Settings) -> None:
+        self.clients = clients
+        self.settings = settings
+        self.model = ",".join(f"{c.provider}:{c.model}" for c in clients)
+        self.stats = {
+            c.provider: provider_stats(c.provider, settings.llm_stats_window_seconds) for c in clients
+        }
+
+    def _ranked(self, kind: str) -> List[Any]:
+        def key(item: Tuple[int, Any]) -> Tuple[bool, float, int]:
+            order, client = item
+            stats = self.stats[client.provider]
+            return (not stats.healthy(), stats.median(kind) or 0.0, order)
+
+        return [client for _, client in sorted(enumerate(self.clients), key=key)]
+
+    def _hedge_delay(self, client: Any, kind: str) -> Optional[float]:
+        if self.settings.llm_hedge_percentile <= 0:
+            return None
+        observed = self.stats[client.provider].percentile(kind, self.settings.llm_hedge_percentile)
+        return observed if observed is not None else self.settings.llm_hedge_delay_seconds
+
+    def _won(self, client: Any, result: LLMResult, started: float) -> LLMResult:
+        self.stats[client.provider].record("latency", time.perf_counter() - started)
+        result.provider = client.provider
+        return result
+
+    def _unparsed(self, client: Any, result: LLMResult, started: float, kept: Optional[LLMResult]) -> LLMResult:
+        # The provider answered, so this is no mark against its health; the
+        # first such reply is the fallback if none parses.
+        result = self._won(client, result, started)
+        logger.warning("llm_reply_unparsed", extra={"provider": client.provider})
+        return kept or result
+
+    def _lost(self, client: Any, started: float, exc: Optional[BaseException]) -> None:
+        # A cancelled call is a lower bound on that provider's latency, so a
+        # provider that keeps losing hedges drifts down the ranking.
+        self.stats[client.provider].record("latency", time.perf_counter() - started, ok=exc is None)
+        if exc is not None:
+            logger.warning("llm_provider_failed", extra={"provider": client.provider, "error": str(exc)})
+
+    async def agenerate(self, prompt: str, request_id: str) -> LLMResult:
+        ranked = self._ranked("latency")
+        pending: Dict[asyncio.Task, Tuple[Any, float]] = {}
+
+        def launch() -> None:
+            client = ranked.pop(0)
+            task = asyncio.ensure_future(client.agenerate(prompt, request_id))
+            pending[task] = (client, time.perf_counter())
+
+        launch()
+        delay = self._hedge_delay(pending[next(iter(pending))][0], "latency")
+        error: Optional[BaseException] = None
+        unparsed: Optional[LLMResult] = None
+        try:
+            while pending:
+                timeout = delay if ranked and len(pending) == 1 else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info("llm_hedge", extra={"request_id": request_id, "provider": ranked[0].provider})
+                    launch()
+                    continue
+                for task in done:
+                    client, started = pending.pop(task)
+                    exc = task.exception()
+                    if exc is None and _parses(task.result().text):
+                        return self._won(client, task.result(), started)
+                    if exc is None and task.result().text.strip():
+                        unparsed = self._unparsed(client, task.result(), started, unparsed)
+                        continue
+                    error = exc or ValueError(f"Empty reply from {client.provider}.")
+                    self._lost(client, started, error)
+                if not pending and ranked:
+                    launch()
+            if unparsed is not None:
+                return unparsed
+            raise error or RuntimeError("No LLM provider configured.")
+        finally:
+            for task, (client, started) in pending.items():
+                task.cancel()
+                self._lost(client, started, None)
+
+    async def astream(self, prompt: str, request_id: str, on_text: TextCallback) -> LLMResult:
+        ranked = self._ranked("ttft")
+        pending: Dict[asyncio.Task, Tuple[Any, float]] = {}
+        winner: List[asyncio.Task] = []
+
+        def launch() -> None:
+            client = ranked.pop(0)
+            started = time.perf_counter()
+            task: Optional[asyncio.Task] = None
+
+            def forward(text: str) -> None:
+                if not winner:
+                    winner.append(task)
+                    self.stats[client.provider].record("ttft", time.perf_counter() - started)
+                    for other in pending:
+                        if other is not task:
+                            other.cancel()
+                if winner[0] is task:
+                    on_text(text)
+
+            task = asyncio.ensure_future(client.astream(prompt, request_id, forward))
+            pending[task] = (client, started)
+
+        launch()
+        delay = self._hedge_delay(pending[next(iter(pending))][0], "ttft")
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                timeout = delay if ranked and len(pending) == 1 and not winner else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info("llm_hedge", extra={"request_id": request_id, "provider": ranked[0].provider})
+                    launch()
+                    continue
+                for task in done:
+                    client, started = pending.pop(task)
+                    if task.cancelled():
+                        self._lost(client, started, None)
+                        continue
+                    exc = task.exception()
+                    if winner and winner[0] is task:
+                        if exc is not None:
+                            # Text was already forwarded, so the call cannot move to
+                            # another provider. A reply that is not JSON says
+                            # nothing about the provider's health.
+                            elapsed = time.perf_counter() - started
+                            self.stats[client.provider].record("latency", elapsed, ok=isinstance(exc, StreamAborted))
+                            raise exc
+                        return self._won(client, task.result(), started)
+                    error = exc or ValueError(f"Empty reply from {client.provider}.")
+                    self._lost(client, started, error)
+                if not pending and ranked and not winner:
+                    launch()
+            raise error or RuntimeError("No LLM provider configured.")
+        finally:
+            for task, (client, started) in pending.items():
+                task.cancel()
+                self._lost(client, started, None)
+
+    def generate(self, prompt: str, request_id: str) -> LLMResult:
+        # Threads cannot be cancelled: a losing call runs to completion in
+        # the background and its reply is dropped.
+        ranked = self._ranked("latency")
+        pool = _hedge_pool(self.settings.llm_hedge_threads)
+        pending: Dict[Future, Tuple[Any, float]] = {}
+
+        def launch() -> None:
+            client = ranked.pop(0)
+            pending[pool.submit(client.generate, prompt, request_id)] = (client, time.perf_counter())
+
+        launch()
+        delay = self._hedge_delay(pending[next(iter(pending))][0], "latency")
+        error: Optional[BaseException] = None
+        unparsed: Optional[LLMResult] = None
+        abandoned: Set[Future] = set()
+        try:
+            while pending:
+                timeout = delay if ranked and len(pending) == 1 else None
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    if pool.saturated():
+                        # A hedge would only queue behind the busy threads.
+                        logger.info("llm_hedge_skipped", extra={"request_id": request_id, "threads": pool.size})
+                        delay = None
+                        continue
+                    logger.info("llm_hedge", extra={"request_id": request_id, "provider": ranked[0].provider})
+                    launch()
+                    continue
+                for future in done:
+                    client, started = pending.pop(future)
+                    exc = future.exception()
+                    if exc is None and _parses(future.result().text):
+                        abandoned = set(pending)
+                        return self._won(client, future.result(), started)
+                    if exc is None and future.result().text.strip():
+                        unparsed = self._unparsed(client, future.result(), started, unparsed)
+                        continue
+                    error = exc or ValueError(f"Empty reply from {client.provider}.")
+                    self._lost(client, started, error)
+                if not pending and ranked:
+                    launch()
+            if unparsed is not None:
+                return unparsed
+            raise error or RuntimeError("No LLM provider configured.")
+        finally:
+            for future in abandoned:
+                client, started = pending[future]
+                future.add_done_callback(lambda f, c=client, s=started: self._lost(c, s, f.exception()))
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
+
+
+class _HedgePool(ThreadPoolExecutor):
+    """Thread pool for blocking routed calls that knows when every thread is
+    taken."""
+
+    def __init__(self, size: int) -> None:
+        super().__init__(max_workers=size, thread_name_prefix="llm-hedge")
+        self.size = size
+        self._busy = 0
+        self._busy_lock = threading.Lock()
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        with self._busy_lock:
+            self._busy += 1
+        future = super().submit(fn, *args, **kwargs)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _: Future) -> None:
+        with self._busy_lock:
+            self._busy -= 1
+
+    def saturated(self) -> bool:
+        with self._busy_lock:
+            return self._busy >= self.size
+
+
+@lru_cache
+def _hedge_pool(size: int) -> _HedgePool:
+    return _HedgePool(max(1, size))
@@ -1,19 +1,29 @@
 from __future__ import annotations
 
+import asyncio
+import threading
 import time
-from typing import Any, Dict
+from collections import deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple, Union
 
 import httpx
-from tenacity import retry, stop_after_attempt, wait_exponential
 
+from app.core import tracing
 from app.core.config import Settings
+from app.core.http import get_http_pool
 
 
 AZURE_API_VERSION = "2024-02-29-preview"
+POLL_MIN_INTERVAL_S = 0.5
+# Submits are repeated only when the service throttled them, i.e. it did not
+# accept the document; an accepted document is never uploaded twice.
+SUBMIT_ATTEMPTS = 3
+REQUEST_TIMEOUT_S = 30.0
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=8))
-def azure_read_document(data: bytes, content_type: str, settings: Settings) -> str:
+def _analyze_request(content_type: str, settings: Settings) -> Tuple[str, Dict[str, str], Dict[str, str]]:
     endpoint = settings.azure_docintel_endpoint.rstrip("/")
     if not endpoint or not settings.azure_docintel_key:
         raise ValueError("Azure Document Intelligence not configured.")
@@ -24,25 +34,237 @@ def azure_read_document(data: bytes, content_type: str, settings: Settings) -> s
         "Ocp-Apim-Subscription-Key": settings.azure_docintel_key,
         "Content-Type": content_type,
     }
-    timeout = httpx.Timeout(30.0)
-
-    with httpx.Client(timeout=timeout) as client:
-        resp = client.post(url, params=params, headers=headers, content=data)
-        resp.raise_for_status()
-        operation = resp.headers.get("operation-location")
-        if not operation:
-            raise RuntimeError("OCR operation location missing.")
-
-        for _ in range(20):
-            poll = client.get(operation, headers={"Ocp-Apim-Subscription-Key": settings.azure_docintel_key})
-            poll.raise_for_status()
-            payload: Dict[str, Any] = poll.json()
-            status = payload.get("status", "").lower()
-            if status == "succeeded":
-                analyze_result = payload.get("analyzeResult", {})
-                content = analyze_result.get("content", "")
-                return content.strip()
-            if status == "failed":
-                raise RuntimeError("OCR failed in Azure Document Intelligence.")
-            time.sleep(1.5)
-    raise RuntimeError("OCR polling timed out.")
+    return url, params, headers
+
+
+def _operation_location(resp: httpx.Response) -> str:
+    resp.raise_for_status()
+    operation = resp.headers.get("operation-location")
+    if not operation:
+        raise RuntimeError("OCR operation location missing.")
+    return operation
+
+
+@dataclass
+class OcrResult:
+    """Recognized text, whole and split by the pages of the submitted document."""
+
+    content: str
+    pages: List[str] = field(default_factory=list)
+
+
+def _page_texts(analyze_result: Dict[str, Any], content: str) -> List[str]:
+    texts = []
+    for page in analyze_result.get("pages") or []:
+        spans = page.get("spans") or []
+        texts.append(
+            "\n".join(content[span["offset"] : span["offset"] + span["length"]] for span in spans).strip()
+        )
+    return texts or [content.strip()]
+
+
+def _poll_content(poll: httpx.Response) -> Optional[OcrResult]:
+    poll.raise_for_status()
+    payload: Dict[str, Any] = poll.json()
+    status = payload.get("status", "").lower()
+    if status == "succeeded":
+        analyze_result = payload.get("analyzeResult", {})
+        content = analyze_result.get("content", "")
+        return OcrResult(content.strip(), _page_texts(analyze_result, content))
+    if status == "failed":
+        raise RuntimeError("OCR failed in Azure Document Intelligence.")
+    return None
+
+
+def _retry_after(resp: httpx.Response, default: float) -> float:
+    try:
+        return max(0.0, float(resp.headers["retry-after"]))
+    except (KeyError, ValueError):
+        return default
+
+
+def _transient(resp: httpx.Response) -> bool:
+    return resp.status_code == 429 or resp.status_code >= 500
+
+
+class _ProcessSlots:
+    """First-come, first-served semaphore shared by the event loops of every
+    thread in the process. Each pipeline thread runs OCR on a loop of its
+    own, where an `asyncio.Semaphore` would bound only that thread."""
+
+    def __init__(self, size: int) -> None:
+        self._free = size
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self._lock = threading.Lock()
+
+    async def __aenter__(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._free and not self._waiters:
+                self._free -= 1
+                return
+            waiter = loop.create_future()
+            self._waiters.append((loop, waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove((loop, waiter))
+                    granted = False
+                except ValueError:
+                    granted = True
+            if granted:
+                # The slot was handed over as the wait was cancelled.
+                self._release()
+            raise
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self._release()
+
+    def _release(self) -> None:
+        while True:
+            with self._lock:
+                if not self._waiters:
+                    self._free += 1
+                    return
+                loop, waiter = self._waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_grant, waiter)
+                return
+            except RuntimeError:
+                continue  # that waiter's loop is closed; try the next one
+
+
+def _grant(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+@lru_cache
+def _ocr_slots(size: int) -> _ProcessSlots:
+    return _ProcessSlots(max(1, size))
+
+
+class OcrEngine:
+    """Concurrent Document Intelligence reads on one event loop.
+
+    Each document is uploaded once. Its operation is then polled as often as
+    the service's `Retry-After` asks, with exponential backoff up to
+    `ocr_poll_max_interval_seconds` when it gives none. A failed poll (network
+    error, 429, 5xx) is retried on its own, up to `ocr_poll_retries` in a row;
+    the upload is not repeated. At most `ocr_concurrency` documents are in
+    flight at once across every engine in the process.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, settings: Settings) -> None:
+        self.client = client
+        self.settings = settings
+        self._slots = _ocr_slots(settings.ocr_concurrency)
+
+    async def _submit(self, data: bytes, content_type: str) -> Tuple[str, float]:
+        url, params, headers = _analyze_request(content_type, self.settings)
+        delay = POLL_MIN_INTERVAL_S
+        for attempt in range(SUBMIT_ATTEMPTS):
+            resp = await self.client.post(
+                url, params=params, headers=headers, content=data, timeout=REQUEST_TIMEOUT_S
+            )
+            if resp.status_code in (429, 503) and attempt + 1 < SUBMIT_ATTEMPTS:
+                tracing.add_attribute("retries")
+                await asyncio.sleep(_retry_after(resp, delay))
+                delay *= 2
+                continue
+            return _operation_location(resp), _retry_after(resp, POLL_MIN_INTERVAL_S)
+        raise RuntimeError("OCR submit throttled.")
+
+    async def _poll(self, operation: str, delay: float) -> OcrResult:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.settings.ocr_poll_timeout_seconds
+        max_interval = self.settings.ocr_poll_max_interval_seconds
+        headers = {"Ocp-Apim-Subscription-Key": self.settings.azure_docintel_key}
+        backoff = POLL_MIN_INTERVAL_S
+        failures = 0
+        while True:
+            if loop.time() + delay > deadline:
+                raise RuntimeError("OCR polling timed out.")
+            await asyncio.sleep(delay)
+            tracing.add_attribute("polls")
+            try:
+                poll = await self.client.get(operation, headers=headers, timeout=REQUEST_TIMEOUT_S)
+            except httpx.TransportError:
+                tracing.add_attribute("retries")
+                failures += 1
+                if failures > self.settings.ocr_poll_retries:
+                    raise
+                backoff = min(backoff * 2, max_interval)
+                delay = backoff
+                continue
+            if _transient(poll):
+                tracing.add_attribute("retries")
+                failures += 1
+                if failures > self.settings.ocr_poll_retries:
+                    poll.raise_for_status()
+                backoff = min(backoff * 2, max_interval)
+                delay = _retry_after(poll, backoff)
+                continue
+            failures = 0
+            content = _poll_content(poll)
+            if content is not None:
+                return content
+            delay = _retry_after(poll, backoff)
+            backoff = min(backoff * 1.5, max_interval)
+
+    async def read(self, data: bytes, content_type: str) -> OcrResult:
+        with tracing.span("ocr.read", bytes=len(data), content_type=content_type) as span:
+            async with self._slots:
+                span.set(queued_ms=round((time.time_ns() - span.start_ns) / 1e6, 3))
+                operation, delay = await self._submit(data, content_type)
+                result = await self._poll(operation, delay)
+            span.set(pages=len(result.pages), chars=len(result.content))
+            return result
+
+    async def read_many(
+        self, documents: Sequence[Tuple[bytes, str]]
+    ) -> List[Union[OcrResult, BaseException]]:
+        """OCR every `(data, content_type)`; failures are returned in place."""
+        return await asyncio.gather(
+            *(self.read(data, content_type) for data, content_type in documents), return_exceptions=True
+        )
+
+
+_thread_state = threading.local()
+
+
+def _thread_loop() -> asyncio.AbstractEventLoop:
+    # One loop per pipeline thread or pool worker, kept for its lifetime, so
+    # the pooled client (bound to the loop) keeps its connections between calls.
+    loop = getattr(_thread_state, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _thread_state.loop = asyncio.new_event_loop()
+    return loop
+
+
+def ocr_documents(
+    documents: Sequence[Tuple[bytes, str]], settings: Settings
+) -> List[Union[OcrResult, BaseException]]:
+    """Blocking entry point for pipeline threads and pool workers: runs one
+    engine on this thread's loop with its pooled client, so no thread sleeps
+    between polls and batches reuse warm connections."""
+
+    async def run() -> List[Union[OcrResult, BaseException]]:
+        client = get_http_pool().get_async("azure_docintel")
+        return await OcrEngine(client, settings).read_many(documents)
+
+    return _thread_loop().run_until_complete(run())
+
+
+def azure_read_document(data: bytes, content_type: str, settings: Settings) -> str:
+    result = ocr_documents([(data, content_type)], settings)[0]
+    if isinstance(result, BaseException):
+        raise result
+    return result.content
+
+
+async def azure_read_document_async(data: bytes, content_type: str, settings: Settings) -> str:
+    client = get_http_pool().get_async("azure_docintel")
+    return (await OcrEngine(client, settings).read(data, content_type)).content
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import importlib
+import importlib.util
+import json
+import math
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Protocol
+
+from app.core.config import Settings
+
+CATEGORIES = ("E", "S", "G")
+
+_PIECES = re.compile(r"[^\W\d_]+|\d+|[^\w\s]|_+")
+
+
+class TokenEstimator(Protocol):
+    def count(self, text: str) -> int:
+        ...
+
+
+class HeuristicEstimator:
+    """Offline BPE approximation: a word costs one token per six letters, a
+    number one per three digits, and each punctuation mark one token.
+
+    Common words are single tokens in the OpenAI and Gemini vocabularies, so
+    this lands slightly above their counts for English prose, which keeps a
+    packed prompt inside its budget.
+    """
+
+    def count(self, text: str) -> int:
+        tokens = 0
+        for piece in _PIECES.findall(text):
+            if piece[0].isdigit():
+                tokens += math.ceil(len(piece) / 3)
+            elif piece[0].isalpha():
+                tokens += math.ceil(len(piece) / 6)
+            else:
+                tokens += 1
+        return tokens
+
+
+class TiktokenEstimator:
+    """Exact counts for OpenAI-family models. Needs the `tiktoken` package and
+    its encoding files, which it downloads once unless they are cached."""
+
+    def __init__(self, encoding: str = "cl100k_base") -> None:
+        import tiktoken
+
+        self._encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+
+@lru_cache
+def get_estimator(name: str) -> TokenEstimator:
+    """`heuristic`, `tiktoken`, or `package.module:factory` for a custom one."""
+    if name == "heuristic":
+        return HeuristicEstimator()
+    if name == "tiktoken":
+        if importlib.util.find_spec("tiktoken") is None:
+            raise ValueError("TOKEN_ESTIMATOR=tiktoken requires the tiktoken package.")
+        return TiktokenEstimator()
+    module, _, attr = name.partition(":")
+    if not attr:
+        raise ValueError(f"Unsupported TOKEN_ESTIMATOR: {name}")
+    factory: Callable[[], TokenEstimator] = getattr(importlib.import_module(module), attr)
+    return factory()
+
+
+def evidence_line(span: Dict[str, Any]) -> str:
+    """How one span is written into the prompt; provenance is joined back on
+    after the reply, so only category, weight and text are sent."""
+    return f"{span['category']} {span['weight']:.2f} {json.dumps(span['text'], ensure_ascii=False)}"
+
+
+@dataclass
+class PackedEvidence:
+    spans: List[Dict[str, Any]]
+    tokens: int = 0
+    dropped: int = 0
+    per_category: Dict[str, int] = field(default_factory=dict)
+
+
+def pack_evidence(
+    ranked: List[Dict[str, Any]],
+    budget: int,
+    min_per_category: int,
+    estimator: TokenEstimator,
+) -> PackedEvidence:
+    """Fill `budget` tokens with evidence lines, best weight first.
+
+    `ranked` is AWFA output, best first. Each category's top
+    `min_per_category` spans are reserved before the rest compete on weight,
+    so a category with lower weights still reaches the prompt. A span that
+    does not fit is skipped and smaller ones after it may still be taken.
+    The packed spans keep their ranked order.
+    """
+    costs = [estimator.count(evidence_line(span)) + 1 for span in ranked]
+    taken = [False] * len(ranked)
+    used = 0
+
+    def take(index: int) -> None:
+        nonlocal used
+        if not taken[index] and used + costs[index] <= budget:
+            taken[index] = True
+            used += costs[index]
+
+    quota = {category: 0 for category in CATEGORIES}
+    for index, span in enumerate(ranked):
+        category = span["category"]
+        if quota.get(category, 0) < min_per_category:
+            quota[category] = quota.get(category, 0) + 1
+            take(index)
+    for index in range(len(ranked)):
+        take(index)
+
+    spans = [span for span, kept in zip(ranked, taken) if kept]
+    per_category = {category: 0 for category in CATEGORIES}
+    for span in spans:
+        per_category[span["category"]] = per_category.get(span["category"], 0) + 1
+    return PackedEvidence(spans, used, len(ranked) - len(spans), per_category)
+
+
+def pack_for(ranked: List[Dict[str, Any]], settings: Settings) -> PackedEvidence:
+    return pack_evidence(
+        ranked,
+        # A routed prompt may go to any of the providers, so it fits the smallest.
+        min(settings.evidence_token_budget_for(name) for name in settings.llm_provider_names()),
+        settings.evidence_min_per_category,
+        get_estimator(settings.token_estimator),
+    )
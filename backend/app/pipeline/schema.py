@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import List, Literal, Optional
+from typing import Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field, field_validator
 
@@ -10,6 +10,9 @@ class EvidenceSpan(BaseModel):
     weight: float
     category: Literal["E", "S", "G"]
     source_file: str
+    location: Optional[str] = None
+    char_start: Optional[int] = None
+    char_end: Optional[int] = None
 
 
 class Metric(BaseModel):
@@ -45,6 +48,13 @@ class ESGAggregation(BaseModel):
     total_esg_sentences: int
     total_weighted_blocks: int
     ocr_used: bool
+    evidence_packed: int = 0
+    evidence_dropped: int = 0
+    evidence_tokens: int = 0
+    # Files that failed to extract, with the reason. A streamed file that
+    # failed partway is also in `metadata.source_files`: its text up to the
+    # failure was used.
+    file_errors: Dict[str, str] = Field(default_factory=dict)
 
 
 class ESGOutput(BaseModel):
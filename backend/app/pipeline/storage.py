@@ -1,6 +1,180 @@
 from __future__ import annotations
 
+import io
+import mmap
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import BinaryIO, Iterator, Optional, Union
+
+from app.core.config import get_settings
+
 
 class StorageAdapter:
     def save(self, filename: str, data: bytes) -> str:
         raise NotImplementedError("Storage adapter not configured.")
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+@dataclass
+class StoredUpload:
+    """An upload spooled to a temporary file; pickles as its path."""
+
+    path: str
+    size: int
+
+    def open(self) -> BinaryIO:
+        return open(self.path, "rb")
+
+    @contextmanager
+    def view(self) -> Iterator[Union[mmap.mmap, bytes]]:
+        if self.size == 0:
+            yield b""
+            return
+        with self.open() as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+    def read_bytes(self) -> bytes:
+        with self.open() as fh:
+            return fh.read()
+
+    def cleanup(self) -> None:
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+# Pipeline inputs are either small in-memory uploads or spooled temp files.
+Source = Union[bytes, StoredUpload]
+
+
+def open_source(source: Source) -> BinaryIO:
+    if isinstance(source, StoredUpload):
+        return source.open()
+    return io.BytesIO(source)
+
+
+@contextmanager
+def source_view(source: Source) -> Iterator[Union[mmap.mmap, bytes]]:
+    if isinstance(source, StoredUpload):
+        with source.view() as mapped:
+            yield mapped
+    else:
+        yield source
+
+
+def source_bytes(source: Source) -> bytes:
+    if isinstance(source, StoredUpload):
+        return source.read_bytes()
+    return source
+
+
+def source_size(source: Source) -> int:
+    return source.size if isinstance(source, StoredUpload) else len(source)
+
+
+def cleanup_sources(sources) -> None:
+    for source in sources:
+        if isinstance(source, StoredUpload):
+            source.cleanup()
+
+
+class LocalStorageAdapter(StorageAdapter):
+    """Keeps uploads as files under `root`, keyed by relative path, so a queue
+    worker can pick them up. Spooled uploads are moved in rather than copied."""
+
+    def __init__(self, root: str) -> None:
+        self.root = os.path.realpath(root)
+
+    def _path(self, key: str) -> str:
+        path = os.path.realpath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def save(self, filename: str, data: Source) -> str:
+        path = self._path(filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if isinstance(data, StoredUpload):
+            try:
+                os.replace(data.path, path)
+            except OSError:
+                shutil.copyfile(data.path, path)
+                data.cleanup()
+        else:
+            partial = f"{path}.partial"
+            with open(partial, "wb") as fh:
+                fh.write(data)
+            os.replace(partial, path)
+        return filename
+
+    def load(self, key: str) -> StoredUpload:
+        path = self._path(key)
+        return StoredUpload(path=path, size=os.path.getsize(path))
+
+    def delete(self, key: str) -> None:
+        path = self._path(key)
+        StoredUpload(path=path, size=0).cleanup()
+        try:
+            os.rmdir(os.path.dirname(path))
+        except OSError:
+            pass
+
+
+@lru_cache
+def get_upload_storage() -> LocalStorageAdapter:
+    return LocalStorageAdapter(os.path.join(get_settings().state_dir, "uploads"))
+
+
+class SpooledUploadWriter:
+    """Accumulates upload chunks in memory up to `spool_bytes`, then on disk.
+
+    Raises `UploadTooLarge` as soon as `max_bytes` is exceeded so callers can
+    stop reading the request.
+    """
+
+    def __init__(self, max_bytes: int, spool_bytes: int, directory: Optional[str] = None) -> None:
+        self.max_bytes = max_bytes
+        self.spool_bytes = spool_bytes
+        self.directory = directory or None
+        self.size = 0
+        self._buffer = bytearray()
+        self._file = None
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            self.discard()
+            raise UploadTooLarge()
+        if self._file is None and self.size <= self.spool_bytes:
+            self._buffer.extend(chunk)
+            return
+        if self._file is None:
+            if self.directory:
+                os.makedirs(self.directory, exist_ok=True)
+            self._file = tempfile.NamedTemporaryFile(
+                prefix="axiomesg-", dir=self.directory, delete=False
+            )
+            self._file.write(self._buffer)
+            self._buffer = bytearray()
+        self._file.write(chunk)
+
+    def finish(self) -> Source:
+        if self._file is None:
+            return bytes(self._buffer)
+        self._file.close()
+        return StoredUpload(path=self._file.name, size=self.size)
+
+    def discard(self) -> None:
+        self._buffer = bytearray()
+        if self._file is not None:
+            self._file.close()
+            StoredUpload(path=self._file.name, size=0).cleanup()
+            self._file = None
@@ -0,0 +1,203 @@
+"""Queue worker: `python -m app.worker [--concurrency N]`.
+
+Pulls jobs that the API enqueued under JOB_EXECUTION=queue and runs the
+pipeline for them. Delivery is at least once: a job whose worker dies is
+handed out again after the visibility timeout, and a job that fails is
+retried with backoff until QUEUE_MAX_ATTEMPTS, then marked failed; one
+that no retry can fix (bad input or configuration) is failed at once.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import signal
+from contextlib import suppress
+
+from tenacity import RetryError
+
+from app.api.events import get_event_bus
+from app.api.job_store import JobRecord, _store_call
+from app.api.runner import JobRunner, get_job_runner
+from app.core import tracing
+from app.core.config import Settings, get_settings
+from app.core.http import get_http_pool
+from app.core.logging import configure_logging, get_logger
+from app.core.metrics import serve_metrics
+from app.core.queue import QueueMessage, get_job_queue
+from app.pipeline.executor import get_pipeline_executor
+from app.pipeline.extractor import shutdown_extraction_pool
+from app.pipeline.storage import LocalStorageAdapter, get_upload_storage
+
+logger = get_logger("worker")
+
+
+def _permanent(exc: BaseException) -> bool:
+    """Whether retrying cannot help: bad input or configuration, such as an
+    unsupported file type, a missing provider key or a schema violation, all
+    raise ValueError (pydantic's ValidationError is one). A reply that is not
+    JSON is a ValueError too, but a fresh call may parse, so it is retried."""
+    if isinstance(exc, RetryError) and exc.last_attempt.failed:
+        exc = exc.last_attempt.exception()
+    return isinstance(exc, ValueError) and not isinstance(exc, json.JSONDecodeError)
+
+
+class Worker:
+    def __init__(self, queue, runner: JobRunner, storage: LocalStorageAdapter, settings: Settings) -> None:
+        self.queue = queue
+        self.runner = runner
+        self.storage = storage
+        self.settings = settings
+
+    async def _heartbeat(self, message: QueueMessage) -> None:
+        # Keep the lease while the pipeline runs; a lost lease means another
+        # worker may already have the job, which at-least-once allows.
+        interval = max(1.0, self.queue.visibility_timeout / 3)
+        while True:
+            await asyncio.sleep(interval)
+            if not await asyncio.to_thread(self.queue.extend, message):
+                logger.warning("lease_lost", extra={"job_id": message.job_id})
+                return
+
+    def _finish(self, message: QueueMessage) -> None:
+        for entry in message.payload.get("files", []):
+            self.storage.delete(entry["key"])
+
+    async def handle(self, message: QueueMessage) -> None:
+        files = message.payload.get("files", [])
+        record = await _store_call(self.runner.store.get, message.job_id)
+        if record is None:
+            record = JobRecord(job_id=message.job_id, source_files=[f["filename"] for f in files])
+        elif record.status in ("done", "error"):
+            # Redelivered after the result was stored but before the ack landed.
+            # The batch may not have been advanced either; queueing its next
+            # child twice costs at most one extra slot, a lost one stalls it.
+            await self._advance_batch(message.payload.get("batch_id"))
+            await asyncio.to_thread(self.queue.ack, message)
+            await asyncio.to_thread(self._finish, message)
+            return
+        if message.attempts > self.queue.max_attempts:
+            # Workers kept dying on this job without reporting a failure.
+            exc = RuntimeError(f"Gave up after {message.attempts - 1} attempts.")
+            await self.runner.fail(record, exc)
+            await self._advance_batch(message.payload.get("batch_id"))
+            await asyncio.to_thread(self.queue.dead_letter, message, str(exc))
+            await asyncio.to_thread(self._finish, message)
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(message))
+        try:
+            sources = [(f["filename"], self.storage.load(f["key"]), f["content_type"]) for f in files]
+            with tracing.attach(message.payload.get("traceparent")):
+                await self.runner.run(
+                    record, sources, self.settings, bypass_cache=message.payload.get("no_cache", False)
+                )
+        except Exception as exc:
+            if message.attempts < self.queue.max_attempts and not _permanent(exc):
+                await self.runner.retry(record, exc, message.attempts)
+                delay = self.settings.queue_retry_backoff_seconds * 2 ** (message.attempts - 1)
+                await asyncio.to_thread(self.queue.release, message, delay)
+                return
+            await self.runner.fail(record, exc)
+            await self._advance_batch(message.payload.get("batch_id"))
+            await asyncio.to_thread(self.queue.dead_letter, message, str(exc))
+        else:
+            # Before the ack: a crash in between redelivers this job, which
+            # then advances the batch from the redelivery branch above.
+            await self._advance_batch(message.payload.get("batch_id"))
+            await asyncio.to_thread(self.queue.ack, message)
+        finally:
+            heartbeat.cancel()
+        await asyncio.to_thread(self._finish, message)
+
+    async def _advance_batch(self, batch_id: str | None) -> None:
+        """A child of `batch_id` finished: queue the batch's next staged
+        child and keep the batch record alive, even when the API process
+        that dispatched it has restarted."""
+        if not batch_id:
+            return
+        store = self.runner.store
+        try:
+            child = await _store_call(store.pop_batch_child, batch_id)
+            if child is not None:
+                try:
+                    await asyncio.to_thread(self.queue.enqueue, child["job_id"], child["payload"])
+                except Exception:
+                    await _store_call(store.push_batch_children, batch_id, [child])
+                    raise
+            batch = await _store_call(store.get_batch, batch_id)
+            if batch is not None:
+                await _store_call(store.set_batch, batch)
+        except Exception as exc:
+            logger.warning("batch_advance_failed", extra={"batch_id": batch_id, "error": str(exc)})
+
+    async def _slot(self, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            try:
+                message = await asyncio.to_thread(self.queue.reserve)
+            except Exception as exc:
+                logger.warning("queue_reserve_failed", extra={"error": str(exc)})
+                message = None
+            if message is None:
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(stop.wait(), self.settings.queue_poll_seconds)
+                continue
+            try:
+                await self.handle(message)
+            except Exception as exc:
+                # The lease lapses and the job is delivered again.
+                logger.error("job_handle_failed", extra={"job_id": message.job_id, "error": str(exc)})
+
+    async def serve(self, concurrency: int, stop: asyncio.Event) -> None:
+        """Run `concurrency` jobs at a time until `stop` is set; jobs already
+        started are finished before returning."""
+        await asyncio.gather(*(self._slot(stop) for _ in range(max(1, concurrency))))
+
+
+async def _main(concurrency: int) -> None:
+    settings = get_settings()
+    http_pool = get_http_pool()
+    clients = settings.llm_provider_names()
+    if settings.azure_docintel_endpoint:
+        clients.append("azure_docintel")
+    await http_pool.astart(clients)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop.set)
+
+    metrics_server = None
+    if settings.worker_metrics_port:
+        metrics_server = await serve_metrics("0.0.0.0", settings.worker_metrics_port)
+
+    worker = Worker(get_job_queue(), get_job_runner(), get_upload_storage(), settings)
+    logger.info("worker_started", extra={"concurrency": concurrency})
+    try:
+        await worker.serve(concurrency, stop)
+    finally:
+        if metrics_server is not None:
+            metrics_server.close()
+            await metrics_server.wait_closed()
+        await asyncio.to_thread(get_pipeline_executor().shutdown)
+        await asyncio.to_thread(shutdown_extraction_pool)
+        await http_pool.aclose()
+        http_pool.close()
+        await get_event_bus().aclose()
+        worker.queue.close()
+        logger.info("worker_stopped")
+
+
+def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(prog="python -m app.worker", description="Run queued AxiomESG jobs.")
+    parser.add_argument("--concurrency", type=int, default=settings.worker_concurrency)
+    args = parser.parse_args()
+    configure_logging(settings.log_level)
+    asyncio.run(_main(args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Compare batch top-K AWFA selection with the original per-sentence path + full sort.
+
+Run from backend/: python -m benchmarks.bench_awfa [--sentences N] [--top-k K]
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import time
+from typing import Dict, List, Tuple
+
+from app.pipeline.awfa import top_awfa
+
+FILLER = (
+    "the company reported annual results with revenue growth and operating margin "
+    "improvements across regions while investing in new product lines and services"
+).split()
+KEYWORDS = {
+    "E": ["emission", "carbon", "climate", "energy", "water", "waste"],
+    "S": ["diversity", "inclusion", "safety", "labor", "community", "privacy"],
+    "G": ["governance", "board", "ethics", "compliance", "audit", "risk"],
+}
+
+
+def _sentences(count: int, rng: random.Random) -> Dict[str, List[str]]:
+    out: Dict[str, List[str]] = {"E": [], "S": [], "G": []}
+    for i in range(count):
+        category = rng.choice("ESG")
+        words = [rng.choice(FILLER) for _ in range(rng.randint(4, 30))]
+        for _ in range(rng.randint(1, 3)):
+            words.insert(rng.randrange(len(words)), rng.choice(KEYWORDS[category]))
+        out[category].append(" ".join(words) + f" {i}.")
+    return out
+
+
+def scalar_normalize(text: str) -> str:
+    text = text.lower()
+    text = re.sub(r"[^a-z0-9\s]", "", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def scalar_weight(sentence: str, category: str) -> float:
+    base = 0.4
+    length_bonus = min(len(sentence) / 200.0, 0.6)
+    keyword_bonus = 0.0
+    lowered = sentence.lower()
+    if category == "E":
+        keywords = ["emission", "carbon", "climate", "energy", "water", "waste"]
+    elif category == "S":
+        keywords = ["diversity", "inclusion", "safety", "labor", "community", "privacy"]
+    else:
+        keywords = ["governance", "board", "ethics", "compliance", "audit", "risk"]
+    for kw in keywords:
+        if kw in lowered:
+            keyword_bonus += 0.1
+    return round(min(base + length_bonus + keyword_bonus, 1.0), 3)
+
+
+def full_sort(category_sentences: Dict[str, List[str]]) -> List[Tuple[str, str, float]]:
+    seen = set()
+    weighted: List[Tuple[str, str, float]] = []
+    for category, sentences in category_sentences.items():
+        for sentence in sentences:
+            key = scalar_normalize(sentence)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            weighted.append((category, sentence, scalar_weight(sentence, category)))
+    weighted.sort(key=lambda x: (-x[2], x[1]))
+    return weighted
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sentences", type=int, default=50000)
+    parser.add_argument("--top-k", type=int, default=60)
+    args = parser.parse_args()
+
+    sentences = _sentences(args.sentences, random.Random(7))
+    t0 = time.perf_counter()
+    expected = full_sort(sentences)
+    t_sort = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    actual, total = top_awfa(sentences, args.top_k)
+    t_top = time.perf_counter() - t0
+    assert actual == expected[: args.top_k] and total == len(expected)
+    print(f"{'sentences':>10} {'full sort s':>12} {'top-k s':>8}")
+    print(f"{args.sentences:>10} {t_sort:>12.3f} {t_top:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
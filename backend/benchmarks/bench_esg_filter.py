@@ -0,0 +1,86 @@
+"""Compare the single-pass KeywordMatcher with the per-keyword substring loop.
+
+Run from backend/: python -m benchmarks.bench_esg_filter [--sentences N]
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import Dict, List
+
+from app.pipeline.esg_filter import DEFAULT_E, DEFAULT_G, DEFAULT_S, KeywordMatcher
+
+FILLER = (
+    "the company reported annual results with revenue growth and operating margin "
+    "improvements across regions while investing in new product lines and services"
+).split()
+
+
+def _sentences(count: int, keywords: List[str], rng: random.Random) -> List[str]:
+    out = []
+    for _ in range(count):
+        words = [rng.choice(FILLER) for _ in range(25)]
+        if rng.random() < 0.3:
+            words.insert(rng.randrange(len(words)), rng.choice(keywords))
+        out.append(" ".join(words) + ".")
+    return out
+
+
+def _keywords(extra_per_category: int) -> Dict[str, List[str]]:
+    base = {"E": DEFAULT_E, "S": DEFAULT_S, "G": DEFAULT_G}
+    return {
+        category: words + [f"{category.lower()}-term-{i}" for i in range(extra_per_category)]
+        for category, words in base.items()
+    }
+
+
+def substring_loop(sentences: List[str], keywords: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    result: Dict[str, List[str]] = {"E": [], "S": [], "G": []}
+    for sentence in sentences:
+        lowered = sentence.lower()
+        for category in ("E", "S", "G"):
+            if any(k in lowered for k in keywords[category]):
+                result[category].append(sentence)
+    return result
+
+
+def single_pass(sentences: List[str], matcher: KeywordMatcher) -> Dict[str, List[str]]:
+    result: Dict[str, List[str]] = {"E": [], "S": [], "G": []}
+    for sentence in sentences:
+        hits = matcher.match(sentence.lower())
+        for category in ("E", "S", "G"):
+            if hits[category]:
+                result[category].append(sentence)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sentences", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    print(f"{'keywords':>9} {'loop s':>8} {'matcher s':>10} {'loop sent/s':>12} {'matcher sent/s':>15}")
+    for extra in (0, 40, 100, 200):
+        keywords = _keywords(extra)
+        flat = [k for words in keywords.values() for k in words]
+        sentences = _sentences(args.sentences, flat, rng)
+        matcher = KeywordMatcher(keywords)
+
+        t0 = time.perf_counter()
+        expected = substring_loop(sentences, keywords)
+        t_loop = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        actual = single_pass(sentences, matcher)
+        t_matcher = time.perf_counter() - t0
+        assert actual == expected
+
+        print(
+            f"{len(flat):>9} {t_loop:>8.3f} {t_matcher:>10.3f} "
+            f"{len(sentences) / t_loop:>12.0f} {len(sentences) / t_matcher:>15.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
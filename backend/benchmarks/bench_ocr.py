@@ -0,0 +1,79 @@
+"""Load-test the OCR engine against the local Document Intelligence stand-in.
+
+Run from backend/: python -m benchmarks.bench_ocr [--documents N] [--latency S]
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import socket
+import threading
+import time
+
+import httpx
+import uvicorn
+from pypdf import PdfWriter
+
+from app.core.config import Settings
+from app.pipeline.ocr_azure import ocr_documents
+from benchmarks.docintel_server import create_app
+
+
+def _blank_pdf(pages: int) -> bytes:
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=612, height=792)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=24)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    parser.add_argument("--failure-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    port = _free_port()
+    app = create_app(args.latency, args.retry_after, failure_rate=args.failure_rate)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    documents = [(_blank_pdf(args.pages), "application/pdf")] * args.documents
+    try:
+        for concurrency in (1, 4, args.documents):
+            settings = Settings(
+                AZURE_DOCINTEL_ENDPOINT=f"http://127.0.0.1:{port}",
+                AZURE_DOCINTEL_KEY="stand-in",
+                OCR_CONCURRENCY=concurrency,
+            )
+            before = httpx.get(f"http://127.0.0.1:{port}/stats").json()
+            started = time.perf_counter()
+            results = ocr_documents(documents, settings)
+            elapsed = time.perf_counter() - started
+            after = httpx.get(f"http://127.0.0.1:{port}/stats").json()
+            failed = sum(isinstance(r, BaseException) for r in results)
+            print(
+                f"concurrency={concurrency:<3} documents={args.documents} {elapsed:6.2f}s "
+                f"submits={after['submits'] - before['submits']} polls={after['polls'] - before['polls']} "
+                f"poll_failures={after['poll_failures'] - before['poll_failures']} failed={failed}"
+            )
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+
+if __name__ == "__main__":
+    main()
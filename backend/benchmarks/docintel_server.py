@@ -0,0 +1,129 @@
+"""Local stand-in for the Azure Document Intelligence read API, for offline load tests.
+
+Implements the two calls the OCR engine makes: the `prebuilt-read:analyze`
+submit (202 + Operation-Location + Retry-After) and the analyze-result poll.
+Results are synthetic ("page N" text per PDF page) and become ready after
+`--latency` seconds. Throttling, transient poll failures and Retry-After
+can all be dialled in.
+
+Run from backend/:
+    python -m benchmarks.docintel_server --port 8900 --latency 2
+then point AZURE_DOCINTEL_ENDPOINT=http://127.0.0.1:8900 (any key).
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import random
+import time
+import uuid
+from typing import Any, Dict
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+from pypdf import PdfReader
+
+ANALYZE_PATH = "/documentintelligence/documentModels/prebuilt-read:analyze"
+RESULT_PATH = "/documentintelligence/documentModels/prebuilt-read/analyzeResults/{operation_id}"
+
+
+def _page_count(body: bytes, content_type: str) -> int:
+    if "pdf" not in content_type:
+        return 1
+    try:
+        return max(1, len(PdfReader(io.BytesIO(body)).pages))
+    except Exception:
+        return 1
+
+
+def _analyze_result(pages: int) -> Dict[str, Any]:
+    parts, spans, offset = [], [], 0
+    for number in range(1, pages + 1):
+        text = f"Stand-in OCR text for page {number}. Scope 1 carbon emissions fell 4% and the board reviewed safety."
+        spans.append({"pageNumber": number, "spans": [{"offset": offset, "length": len(text)}]})
+        parts.append(text)
+        offset += len(text) + 1
+    return {"apiVersion": "2024-02-29-preview", "content": "\n".join(parts), "pages": spans}
+
+
+def create_app(
+    latency: float = 1.0,
+    retry_after: float = 1.0,
+    max_inflight: int = 0,
+    poll_failures: int = 0,
+    failure_rate: float = 0.0,
+    seed: int = 0,
+) -> FastAPI:
+    """`max_inflight` > 0 answers submits beyond that many running operations
+    with 429; each operation fails its first `poll_failures` polls with 503,
+    and any poll fails with probability `failure_rate`."""
+    app = FastAPI(title="Document Intelligence stand-in")
+    rng = random.Random(seed)
+    operations: Dict[str, Dict[str, Any]] = {}
+    stats = {"submits": 0, "throttled": 0, "polls": 0, "poll_failures": 0, "bytes": 0, "pages": 0}
+    app.state.stats = stats
+
+    def running() -> int:
+        now = time.monotonic()
+        return sum(1 for op in operations.values() if op["ready_at"] > now)
+
+    @app.post(ANALYZE_PATH)
+    async def analyze(request: Request) -> Response:
+        if max_inflight and running() >= max_inflight:
+            stats["throttled"] += 1
+            return JSONResponse({"error": {"code": "429"}}, status_code=429, headers={"Retry-After": str(retry_after)})
+        body = await request.body()
+        pages = _page_count(body, request.headers.get("content-type", ""))
+        stats["submits"] += 1
+        stats["bytes"] += len(body)
+        stats["pages"] += pages
+        operation_id = uuid.uuid4().hex
+        operations[operation_id] = {
+            "ready_at": time.monotonic() + latency,
+            "pages": pages,
+            "failures_left": poll_failures,
+        }
+        location = str(request.base_url).rstrip("/") + RESULT_PATH.format(operation_id=operation_id)
+        return Response(
+            status_code=202,
+            headers={"Operation-Location": f"{location}?api-version=2024-02-29-preview", "Retry-After": str(retry_after)},
+        )
+
+    @app.get(RESULT_PATH)
+    async def result(operation_id: str) -> Response:
+        stats["polls"] += 1
+        operation = operations.get(operation_id)
+        if operation is None:
+            return JSONResponse({"error": {"code": "NotFound"}}, status_code=404)
+        if operation["failures_left"] > 0 or (failure_rate and rng.random() < failure_rate):
+            operation["failures_left"] = max(0, operation["failures_left"] - 1)
+            stats["poll_failures"] += 1
+            return JSONResponse({"error": {"code": "ServiceUnavailable"}}, status_code=503)
+        if operation["ready_at"] > time.monotonic():
+            return JSONResponse({"status": "running"}, headers={"Retry-After": str(retry_after)})
+        return JSONResponse({"status": "succeeded", "analyzeResult": _analyze_result(operation["pages"])})
+
+    @app.get("/stats")
+    async def get_stats() -> Dict[str, Any]:
+        return stats
+
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--max-inflight", type=int, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    app = create_app(args.latency, args.retry_after, args.max_inflight, failure_rate=args.failure_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
-from app.pipeline.awfa import apply_awfa
+import random
+
+from app.pipeline.awfa import StreamingAWFA, _weight, apply_awfa, top_awfa, weigh_batch
 
 
 def test_awfa_dedup():
@@ -9,3 +11,38 @@ def test_awfa_dedup():
     }
     weighted = apply_awfa(sentences)
     assert len(weighted) == 1
+
+
+def test_awfa_near_duplicates_follow_threshold():
+    base = "In 2023 we reduced Scope 1 carbon emissions across our manufacturing sites by 12% against the baseline."
+    sentences = {
+        "E": [base, base.replace("2023", "2024"), "Water withdrawal fell 3% in drought-prone regions."],
+        "S": [],
+        "G": [base.replace("2023", "2025")],
+    }
+    assert len(apply_awfa(sentences)) == 4
+    near = apply_awfa(sentences, near_duplicate_threshold=0.8)
+    assert [(c, s) for c, s, _ in near] == [("E", base), ("E", sentences["E"][2])]
+
+    streaming = StreamingAWFA(top_k=10, near_duplicate_threshold=0.8)
+    for category, items in sentences.items():
+        for sentence in items:
+            streaming.add(category, sentence)
+    assert streaming.total == 2
+    assert [item[:3] for item in streaming.ranked()] == near
+
+
+def test_top_awfa_matches_full_sort_and_scalar_weights():
+    rng = random.Random(3)
+    words = ["carbon", "water", "board", "audit", "safety", "labor", "risk", "the", "we", "grew", "fell"]
+    sentences = {
+        category: [" ".join(rng.choice(words) for _ in range(rng.randint(1, 40))) + "." for _ in range(300)]
+        for category in ("E", "S", "G")
+    }
+    full = apply_awfa(sentences)
+    top, total = top_awfa(sentences, 25)
+    assert top == full[:25]
+    assert total == len(full)
+    texts = [sentence for _, sentence, _ in full]
+    categories = [category for category, _, _ in full]
+    assert weigh_batch(texts, categories).tolist() == [_weight(t, c) for t, c in zip(texts, categories)]
@@ -0,0 +1,148 @@
+import asyncio
+import json
+
+import httpx
+from fastapi import FastAPI
+
+from app.api import batches
+from app.api.batches import BatchDispatcher, batch_summary
+from app.api.events import InProcessEventBus
+from app.api.job_store import BatchRecord, InMemoryJobStore, JobRecord, ProgressWriter, SqliteJobStore
+from app.api.routes import router
+from app.api.runner import JobRunner
+from app.core.config import Settings
+from app.core.queue import SqliteJobQueue
+from app.pipeline.storage import LocalStorageAdapter
+from app.worker import Worker
+from tests.test_worker import _output
+
+
+class SlowExecutor:
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    async def run(self, files, settings, job_id, stage_callback=None, bypass_cache=False, section_callback=None):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.02)
+        self.active -= 1
+        if files[0][0] == "broken.pdf":
+            raise RuntimeError("unreadable")
+        return _output(), "raw", {}
+
+
+def test_dispatcher_limits_concurrency_and_publishes_each_child():
+    async def scenario():
+        store = InMemoryJobStore(ttl_seconds=60)
+        bus = InProcessEventBus()
+        executor = SlowExecutor()
+        dispatcher = BatchDispatcher(JobRunner(store, bus, ProgressWriter(store, 0.01), executor), global_limit=3)
+        batches = []
+        for b in range(2):
+            batch = BatchRecord(batch_id=f"b{b}", concurrency=2)
+            children = []
+            for c in range(4):
+                record = JobRecord(job_id=f"b{b}-c{c}", source_files=["r.pdf"])
+                store.set(record)
+                files = [("broken.pdf" if c == 3 else "r.pdf", b"%PDF", "application/pdf")]
+                children.append((record, files))
+                batch.children.append({"name": f"Company {c}", "job_id": record.job_id})
+            store.set_batch(batch)
+            batches.append((batch, children))
+        subscription = await bus.subscribe("b0")
+        await asyncio.gather(*(dispatcher.run(batch, children, Settings()) for batch, children in batches))
+        events = []
+        while not subscription.queue.empty():
+            events.append(subscription.queue.get_nowait())
+        return executor, events, await batch_summary(store, batches[0][0])
+
+    executor, events, summary = asyncio.run(scenario())
+    assert executor.peak == 3
+    children = [e for e in events if e["type"] == "child"]
+    assert len(children) == 4 and events[-1]["type"] == "done"
+    assert all(e["result"] for e in children if e["status"] == "done")
+    assert summary["counts"] == {"queued": 0, "running": 0, "done": 3, "error": 1}
+    assert summary["status"] == "done" and summary["progress"] == 100
+
+
+def test_batch_manifest_must_cover_uploads():
+    app = FastAPI()
+    app.include_router(router)
+
+    async def post(manifest):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(
+                "/api/batches",
+                data={"manifest": json.dumps(manifest)},
+                files=[("files", ("a.csv", b"carbon", "text/csv")), ("files", ("b.csv", b"board", "text/csv"))],
+            )
+
+    response = asyncio.run(post({"groups": [{"name": "Acme", "files": ["a.csv", "c.csv"]}]}))
+    assert response.status_code == 400
+    assert "missing: ['c.csv']" in response.json()["detail"]
+    assert asyncio.run(post({"groups": []})).status_code == 400
+
+
+def test_waiting_children_outlive_the_store_ttl():
+    class Sleepy(SlowExecutor):
+        async def run(self, files, settings, job_id, *args, **kwargs):
+            await asyncio.sleep(0.15)
+            return _output(), "raw", {}
+
+    async def scenario():
+        store = InMemoryJobStore(ttl_seconds=0.3)
+        runner = JobRunner(store, InProcessEventBus(), ProgressWriter(store, 0.01), Sleepy())
+        batch = BatchRecord(batch_id="long", concurrency=1)
+        children = []
+        for c in range(4):
+            record = JobRecord(job_id=f"long-{c}", source_files=["r.pdf"])
+            store.set(record)
+            children.append((record, [("r.pdf", b"%PDF", "application/pdf")]))
+            batch.children.append({"name": f"Company {c}", "job_id": record.job_id})
+        store.set_batch(batch)
+        task = asyncio.create_task(BatchDispatcher(runner, global_limit=4).run(batch, children, Settings()))
+        last = []
+        while not task.done():
+            # The last child waits ~0.45s for its slot, past the TTL.
+            summary = await batch_summary(store, store.get_batch("long"))
+            last.append(summary["children"][-1]["status"])
+            await asyncio.sleep(0.05)
+        return last
+
+    statuses = asyncio.run(scenario())
+    assert "queued" in statuses and "error" not in statuses
+
+
+def test_queue_mode_stages_children_and_workers_advance_the_batch(tmp_path, monkeypatch):
+    queue = SqliteJobQueue(str(tmp_path / "queue.db"), visibility_timeout=30, max_attempts=3)
+    monkeypatch.setattr(batches, "get_job_queue", lambda: queue)
+    store = SqliteJobStore(str(tmp_path / "jobs.db"), ttl_seconds=60)
+    storage = LocalStorageAdapter(str(tmp_path / "uploads"))
+    runner = JobRunner(store, InProcessEventBus(), ProgressWriter(store, 0.01), SlowExecutor())
+    worker = Worker(queue, runner, storage, Settings(QUEUE_RETRY_BACKOFF_SECONDS=0))
+
+    async def scenario():
+        batch = BatchRecord(batch_id="q", children=[], concurrency=2)
+        children = []
+        for c in range(3):
+            key = storage.save(f"q-{c}/000", b"carbon emissions fell.")
+            children.append((JobRecord(job_id=f"q-{c}"), [{"filename": "a.csv", "key": key, "content_type": None}]))
+            batch.children.append({"name": str(c), "job_id": f"q-{c}"})
+        store.set_batch(batch)
+        await BatchDispatcher(runner, 1).enqueue(batch, children)
+
+        first, second = queue.reserve(), queue.reserve()
+        assert (first.job_id, second.job_id, queue.reserve()) == ("q-0", "q-1", None)
+        assert first.payload["batch_id"] == "q"
+        await worker.handle(first)
+        third = queue.reserve()
+        assert third.job_id == "q-2" and queue.reserve() is None
+        await worker.handle(second)
+        await worker.handle(third)
+        return await batch_summary(store, batch)
+
+    summary = asyncio.run(scenario())
+    assert summary["status"] == "done" and summary["counts"]["done"] == 3
+    assert store.pop_batch_child("q") is None
@@ -1,5 +1,5 @@
 from app.core.config import Settings
-from app.pipeline.esg_filter import filter_esg_sentences
+from app.pipeline.esg_filter import KeywordMatcher, filter_esg_sentences
 
 
 def test_esg_filter_basic():
@@ -8,3 +8,10 @@ def test_esg_filter_basic():
     result = filter_esg_sentences(text, settings)
     assert any("carbon" in s.lower() for s in result["E"])
     assert any("safety" in s.lower() for s in result["S"])
+
+
+def test_keyword_matcher_reports_overlapping_hits():
+    matcher = KeywordMatcher({"E": ["emission", "emissions data"], "S": ["safety"], "G": ["risk", "missions"]})
+    hits = matcher.match("scope 1 emissions data and safety risk")
+    assert hits == {"E": ["emission", "emissions data"], "S": ["safety"], "G": ["missions", "risk"]}
+    assert matcher.match("quarterly revenue grew") == {"E": [], "S": [], "G": []}
@@ -0,0 +1,46 @@
+import asyncio
+import json
+
+import httpx
+
+from app.api.events import get_event_bus
+from app.api.job_store import JobRecord, get_job_store
+from app.api.routes import router
+from fastapi import FastAPI
+
+
+def _events(body: str):
+    return [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+
+
+def test_job_events_stream_progress_then_final_result():
+    app = FastAPI()
+    app.include_router(router)
+
+    async def scenario():
+        store = get_job_store()
+        record = JobRecord(job_id="sse-1", status="running", stage="EXTRACT", progress=20)
+        store.set(record)
+        bus = get_event_bus()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            request = asyncio.create_task(client.get("/api/jobs/sse-1/events"))
+            while "sse-1" not in bus._subscribers:
+                await asyncio.sleep(0.01)
+            bus.publish("sse-1", {"type": "progress", "job_id": "sse-1", "stage": "FILTER", "progress": 40})
+            done = JobRecord(job_id="sse-1", status="done", stage="OUTPUT", progress=100, result={"ok": True})
+            bus.publish("sse-1", {"type": "done", **done.to_dict()})
+            response = await request
+            store.set(done)
+            late = await client.get("/api/jobs/sse-1/events")
+        return response, late
+
+    response, late = asyncio.run(scenario())
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert [(e["type"], e["stage"]) for e in _events(response.text)] == [
+        ("progress", "EXTRACT"),
+        ("progress", "FILTER"),
+        ("done", "OUTPUT"),
+    ]
+    assert _events(response.text)[-1]["result"] == {"ok": True}
+    assert [e["type"] for e in _events(late.text)] == ["done"]
@@ -0,0 +1,24 @@
+import asyncio
+
+import pytest
+
+from app.core.config import Settings
+from app.pipeline.executor import PipelineExecutor
+
+
+def test_process_executor_reports_stages():
+    settings = Settings(LLM_PROVIDER="openrouter", OPENROUTER_API_KEY="")
+    files = [("report.csv", b"We reduced carbon emissions by 12%. Board oversight improved.", "text/csv")]
+    executor = PipelineExecutor("process", 1)
+    stages = []
+
+    async def run():
+        with pytest.raises(ValueError):
+            await executor.run(files, settings, "job-1", lambda stage, progress: stages.append(stage))
+        await asyncio.sleep(0.2)
+
+    try:
+        asyncio.run(run())
+    finally:
+        executor.shutdown()
+    assert stages == ["EXTRACT", "FILTER", "WEIGHT", "INTELLIGENCE"]
@@ -0,0 +1,152 @@
+from app.core.config import Settings
+from app.pipeline import executor, extractor
+from app.pipeline.extractor import (
+    CachedExtraction,
+    ExtractionCache,
+    _extract_pdf,
+    extract_document_entries,
+    extract_documents,
+)
+
+
+def _make_pdf(pages):
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def test_extraction_cache_hits_on_same_bytes():
+    settings = Settings(EXTRACT_CACHE_MAX_ENTRIES=8)
+    files = [("a.csv", b"Carbon emissions fell by 4%.", "text/csv"), ("b.csv", b"Carbon emissions fell by 4%.", "text/csv")]
+    stats = {}
+    texts, ocr_used = extract_documents(files, settings, stats)
+    assert texts["a.csv"] == texts["b.csv"]
+    assert not ocr_used
+    assert stats["cache_hits"] >= 1
+
+
+def test_extraction_cache_disk_tier_evicts_by_size(tmp_path):
+    cache = ExtractionCache(max_entries=0, disk_dir=str(tmp_path), disk_max_bytes=200)
+    for i in range(5):
+        cache.put(f"k{i}", CachedExtraction(text="x" * 60, ocr_used=False))
+    assert cache.get("k4").text == "x" * 60
+    assert sum(p.stat().st_size for p in tmp_path.glob("*.json")) <= 200
+
+
+def test_parallel_extraction_keeps_order_and_isolates_errors():
+    settings = Settings(EXTRACT_CONCURRENCY=2, EXTRACT_CACHE_ENABLED=False)
+    files = [
+        ("c.csv", b"Water use fell.", "text/csv"),
+        ("broken.docx", b"not a docx", None),
+        ("a.csv", b"Board audit completed.", "text/csv"),
+    ]
+    stats = {}
+    texts, _ = extract_documents(files, settings, stats)
+    assert list(texts) == ["c.csv", "a.csv"]
+    assert "broken.docx" in stats["file_errors"]
+    assert set(stats["file_timings"]) == {"c.csv", "broken.docx", "a.csv"}
+
+
+def test_pipeline_pool_workers_extract_in_process(monkeypatch):
+    monkeypatch.setattr(extractor, "_in_pool_worker", False)
+    executor._init_worker(None)
+    assert extractor._in_pool_worker
+
+    def no_pool(max_workers):
+        raise AssertionError("pool workers must not start an extraction pool")
+
+    monkeypatch.setattr(extractor, "_extraction_pool", no_pool)
+    settings = Settings(EXTRACT_CONCURRENCY=4, EXTRACT_CACHE_ENABLED=False)
+    files = [("a.csv", b"Water use fell.", "text/csv"), ("b.csv", b"Board audit completed.", "text/csv")]
+    texts, _ = extract_documents(files, settings, {})
+    assert list(texts) == ["a.csv", "b.csv"]
+
+
+def test_sharded_pdf_extraction_matches_sequential():
+    data = _make_pdf([f"Page {i} carbon emissions." for i in range(12)])
+    sequential, pages, markers = _extract_pdf(data)
+    sharded, _, sharded_markers = _extract_pdf(data, Settings(PDF_SHARD_MIN_PAGES=4, PDF_SHARD_WORKERS=2))
+    assert pages == 12
+    assert sharded == sequential
+    assert sharded_markers == markers
+    assert markers[3] == (sequential.index("Page 3 carbon"), "page 4")
+
+
+def test_low_text_pages_are_ocrd_as_a_sub_pdf_and_merged_in_order(monkeypatch):
+    import io
+
+    from PIL import Image
+    from pypdf import PdfReader, PdfWriter
+
+    from app.pipeline import extractor
+    from app.pipeline.ocr_azure import OcrResult
+
+    scan = io.BytesIO()
+    Image.new("RGB", (60, 80), "white").save(scan, "PDF")
+    text_pages = PdfReader(io.BytesIO(_make_pdf([
+        "Scope 1 carbon emissions fell by four percent against the 2019 baseline year. " * 2,
+        "The board audit committee reviewed anti-corruption and compliance policies in 2023. " * 2,
+    ])))
+    writer = PdfWriter()
+    writer.add_page(text_pages.pages[0])
+    writer.add_page(PdfReader(scan).pages[0])
+    writer.add_page(text_pages.pages[1])
+    writer.add_page(PdfReader(scan).pages[0])
+    hybrid = io.BytesIO()
+    writer.write(hybrid)
+
+    sent = []
+
+    def fake_ocr(documents, settings):
+        sent.extend(documents)
+        results = []
+        for data, _ in documents:
+            count = len(PdfReader(io.BytesIO(data)).pages)
+            pages = [f"Scanned {i}: water withdrawals fell 9%." for i in range(count)]
+            results.append(OcrResult("\n".join(pages), pages))
+        return results
+
+    monkeypatch.setattr(extractor, "ocr_documents", fake_ocr)
+    settings = Settings(AZURE_DOCINTEL_ENDPOINT="http://docintel", AZURE_DOCINTEL_KEY="k", EXTRACT_CACHE_ENABLED=False)
+    files = [("hybrid.pdf", hybrid.getvalue(), "application/pdf")]
+    stats = {}
+    entry = extractor.extract_document_entries(files, settings, stats)["hybrid.pdf"]
+
+    assert len(sent) == 1 and len(PdfReader(io.BytesIO(sent[0][0])).pages) == 2
+    assert stats["ocr_pages"] == 2 and entry.ocr_used
+    assert [location for _, location in entry.blocks()] == ["page 1", "page 2", "page 3", "page 4"]
+    assert entry.location(entry.text.index("Scanned 1")) == "page 4"
+    # Streaming sends the file's thin pages in one sub-PDF too.
+    streamed = [(b.text, b.location) for b in extractor.iter_document_blocks(files, settings)]
+    assert streamed == list(entry.blocks())
+    assert len(sent) == 2
+
+
+def test_line_locations_use_recorded_row_offsets(tmp_path):
+    settings = Settings(EXTRACT_CACHE_ENABLED=False)
+    text = "year,metric\n\n2023,scope 1\n2024,scope 2"
+    entry = extract_document_entries([("k.csv", text.encode(), "text/csv")], settings)["k.csv"]
+    assert entry.line_starts == [0, 12, 13, 26]
+    for offset in range(len(text) + 1):
+        assert entry.location(offset) == f"row {text.count(chr(10), 0, offset) + 1}"
+
+    cache = ExtractionCache(0, str(tmp_path), 10_000)
+    cache.put("k", entry)
+    assert cache.get("k").line_starts == entry.line_starts
@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+from app.api.job_store import InMemoryJobStore, JobRecord, ProgressWriter, _store_call
+
+
+class RecordingStore(InMemoryJobStore):
+    def __init__(self) -> None:
+        super().__init__(ttl_seconds=60)
+        self.writes = []
+
+    async def update(self, job_id, fields):
+        self.writes.append(dict(fields))
+        await asyncio.sleep(0.01)
+        super().update(job_id, fields)
+
+
+def test_progress_writer_coalesces_latest_wins():
+    async def scenario():
+        store = RecordingStore()
+        store.set(JobRecord(job_id="j1"))
+        writer = ProgressWriter(store, interval=0.02)
+        for progress in range(10, 60, 10):
+            writer.update("j1", stage="FILTER", progress=progress)
+        await asyncio.sleep(0.05)
+        writer.update("j1", stage="WEIGHT", progress=55)
+        writer.update("j1", stage="INTELLIGENCE", progress=75)
+        await asyncio.sleep(0.05)
+        writer.update("j1", stage="VALIDATE", progress=90)
+        await writer.close("j1")
+        return store
+
+    store = asyncio.run(scenario())
+    assert store.writes == [
+        {"stage": "FILTER", "progress": 50},
+        {"stage": "INTELLIGENCE", "progress": 75},
+    ]
+    assert store.get("j1").progress == 75
+
+
+def test_sync_store_calls_do_not_block_the_event_loop():
+    class SlowStore:
+        def get(self, job_id):
+            time.sleep(0.2)
+            return None
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await _store_call(SlowStore().get, "job")
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(scenario()) >= 10
@@ -0,0 +1,82 @@
+from app.core.config import Settings
+from app.pipeline.llm.base import LLMResult
+from app.pipeline.llm.cache import CachedLLMClient, MemoryResponseCache
+
+
+class FakeClient:
+    provider = "fake"
+    model = "fake-model"
+    temperature = 0.1
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, prompt, request_id):
+        self.calls += 1
+        return LLMResult(text="{}", usage={"total_tokens": 10}, model_name=self.model)
+
+
+def test_llm_cache_hit_and_bypass():
+    inner = FakeClient()
+    cache = MemoryResponseCache(ttl_seconds=60, max_entries=2)
+    client = CachedLLMClient(inner, cache)
+    client.generate("Evidence:  a", "job-1")
+    result = client.generate("Evidence: a ", "job-2")
+    assert inner.calls == 1
+    assert result.usage["cache_hit"] is True
+
+    CachedLLMClient(inner, cache, bypass=True).generate("Evidence: a", "job-3")
+    assert inner.calls == 2
+
+
+def test_memory_response_cache_evicts_oldest():
+    cache = MemoryResponseCache(ttl_seconds=60, max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.set(key, {"text": key})
+    assert cache.get("a") is None
+    assert cache.get("c") == {"text": "c"}
+
+
+def test_replies_the_pipeline_cannot_use_are_evicted(monkeypatch):
+    from app.pipeline import orchestrator
+    from tests.test_orchestrator import SectionClient, _prepared
+
+    inner = SectionClient()
+    cache = MemoryResponseCache(ttl_seconds=60, max_entries=10)
+    client = CachedLLMClient(inner, cache)
+    monkeypatch.setattr(orchestrator, "get_llm_client", lambda *args, **kwargs: client)
+    settings = Settings(LLM_PROMPT_MODE="sections")
+    orchestrator.complete_run(_prepared(), settings, "job-1")
+    assert len(inner.prompts) == 3
+
+    # Environmental and the social repair are served from the cache; the
+    # invalid first social reply was dropped, so social is asked again.
+    orchestrator.complete_run(_prepared(), settings, "job-2")
+    social = [p for p in inner.prompts if "social section" in p and not p.startswith("Fix")]
+    assert len(inner.prompts) == 4 and len(social) == 2
+
+
+def test_streamed_cache_hits_record_no_time_to_first_token(monkeypatch):
+    import asyncio
+
+    from app.pipeline import orchestrator
+    from tests.test_orchestrator import TruncatingClient, _prepared
+
+    class FullStream(TruncatingClient):
+        async def astream(self, prompt, request_id, on_text):
+            self.prompts.append(prompt)
+            on_text(self.reply)
+            return LLMResult(text=self.reply, usage={}, model_name=self.model, first_token_s=0.01)
+
+    prepared = _prepared()
+    inner = FullStream({span["category"]: span["text"] for span in prepared.evidence})
+    client = CachedLLMClient(inner, MemoryResponseCache(ttl_seconds=60, max_entries=10))
+    monkeypatch.setattr(orchestrator, "get_llm_client", lambda *args, **kwargs: client)
+    settings = Settings(LLM_STREAMING=True)
+
+    asyncio.run(orchestrator.complete_run_async(prepared, settings, "job-1"))
+    assert prepared.timings["llm_ttft_s"] == 0.01
+    replayed = _prepared()
+    asyncio.run(orchestrator.complete_run_async(replayed, settings, "job-2"))
+    assert len(inner.prompts) == 1
+    assert "llm_ttft_s" not in replayed.timings
@@ -0,0 +1,167 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.config import Settings
+from app.pipeline.llm import limiter
+from app.pipeline.llm.base import LLMResult
+from app.pipeline.llm.limiter import (
+    Limits,
+    MemoryLimiterState,
+    RateLimitedClient,
+    RateLimiter,
+    RedisLimiterState,
+    get_rate_limiter,
+)
+
+
+class SlowClient:
+    provider = "openrouter"
+    model = "m"
+    temperature = 0.1
+
+    def __init__(self, delay=0.05, total_tokens=None):
+        self.delay = delay
+        self.total_tokens = total_tokens
+        self.active = 0
+        self.peak = 0
+        self.order = []
+
+    async def agenerate(self, prompt, request_id):
+        self.order.append(request_id)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        usage = {"total_tokens": self.total_tokens} if self.total_tokens is not None else {}
+        return LLMResult(text="{}", usage=usage, model_name=self.model)
+
+
+def _client(inner, limits, **env):
+    settings = Settings(LLM_COMPLETION_TOKENS=0, **env)
+    return RateLimitedClient(inner, RateLimiter(MemoryLimiterState(limits)), settings)
+
+
+def test_provider_setting_prefers_the_most_specific_entry():
+    settings = Settings(LLM_RPM="10,openrouter=60,azure_openai:gpt-4o=300")
+    assert settings.provider_setting(settings.llm_rpm, "azure_openai", "gpt-4o") == 300
+    assert settings.provider_setting(settings.llm_rpm, "azure_openai", "other") == 10
+    assert settings.provider_setting(settings.llm_rpm, "openrouter", "m") == 60
+    assert settings.provider_setting("", "openrouter", "m") == 0
+    assert get_rate_limiter(Settings(REDIS_URL=""), "openrouter", "m") is None
+
+
+def test_in_flight_limit_queues_callers_in_arrival_order():
+    inner = SlowClient()
+    client = _client(inner, Limits(max_in_flight=2))
+
+    async def run():
+        tasks = []
+        for index in range(6):
+            tasks.append(asyncio.ensure_future(client.agenerate("p", f"r{index}")))
+            await asyncio.sleep(0)
+        return await asyncio.gather(*tasks)
+
+    results = asyncio.run(run())
+    assert len(results) == 6
+    assert inner.peak == 2
+    assert inner.order == [f"r{index}" for index in range(6)]
+
+
+def test_request_rate_waits_for_the_window(monkeypatch):
+    monkeypatch.setattr(limiter, "WINDOW_S", 0.3)
+    inner = SlowClient(delay=0)
+    client = _client(inner, Limits(rpm=2))
+
+    async def run():
+        started = time.perf_counter()
+        await asyncio.gather(*(client.agenerate("p", f"r{index}") for index in range(3)))
+        return time.perf_counter() - started
+
+    assert asyncio.run(run()) >= 0.25
+
+
+def test_token_rate_uses_reported_usage(monkeypatch):
+    monkeypatch.setattr(limiter, "WINDOW_S", 0.3)
+    # The prompt estimate fits twice, but the first reply reports its real
+    # usage, which fills the budget, so the second call waits.
+    inner = SlowClient(delay=0, total_tokens=100)
+    client = _client(inner, Limits(tpm=100))
+
+    async def run():
+        started = time.perf_counter()
+        await client.agenerate("short prompt", "a")
+        await client.agenerate("short prompt", "b")
+        return time.perf_counter() - started
+
+    assert asyncio.run(run()) >= 0.25
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    state = MemoryLimiterState(Limits(max_in_flight=1))
+    rate = RateLimiter(state)
+
+    async def run():
+        held = await rate.aacquire(1)
+        waiter = asyncio.ensure_future(rate.aacquire(1))
+        await asyncio.sleep(0.02)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        await rate.arelease(held)
+        return await asyncio.wait_for(rate.aacquire(1), timeout=1)
+
+    assert asyncio.run(run())
+
+
+def fake_redis(monkeypatch):
+    """Points `redis.from_url` (sync and asyncio) at one in-memory server;
+    the scripts need fakeredis with Lua support (lupa)."""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    import redis
+    import redis.asyncio
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis, "from_url", lambda url, **kw: fakeredis.FakeRedis(server=server, **kw))
+    monkeypatch.setattr(redis.asyncio, "from_url", lambda url, **kw: fakeredis.FakeAsyncRedis(server=server, **kw))
+    return fakeredis.FakeRedis(server=server, decode_responses=True)
+
+
+def test_redis_state_shares_slots_and_window_across_processes(monkeypatch):
+    fake_redis(monkeypatch)
+    monkeypatch.setattr(limiter, "WINDOW_S", 0.3)
+    # Two states on one name stand in for two processes.
+    first = RateLimiter(RedisLimiterState("redis://test", "openrouter:m", Limits(rpm=2, max_in_flight=1)))
+    second = RateLimiter(RedisLimiterState("redis://test", "openrouter:m", Limits(rpm=2, max_in_flight=1)))
+
+    async def run():
+        held = await first.aacquire(10)
+        waiter = asyncio.ensure_future(second.aacquire(10))
+        await asyncio.sleep(0.1)
+        assert not waiter.done()
+        await first.arelease(held, 10)
+        await second.arelease(await asyncio.wait_for(waiter, timeout=1), 10)
+        # Two requests fill the window; the third waits for the first to age out.
+        started = time.perf_counter()
+        await first.arelease(await first.aacquire(10), 10)
+        return time.perf_counter() - started
+
+    assert asyncio.run(run()) >= 0.1
+
+
+def test_redis_state_expires_more_entries_than_lua_can_unpack(monkeypatch):
+    redis = fake_redis(monkeypatch)
+    state = RedisLimiterState("redis://test", "openrouter:m", Limits(rpm=5))
+    req, tok, _, queue, seen = state._keys
+    old = time.time() - 3600
+    members = [f"old-{index}" for index in range(10000)]
+    redis.zadd(req, {member: old for member in members})
+    redis.hset(tok, mapping={member: 1 for member in members})
+    redis.zadd(queue, {member: index for index, member in enumerate(members)})
+    redis.zadd(seen, {member: old for member in members})
+
+    rate = RateLimiter(state)
+    rate.release(rate.acquire(1), 1)
+    assert redis.zcard(req) == 1 and redis.hlen(tok) == 1
+    assert redis.zcard(queue) == 0 and redis.zcard(seen) == 0
@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+from app.core.config import Settings
+from app.pipeline.llm.base import LLMResult
+from app.pipeline.llm.router import RoutingLLMClient, provider_stats
+
+
+class TimedClient:
+    temperature = 0.1
+
+    def __init__(self, provider, delay, error=None, text=None):
+        self.provider = provider
+        self.model = f"{provider}-model"
+        self.delay = delay
+        self.error = error
+        self.text = text or f'{{"from": "{provider}"}}'
+        self.calls = 0
+        self.cancelled = 0
+
+    async def agenerate(self, prompt, request_id):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        return LLMResult(text=self.text, usage={}, model_name=self.model)
+
+    async def astream(self, prompt, request_id, on_text):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+            for piece in ("{", f'"from": "{self.provider}"', "}"):
+                on_text(piece)
+                await asyncio.sleep(0.01)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        text = f'{{"from": "{self.provider}"}}'
+        return LLMResult(text=text, usage={}, model_name=self.model, first_token_s=self.delay)
+
+    def generate(self, prompt, request_id):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return LLMResult(text=self.text, usage={}, model_name=self.model)
+
+
+def _router(*clients, **settings):
+    provider_stats.cache_clear()
+    return RoutingLLMClient(list(clients), Settings(LLM_HEDGE_DELAY_SECONDS=0.1, **settings))
+
+
+def test_hedge_takes_first_reply_and_cancels_the_other():
+    slow, fast = TimedClient("slow", 2.0), TimedClient("fast", 0.05)
+    router = _router(slow, fast)
+    started = time.perf_counter()
+    result = asyncio.run(router.agenerate("p", "job"))
+    assert time.perf_counter() - started < 0.5
+    assert (result.provider, result.text) == ("fast", '{"from": "fast"}')
+    assert slow.cancelled == 1
+    # The cancelled call counts as a latency sample, so `fast` now leads.
+    assert [c.provider for c in router._ranked("latency")] == ["fast", "slow"]
+
+    sync_router = _router(TimedClient("slow", 1.0), TimedClient("fast", 0.05))
+    started = time.perf_counter()
+    assert sync_router.generate("p", "job").provider == "fast"
+    assert time.perf_counter() - started < 0.5
+
+
+def test_a_reply_that_parses_beats_an_earlier_one_that_does_not():
+    for run in (lambda r: asyncio.run(r.agenerate("p", "job")), lambda r: r.generate("p", "job")):
+        rambling = TimedClient("rambling", 0.0, text="Sure! Here is the report.")
+        router = _router(rambling, TimedClient("strict", 0.2))
+        assert run(router).provider == "strict"
+        assert router.stats["rambling"].healthy()
+
+        rambling, down = TimedClient("rambling", 0.0, text="Sure! Here is the report."), TimedClient("down", 0.0, RuntimeError("503"))
+        alone = _router(rambling, down)
+        assert run(alone).text == "Sure! Here is the report."
+
+
+def test_blocking_calls_are_not_hedged_while_the_pool_is_full():
+    slow, fast = TimedClient("slow", 0.4), TimedClient("fast", 0.0)
+    router = _router(slow, fast, LLM_HEDGE_THREADS=1)
+    assert router.generate("p", "job").provider == "slow"
+    assert fast.calls == 0
+
+
+def test_failed_provider_fails_over_and_turns_unhealthy():
+    broken, backup = TimedClient("broken", 0.0, RuntimeError("503")), TimedClient("backup", 0.3)
+    router = _router(broken, backup)
+    for _ in range(5):
+        assert asyncio.run(router.agenerate("p", "job")).provider == "backup"
+    assert broken.calls == 5
+    assert not router.stats["broken"].healthy()
+    assert router._ranked("latency")[0] is backup
+
+
+def test_stream_hedges_on_first_token_and_forwards_one_stream():
+    slow, fast = TimedClient("slow", 2.0), TimedClient("fast", 0.05)
+    router = _router(slow, fast)
+    seen = []
+    result = asyncio.run(router.astream("p", "job", seen.append))
+    assert "".join(seen) == result.text == '{"from": "fast"}'
+    assert result.provider == "fast" and slow.cancelled == 1
@@ -0,0 +1,89 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.core.config import Settings
+from app.pipeline.json_stream import JSONStreamParser
+from app.pipeline.llm import gemini, openrouter
+from app.pipeline.llm.base import StreamAborted
+
+
+class FakePool:
+    def __init__(self, handler):
+        self.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    def get_async(self, name):
+        return self.client
+
+
+def _sse(events):
+    produced = []
+
+    async def body():
+        for event in events:
+            produced.append(event)
+            yield f"data: {event}\n\n".encode()
+
+    return body(), produced
+
+
+def test_parser_reports_members_and_aborts_early():
+    doc = {"metadata": {"a": [1, {"b": "x\"}"}]}, "environmental": {"n": -1.5e3, "ok": True}, "z": None}
+    text = "```json\n" + json.dumps(doc) + "\n```"
+    for size in (1, 5, len(text)):
+        members = []
+        parser = JSONStreamParser(lambda key, value: members.append((key, value)))
+        for start in range(0, len(text), size):
+            parser.feed(text[start : start + size])
+        parser.close()
+        assert members == list(doc.items())
+        assert parser.value() == doc
+
+    for bad in ("Sure, here is the JSON:", '{"a": 1,}', '{"a": tru}', '{"a": [1}', '{"a": 1'):
+        parser = JSONStreamParser()
+        with pytest.raises(StreamAborted):
+            parser.feed(bad)
+            parser.close()
+
+
+def test_openrouter_stream_collects_text_usage_and_ttft(monkeypatch):
+    chunks = [
+        json.dumps({"model": "m-1", "choices": [{"delta": {"content": piece}}]})
+        for piece in ('{"a":', " 1}")
+    ]
+    chunks += [json.dumps({"choices": [], "usage": {"total_tokens": 7}}), "[DONE]"]
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        body, _ = _sse(chunks)
+        return httpx.Response(200, content=body)
+
+    monkeypatch.setattr(openrouter, "get_http_pool", lambda: FakePool(handler))
+    client = openrouter.OpenRouterClient(Settings(OPENROUTER_API_KEY="k"))
+    seen = []
+    result = asyncio.run(client.astream("prompt", "job", seen.append))
+    assert requests[0]["stream"] is True
+    assert seen == ['{"a":', " 1}"]
+    assert (result.text, result.usage, result.model_name) == ('{"a": 1}', {"total_tokens": 7}, "m-1")
+    assert result.first_token_s is not None
+
+
+def test_gemini_stream_stops_reading_when_aborted(monkeypatch):
+    pieces = ["I cannot", " produce JSON"] + [", more prose"] * 50
+    chunks = [json.dumps({"candidates": [{"content": {"parts": [{"text": p}]}}]}) for p in pieces]
+    body, produced = _sse(chunks)
+    urls = []
+
+    def handler(request):
+        urls.append(str(request.url))
+        return httpx.Response(200, content=body)
+
+    monkeypatch.setattr(gemini, "get_http_pool", lambda: FakePool(handler))
+    client = gemini.GeminiClient(Settings(GEMINI_API_KEY="k"))
+    with pytest.raises(StreamAborted):
+        asyncio.run(client.astream("prompt", "job", JSONStreamParser().feed))
+    assert ":streamGenerateContent" in urls[0] and "alt=sse" in urls[0]
+    assert len(produced) < 5
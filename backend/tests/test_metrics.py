@@ -0,0 +1,67 @@
+import asyncio
+
+from app.core import metrics
+from app.core.metrics import Counter, Gauge, Histogram, Registry, job_extension
+from app.pipeline.orchestrator import PreparedRun, _observe
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    latency = registry.register(Histogram("stage_seconds", "Stage latency.", ("stage",), buckets=(0.1, 1.0)))
+    jobs = registry.register(Counter("jobs_total", "Jobs.", ("status",)))
+    active = registry.register(Gauge("active", "Active jobs."))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, stage="llm")
+    jobs.inc(status="done")
+    jobs.inc(2, status="done")
+    active.inc()
+    active.inc()
+    active.dec()
+
+    lines = registry.render().splitlines()
+    assert "# TYPE stage_seconds histogram" in lines
+    assert 'stage_seconds_bucket{stage="llm",le="0.1"} 2' in lines
+    assert 'stage_seconds_bucket{stage="llm",le="1"} 3' in lines
+    assert 'stage_seconds_bucket{stage="llm",le="+Inf"} 4' in lines
+    assert 'stage_seconds_sum{stage="llm"} 3.65' in lines
+    assert 'stage_seconds_count{stage="llm"} 4' in lines
+    assert 'jobs_total{status="done"} 3' in lines
+    assert "active 1" in lines
+
+
+def test_run_is_observed_by_stage_extension_and_provider():
+    prepared = PreparedRun(
+        source_files=["a.pdf", "b.PDF"],
+        ocr_used=True,
+        raw_text="",
+        total_esg_sentences=0,
+        total_weighted_blocks=0,
+        evidence=[],
+        timings={"extract_s": 1.5, "filter_s": 0.2, "weight_s": 0.1, "llm_s": 4.0, "pdf_pages_per_s": 30.0},
+        extract_stats={"file_timings": {"a.pdf": 1.2, "b.PDF": 0.0}, "ocr_documents": 1, "ocr_pages": 3},
+    )
+    before = metrics.OCR_PAGES.value()
+    _observe(prepared, "gemini", {"promptTokenCount": 120, "candidatesTokenCount": 30})
+
+    assert metrics.STAGE_SECONDS.count(stage="llm", ext="pdf", provider="gemini") >= 1
+    assert metrics.STAGE_SECONDS.count(stage="pdf_pages_per", ext="pdf", provider="gemini") == 0
+    assert metrics.OCR_PAGES.value() == before + 3
+    assert metrics.LLM_TOKENS.value(provider="gemini", kind="prompt") >= 120
+    assert job_extension(["a.pdf", "b.docx"]) == "mixed"
+
+
+def test_worker_endpoint_serves_metrics():
+    async def scrape():
+        server = await metrics.serve_metrics("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: x\r\n\r\n")
+        body = await reader.read()
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return body.decode()
+
+    body = asyncio.run(scrape())
+    assert body.startswith("HTTP/1.1 200 OK")
+    assert "# TYPE axiomesg_stage_seconds histogram" in body
@@ -0,0 +1,98 @@
+import asyncio
+import threading
+
+import httpx
+
+from app.core.config import Settings
+from app.core.http import HttpClientPool
+from app.pipeline import ocr_azure
+from app.pipeline.ocr_azure import OcrEngine
+from benchmarks.docintel_server import create_app
+
+SETTINGS = Settings(
+    AZURE_DOCINTEL_ENDPOINT="http://docintel", AZURE_DOCINTEL_KEY="k", OCR_CONCURRENCY=4, OCR_POLL_MAX_INTERVAL_SECONDS=0.05
+)
+
+
+def _read_many(app, count):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await OcrEngine(client, SETTINGS).read_many([(b"img", "image/png")] * count)
+
+    return asyncio.run(scenario())
+
+
+def test_poll_failures_are_retried_without_resubmitting():
+    app = create_app(latency=0.05, retry_after=0.01, poll_failures=2)
+    results = _read_many(app, 6)
+    assert all(r.pages[0].startswith("Stand-in OCR text for page 1.") for r in results)
+    assert app.state.stats["submits"] == 6
+    assert app.state.stats["poll_failures"] == 12
+
+
+def test_throttled_submits_wait_for_retry_after():
+    app = create_app(latency=0.02, retry_after=0.03, max_inflight=2)
+    results = _read_many(app, 4)
+    assert not [r for r in results if isinstance(r, BaseException)]
+    assert app.state.stats["submits"] == 4
+    assert app.state.stats["throttled"] > 0
+
+
+def test_ocr_batches_on_a_thread_reuse_one_pooled_client(monkeypatch):
+    pool = HttpClientPool(SETTINGS)
+    monkeypatch.setattr(ocr_azure, "get_http_pool", lambda: pool)
+    seen = []
+
+    async def read_many(self, documents):
+        seen.append((self.client, asyncio.get_running_loop()))
+        return []
+
+    monkeypatch.setattr(OcrEngine, "read_many", read_many)
+
+    def batches():
+        ocr_azure.ocr_documents([], SETTINGS)
+        ocr_azure.ocr_documents([], SETTINGS)
+
+    async def main_loop_client():
+        return pool.get_async("azure_docintel")
+
+    main_client = asyncio.run(main_loop_client())
+    thread = threading.Thread(target=batches)
+    thread.start()
+    thread.join()
+    (first_client, first_loop), (second_client, second_loop) = seen
+    assert first_client is second_client and first_loop is second_loop
+    assert first_client is not main_client and not main_client.is_closed
+
+
+def test_ocr_concurrency_bounds_every_thread_in_the_process(monkeypatch):
+    monkeypatch.setattr(ocr_azure, "get_http_pool", lambda: HttpClientPool(SETTINGS))
+    settings = SETTINGS.model_copy(update={"ocr_concurrency": 2})
+    lock = threading.Lock()
+    active, peak = [0], [0]
+
+    async def submit(self, data, content_type):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return "op", 0.0
+
+    async def poll(self, operation, delay):
+        return ocr_azure.OcrResult("text", ["text"])
+
+    monkeypatch.setattr(OcrEngine, "_submit", submit)
+    monkeypatch.setattr(OcrEngine, "_poll", poll)
+    # Each thread runs its own loop, as pipeline threads do.
+    threads = [
+        threading.Thread(target=ocr_azure.ocr_documents, args=([(b"img", "image/png")] * 3, settings))
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import time
+
+import pytest
+from pydantic import ValidationError
+
+from app.core.config import Settings
+from app.pipeline import extractor, orchestrator
+from app.pipeline.llm.base import LLMResult
+from app.pipeline.orchestrator import complete_run, complete_run_async, prepare_run
+from tests.test_extractor import _make_pdf
+
+
+def test_streaming_prepare_matches_materialized():
+    files = [
+        ("a.csv", b"We reduced carbon emissions by 12%.\nBoard oversight of climate risk improved. Revenue grew.", "text/csv"),
+        ("b.csv", b"Employee safety training reached 4,000 staff. Water use fell 3%.", "text/csv"),
+    ]
+    materialized = prepare_run(files, Settings(EXTRACT_CACHE_ENABLED=False), "job-1")
+    streaming = prepare_run(files, Settings(EXTRACT_CACHE_ENABLED=False, PIPELINE_STREAMING=True), "job-2")
+    assert streaming.evidence == materialized.evidence
+    assert streaming.total_esg_sentences == materialized.total_esg_sentences
+    assert streaming.total_weighted_blocks == materialized.total_weighted_blocks
+    assert streaming.source_files == ["a.csv", "b.csv"]
+    assert streaming.raw_text == materialized.raw_text
+
+
+def test_streaming_keeps_a_file_that_fails_partway_and_reports_every_stage(monkeypatch):
+    iter_one = extractor._iter_one
+
+    def truncated(filename, source, content_type, settings, stats):
+        for block in iter_one(filename, source, content_type, settings, stats):
+            yield block
+            if filename == "b.csv":
+                raise ValueError("corrupt row")
+
+    monkeypatch.setattr(extractor, "_iter_one", truncated)
+    files = [
+        ("a.csv", b"Board oversight of climate risk improved.", "text/csv"),
+        ("b.csv", b"We reduced carbon emissions by 12%.\nWater use fell 3%.", "text/csv"),
+    ]
+    stages = []
+    prepared = prepare_run(
+        files,
+        Settings(EXTRACT_CACHE_ENABLED=False, PIPELINE_STREAMING=True),
+        "job",
+        lambda stage, progress: stages.append(stage),
+    )
+    assert stages == ["EXTRACT", "FILTER", "WEIGHT"]
+    assert prepared.source_files == ["a.csv", "b.csv"]
+    assert prepared.extract_stats["file_errors"]["b.csv"].startswith("Partial")
+    assert {span["source_file"] for span in prepared.evidence} == {"a.csv", "b.csv"}
+
+
+def test_evidence_carries_page_and_offsets():
+    pdf = _make_pdf(["Intro page.", "Scope 1 carbon emissions fell by 8% year on year."])
+    files = [
+        ("report.pdf", pdf, "application/pdf"),
+        ("notes.csv", b"Revenue grew.\nScope 1 carbon emissions fell by 8% year on year.", "text/csv"),
+    ]
+    for streaming in (False, True):
+        prepared = prepare_run(files, Settings(EXTRACT_CACHE_ENABLED=False, PIPELINE_STREAMING=streaming), "job")
+        (span,) = prepared.evidence
+        assert span["source_file"] == "report.pdf"
+        assert span["location"] == "page 2"
+        assert span["char_end"] - span["char_start"] == len(span["text"])
+
+
+class SectionClient:
+    provider = "fake"
+    model = "fake-model"
+    temperature = 0.1
+
+    def __init__(self):
+        self.prompts = []
+
+    def _reply(self, prompt):
+        self.prompts.append(prompt)
+        section = "social" if "social section" in prompt else "environmental"
+        lines = prompt.split("JSON-quoted text):\n", 1)[1].splitlines() if "JSON-quoted" in prompt else []
+        evidence = [{"text": json.loads(line.split(" ", 2)[2])} for line in lines]
+        score = 2.0 if section == "social" and not prompt.startswith("Fix") else 0.4
+        body = {
+            "narrative": f"{section} narrative",
+            "metrics": [],
+            "confidence_score": score,
+            "top_evidence": evidence[:1],
+        }
+        return LLMResult(text=json.dumps(body), usage={"total_tokens": 10}, model_name=self.model)
+
+    def generate(self, prompt, request_id):
+        time.sleep(0.2)
+        return self._reply(prompt)
+
+    async def agenerate(self, prompt, request_id):
+        await asyncio.sleep(0.2)
+        return self._reply(prompt)
+
+
+def _prepared():
+    files = [("a.csv", b"We reduced carbon emissions by 12%.\nEmployee safety training reached 4,000 staff.", "text/csv")]
+    return prepare_run(files, Settings(EXTRACT_CACHE_ENABLED=False), "job")
+
+
+def test_section_mode_runs_sections_concurrently_and_repairs_one(monkeypatch):
+    settings = Settings(LLM_PROMPT_MODE="sections")
+    for run in (
+        lambda: complete_run(_prepared(), settings, "job"),
+        lambda: asyncio.run(complete_run_async(_prepared(), settings, "job")),
+    ):
+        client = SectionClient()
+        monkeypatch.setattr(orchestrator, "get_llm_client", lambda *args, **kwargs: client)
+        started = time.perf_counter()
+        output, _, usage = run()
+        elapsed = time.perf_counter() - started
+
+        # Environmental and social run side by side; only social is repaired,
+        # and governance has no evidence, so it is never prompted.
+        assert len(client.prompts) == 3
+        assert sum(p.startswith("Fix") for p in client.prompts) == 1
+        assert elapsed < 0.55
+        assert output.environmental.top_evidence[0].source_file == "a.csv"
+        assert output.environmental.top_evidence[0].category == "E"
+        assert (output.aggregation.evidence_packed, output.aggregation.evidence_dropped) == (2, 0)
+        assert output.social.confidence_score == 0.4
+        assert output.governance.narrative == "Not found in provided documents."
+        assert usage["sections"]["social"] == {"total_tokens": 20, "calls": 2}
+        assert usage["total_tokens"] == 30 and usage["calls"] == 3
+
+
+def test_files_that_fail_to_extract_are_reported_in_the_output(monkeypatch):
+    files = [
+        ("a.csv", b"We reduced carbon emissions by 12%.\nEmployee safety training reached 4,000 staff.", "text/csv"),
+        ("broken.docx", b"not a docx", None),
+    ]
+    settings = Settings(LLM_PROMPT_MODE="sections")
+    monkeypatch.setattr(orchestrator, "get_llm_client", lambda *args, **kwargs: SectionClient())
+    for streaming in (False, True):
+        prepared = prepare_run(files, Settings(EXTRACT_CACHE_ENABLED=False, PIPELINE_STREAMING=streaming), "job")
+        output, _, _ = complete_run(prepared, settings, "job")
+        assert output.metadata.source_files == ["a.csv"]
+        assert list(output.aggregation.file_errors) == ["broken.docx"]
+
+
+class StreamingClient:
+    provider = "fake"
+    model = "fake-model"
+    temperature = 0.1
+
+    def __init__(self, evidence):
+        self.prompts = []
+        section = {"narrative": "n", "metrics": [], "confidence_score": 0.5}
+        self.reply = json.dumps(
+            {
+                "metadata": {},
+                "aggregation": {},
+                "environmental": {**section, "top_evidence": [{"text": evidence["E"]}]},
+                "social": {**section, "top_evidence": [{"text": evidence["S"]}]},
+                "governance": {**section, "confidence_score": 7, "top_evidence": []},
+            }
+        )
+
+    async def astream(self, prompt, request_id, on_text):
+        self.prompts.append(prompt)
+        text = "Here is the report you asked for." if len(self.prompts) == 1 else self.reply
+        for start in range(0, len(text), 16):
+            on_text(text[start : start + 16])
+        return LLMResult(text=text, usage={}, model_name=self.model, first_token_s=0.01)
+
+
+def test_streaming_restarts_off_format_reply_and_publishes_sections(monkeypatch):
+    prepared = _prepared()
+    client = StreamingClient({span["category"]: span["text"] for span in prepared.evidence})
+    monkeypatch.setattr(orchestrator, "get_llm_client", lambda *args, **kwargs: client)
+    published = []
+
+    with pytest.raises(ValidationError):
+        asyncio.run(
+            complete_run_async(
+                prepared,
+                Settings(LLM_STREAMING=True),
+                "job",
+                section_callback=lambda section, body: published.append(section),
+            )
+        )
+    # The prose reply is dropped after its first chunk and asked for again;
+    # valid sections are passed on as they close, the invalid one is not.
+    assert len(client.prompts) == 2 and client.prompts[1].endswith("starting with {.")
+    assert published == ["environmental", "social"]
+    assert prepared.timings["llm_ttft_s"] == 0.01
+
+
+class TruncatingClient(StreamingClient):
+    """Replays a cut-off reply as a cache hit would: whole, with no TTFT."""
+
+    def __init__(self, evidence):
+        super().__init__(evidence)
+        self.reply = self.reply.replace('"confidence_score": 7', '"confidence_score": 0.7')
+        self.repairs = []
+
+    async def astream(self, prompt, request_id, on_text):
+        self.prompts.append(prompt)
+        text = self.reply[:-40]
+        on_text(text)
+        return LLMResult(text=text, usage={}, model_name=self.model)
+
+    async def agenerate(self, prompt, request_id):
+        self.repairs.append(prompt)
+        return LLMResult(text=self.reply, usage={}, model_name=self.model)
+
+
+def test_streamed_reply_that_never_closes_is_repaired(monkeypatch):
+    prepared = _prepared()
+    client = TruncatingClient({span["category"]: span["text"] for span in prepared.evidence})
+    monkeypatch.setattr(orchestrator, "get_llm_client", lambda *args, **kwargs: client)
+
+    output, _, _ = asyncio.run(complete_run_async(prepared, Settings(LLM_STREAMING=True), "job"))
+    assert len(client.prompts) == 1 and len(client.repairs) == 1
+    assert output.governance.confidence_score == 0.7
+    assert "llm_ttft_s" not in prepared.timings
@@ -0,0 +1,40 @@
+from app.core.config import Settings
+from app.pipeline.packer import HeuristicEstimator, evidence_line, pack_evidence
+
+
+class WordEstimator:
+    def count(self, text):
+        return len(text.split())
+
+
+def _span(category, weight, words):
+    return {"category": category, "weight": weight, "text": " ".join(["word"] * words)}
+
+
+def test_pack_fills_budget_by_weight_with_category_quotas():
+    ranked = [_span("E", 0.9 - i * 0.01, 8) for i in range(10)] + [_span("G", 0.4, 8), _span("S", 0.3, 2)]
+    # Each line costs words + 2 (category, weight) + 1 (newline) tokens.
+    packed = pack_evidence(ranked, budget=50, min_per_category=1, estimator=WordEstimator())
+    assert packed.per_category == {"E": 3, "S": 1, "G": 1}
+    assert packed.tokens == 11 * 4 + 5
+    assert packed.dropped == len(ranked) - len(packed.spans)
+    assert [span["category"] for span in packed.spans] == ["E", "E", "E", "G", "S"]
+
+
+def test_pack_skips_spans_that_do_not_fit():
+    ranked = [_span("E", 0.9, 40), _span("E", 0.8, 3), _span("E", 0.7, 3)]
+    packed = pack_evidence(ranked, budget=20, min_per_category=0, estimator=WordEstimator())
+    assert packed.spans == ranked[1:]
+    assert packed.dropped == 1
+
+
+def test_heuristic_estimator_and_provider_budgets():
+    estimator = HeuristicEstimator()
+    assert estimator.count("") == 0
+    assert estimator.count("Scope 1 emissions fell 12%.") == 8
+    line = evidence_line({"category": "E", "weight": 0.91234, "text": 'He said "hi"\n'})
+    assert line == 'E 0.91 "He said \\"hi\\"\\n"'
+
+    settings = Settings(EVIDENCE_TOKEN_BUDGET=1000, EVIDENCE_TOKEN_BUDGETS="gemini=8000, openrouter=3000")
+    assert settings.evidence_token_budget_for("gemini") == 8000
+    assert settings.evidence_token_budget_for("azure_openai") == 1000
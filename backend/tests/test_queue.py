@@ -0,0 +1,61 @@
+import time
+
+from app.core.queue import RedisJobQueue, SqliteJobQueue
+from tests.test_llm_limiter import fake_redis
+
+
+def test_sqlite_queue_leases_expire_and_stale_receipts_are_ignored(tmp_path):
+    queue = SqliteJobQueue(str(tmp_path / "queue.db"), visibility_timeout=0.2, max_attempts=3)
+    queue.enqueue("job-1", {"files": []})
+    queue.enqueue("job-2", {"files": []})
+
+    first = queue.reserve()
+    second = queue.reserve()
+    assert (first.job_id, second.job_id) == ("job-1", "job-2")
+    assert queue.reserve() is None
+    assert queue.ack(second)
+
+    time.sleep(0.25)
+    again = queue.reserve()
+    assert again.job_id == "job-1" and again.attempts == 2
+    # The first lease lapsed; its holder can no longer settle the job.
+    assert not queue.ack(first)
+    assert not queue.extend(first)
+
+    assert queue.release(again, delay=0.2)
+    assert queue.reserve() is None
+    time.sleep(0.25)
+    third = queue.reserve()
+    assert third.attempts == 3 and third.payload == {"files": []}
+    assert queue.dead_letter(third, "boom")
+    time.sleep(0.25)
+    assert queue.reserve() is None
+
+
+def test_redis_queue_redelivers_lapsed_leases_and_delays_retries(monkeypatch):
+    redis = fake_redis(monkeypatch)
+    queue = RedisJobQueue("redis://test", visibility_timeout=0.2, max_attempts=3)
+    queue.enqueue("job-1", {"files": []})
+    queue.enqueue("job-2", {"files": []})
+
+    first = queue.reserve()
+    second = queue.reserve()
+    assert (first.job_id, second.job_id) == ("job-1", "job-2")
+    assert queue.reserve() is None
+    assert queue.ack(second)
+
+    time.sleep(0.25)
+    again = queue.reserve()
+    assert again.job_id == "job-1" and again.attempts == 2
+    assert not queue.ack(first)
+    assert not queue.extend(first)
+
+    assert queue.release(again, delay=0.2)
+    assert queue.reserve() is None
+    time.sleep(0.25)
+    third = queue.reserve()
+    assert third.attempts == 3 and third.payload == {"files": []}
+    assert queue.dead_letter(third, "boom")
+    time.sleep(0.25)
+    assert queue.reserve() is None
+    assert redis.lrange("queue:dead", 0, -1) == [third.id]
@@ -0,0 +1,69 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api import routes
+from app.core.config import Settings
+from app.pipeline.storage import SpooledUploadWriter, StoredUpload, UploadTooLarge
+
+
+def test_spooled_writer_moves_large_uploads_to_disk(tmp_path):
+    writer = SpooledUploadWriter(max_bytes=100, spool_bytes=8, directory=str(tmp_path))
+    writer.write(b"carbon ")
+    writer.write(b"emissions")
+    stored = writer.finish()
+    assert isinstance(stored, StoredUpload)
+    with stored.view() as view:
+        assert view[:] == b"carbon emissions"
+    stored.cleanup()
+    assert not os.listdir(tmp_path)
+
+
+def test_spooled_writer_stops_at_limit(tmp_path):
+    writer = SpooledUploadWriter(max_bytes=10, spool_bytes=4, directory=str(tmp_path))
+    with pytest.raises(UploadTooLarge):
+        writer.write(b"0123456789abc")
+    assert not os.listdir(tmp_path)
+
+
+def test_oversized_uploads_are_refused_before_the_form_is_parsed(monkeypatch):
+    monkeypatch.setattr(routes, "get_settings", lambda: Settings(MAX_TOTAL_MB=1))
+    app = FastAPI()
+    app.include_router(routes.router)
+    limit = 1024 * 1024 + routes.MULTIPART_OVERHEAD_BYTES
+    sent = []
+
+    async def declared():
+        messages = []
+
+        async def receive():
+            raise AssertionError("the body must not be read")
+
+        async def send(message):
+            messages.append(message)
+
+        headers = [(b"content-type", b"multipart/form-data; boundary=x"), (b"content-length", str(limit + 1).encode())]
+        scope = {"type": "http", "method": "POST", "path": "/api/extract", "headers": headers, "query_string": b""}
+        await app(scope, receive, send)
+        return messages[0]["status"]
+
+    async def chunked():
+        async def body():
+            yield b"--x\r\nContent-Disposition: form-data; name=\"files\"; filename=\"a.csv\"\r\n\r\n"
+            for _ in range(8):
+                sent.append(1)
+                yield b"x" * (512 * 1024)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post(
+                "/api/extract", content=body(), headers={"content-type": "multipart/form-data; boundary=x"}
+            )
+        return response.status_code
+
+    assert asyncio.run(declared()) == 413
+    assert asyncio.run(chunked()) == 413
+    assert len(sent) < 8
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import uuid
+
+import httpx
+import pytest
+
+from app.core import tracing
+from app.core.config import Settings
+from app.pipeline import orchestrator
+from app.pipeline.extractor import _extract_timed
+from app.pipeline.llm import openrouter
+from app.pipeline.orchestrator import run_pipeline
+from tests.test_llm_stream import FakePool
+from tests.test_orchestrator import SectionClient
+
+
+@pytest.fixture
+def buffer(monkeypatch):
+    ring = tracing.RingBufferExporter(1000)
+    monkeypatch.setattr(tracing, "get_exporters", lambda: (ring,))
+    return ring
+
+
+def _by_name(spans):
+    return {span["name"]: span for span in spans}
+
+
+def test_spans_nest_under_the_job_trace_and_cross_processes(buffer):
+    job_id = str(uuid.uuid4())
+    with tracing.span("job", job_id=job_id) as job:
+        with pytest.raises(ValueError):
+            with tracing.span("child", bytes=10):
+                tracing.add_attribute("retries")
+                tracing.add_attribute("retries")
+                raise ValueError("boom")
+        parent = tracing.traceparent()
+
+    # What a pool worker does with the parent's traceparent.
+    with tracing.attach(parent), tracing.collect() as shipped:
+        with tracing.span("remote"):
+            pass
+    assert [span["name"] for span in buffer.spans()] == ["child", "job"]
+    tracing.export(shipped)
+
+    spans = _by_name(buffer.spans(tracing.job_trace_id(job_id)))
+    assert job.trace_id == uuid.UUID(job_id).hex
+    assert spans["child"]["parent_id"] == spans["job"]["span_id"]
+    assert spans["child"]["attributes"] == {"bytes": 10, "retries": 2}
+    assert spans["child"]["error"] == "boom"
+    assert spans["remote"]["parent_id"] == spans["job"]["span_id"]
+    assert spans["job"]["attributes"]["job_id"] == job_id
+
+
+def test_run_pipeline_traces_files_sections_and_repairs(buffer, monkeypatch):
+    client = SectionClient()
+    monkeypatch.setattr(orchestrator, "get_llm_client", lambda *args, **kwargs: client)
+    files = [("a.csv", b"We reduced carbon emissions by 12%.\nEmployee safety training reached 4,000 staff.", "text/csv")]
+    run_pipeline(files, Settings(EXTRACT_CACHE_ENABLED=False, LLM_PROMPT_MODE="sections"), "job-7")
+
+    spans = buffer.spans(tracing.job_trace_id("job-7"))
+    names = {span["span_id"]: span["name"] for span in spans}
+    parents = {}
+    for span in spans:
+        name = span["attributes"]["section"] if span["name"] == "llm_section" else span["name"]
+        parents[name] = names.get(span["parent_id"])
+    assert parents["run_pipeline"] is None
+    assert parents["prepare_run"] == "run_pipeline"
+    assert parents["extract_documents"] == "prepare_run"
+    assert parents["extract_file"] == "extract_documents"
+    assert parents["social"] == parents["environmental"] == "complete_run"
+    assert parents["validate"] == "complete_run"
+
+    by_name = _by_name(spans)
+    assert by_name["extract_file"]["attributes"]["bytes"] == len(files[0][1])
+    assert by_name["filter"]["attributes"]["sentences"] == 2
+    sections = {s["attributes"]["section"]: s["attributes"] for s in spans if s["name"] == "llm_section"}
+    assert sections["social"].get("repairs") == 1 and "repairs" not in sections["environmental"]
+
+
+def test_extract_in_pool_worker_returns_spans_under_parent():
+    parent = f"00-{'a' * 32}-{'b' * 16}-01"
+    entry, error, _, spans = _extract_timed("a.csv", b"x,y\n1,2", "text/csv", Settings(), parent)
+    assert error is None and entry.text
+    (span,) = spans
+    assert (span["trace_id"], span["parent_id"]) == ("a" * 32, "b" * 16)
+    assert span["attributes"]["chars"] == len(entry.text)
+
+
+def test_adapter_span_counts_tokens_and_retries(buffer, monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(503)
+        usage = {"prompt_tokens": 9, "completion_tokens": 2, "total_tokens": 11}
+        body = {"model": "m", "choices": [{"message": {"content": "{}"}}], "usage": usage}
+        return httpx.Response(200, json=body)
+
+    monkeypatch.setattr(openrouter, "get_http_pool", lambda: FakePool(handler))
+    monkeypatch.setattr(openrouter.OpenRouterClient.agenerate.__wrapped__.retry, "sleep", _no_sleep)
+    client = openrouter.OpenRouterClient(Settings(OPENROUTER_API_KEY="k", OPENROUTER_MODEL="m"))
+    asyncio.run(client.agenerate("prompt", "job-9"))
+
+    (span,) = buffer.spans(tracing.job_trace_id("job-9"))
+    assert span["name"] == "llm.agenerate"
+    attributes = span["attributes"]
+    assert (attributes["provider"], attributes["retries"]) == ("openrouter", 1)
+    assert (attributes["prompt_tokens"], attributes["completion_tokens"], attributes["total_tokens"]) == (9, 2, 11)
+
+
+async def _no_sleep(seconds):
+    return None
+
+
+def test_otlp_file_exporter_writes_json_lines(tmp_path):
+    path = tmp_path / "traces" / "spans.jsonl"
+    exporter = tracing.OTLPFileExporter(str(path))
+    with tracing.collect() as spans:
+        with tracing.span("job", job_id="job-1", pages=3, ratio=0.5, ocr=True):
+            with tracing.span("ocr.read"):
+                pass
+    exporter.export(spans)
+    exporter.export(spans[:1])
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 2
+    request = json.loads(lines[0])
+    resource = request["resourceSpans"][0]
+    assert resource["resource"]["attributes"][0] == {"key": "service.name", "value": {"stringValue": "axiomesg"}}
+    child, root = resource["scopeSpans"][0]["spans"]
+    assert child["parentSpanId"] == root["spanId"] and "parentSpanId" not in root
+    assert {a["key"]: a["value"] for a in root["attributes"]} == {
+        "pages": {"intValue": "3"},
+        "ratio": {"doubleValue": 0.5},
+        "ocr": {"boolValue": True},
+        "job_id": {"stringValue": "job-1"},
+    }
+    assert root["status"] == {"code": 1}
+    assert int(root["endTimeUnixNano"]) >= int(root["startTimeUnixNano"])
@@ -0,0 +1,122 @@
+import asyncio
+import json
+
+import pytest
+from tenacity import RetryError, retry, stop_after_attempt
+
+from app.api.events import InProcessEventBus
+from app.api.job_store import JobRecord, ProgressWriter, SqliteJobStore
+from app.api.runner import JobRunner
+from app.core.config import Settings
+from app.core.queue import SqliteJobQueue
+from app.pipeline.schema import ESGOutput
+from app.pipeline.storage import LocalStorageAdapter
+from app.worker import Worker, _permanent
+
+
+def _output():
+    section = {"narrative": "n/a", "metrics": [], "confidence_score": 0.5, "top_evidence": []}
+    return ESGOutput.model_validate(
+        {
+            "metadata": {
+                "source_files": ["a.csv"],
+                "extraction_date": "2024-01-01",
+                "model_provider": "test",
+                "model_name": "test",
+                "awfa_weights_preserved": True,
+            },
+            "aggregation": {
+                "total_documents": 1,
+                "total_esg_sentences": 1,
+                "total_weighted_blocks": 1,
+                "ocr_used": False,
+            },
+            "environmental": section,
+            "social": section,
+            "governance": section,
+        }
+    )
+
+
+class FlakyExecutor:
+    """Fails the first `failures` runs, then returns an empty result."""
+
+    def __init__(self, failures, error=RuntimeError("provider unavailable")):
+        self.failures = failures
+        self.error = error
+        self.calls = []
+
+    async def run(self, files, settings, job_id, stage_callback=None, bypass_cache=False, section_callback=None):
+        self.calls.append([(name, source.read_bytes()) for name, source, _ in files])
+        stage_callback("FILTER", 40)
+        if len(self.calls) <= self.failures:
+            raise self.error
+        return _output(), "raw text", {}
+
+
+def _worker(tmp_path, failures, max_attempts, error=RuntimeError("provider unavailable")):
+    settings = Settings(QUEUE_RETRY_BACKOFF_SECONDS=0, QUEUE_POLL_SECONDS=0.01)
+    store = SqliteJobStore(str(tmp_path / "jobs.db"), ttl_seconds=60)
+    queue = SqliteJobQueue(str(tmp_path / "queue.db"), visibility_timeout=30, max_attempts=max_attempts)
+    storage = LocalStorageAdapter(str(tmp_path / "uploads"))
+    executor = FlakyExecutor(failures, error)
+    runner = JobRunner(store, InProcessEventBus(), ProgressWriter(store, 0.01), executor)
+    worker = Worker(queue, runner, storage, settings)
+
+    store.set(JobRecord(job_id="j1", source_files=["a.csv"]))
+    key = storage.save("j1/000", b"carbon emissions fell.")
+    queue.enqueue("j1", {"files": [{"filename": "a.csv", "key": key, "content_type": "text/csv"}]})
+    return worker, store, queue, executor, tmp_path / "uploads"
+
+
+async def _drain(worker, queue):
+    while (message := queue.reserve()) is not None:
+        await worker.handle(message)
+
+
+def test_worker_retries_then_completes(tmp_path):
+    worker, store, queue, executor, uploads = _worker(tmp_path, failures=1, max_attempts=3)
+    asyncio.run(_drain(worker, queue))
+
+    record = store.get("j1")
+    assert record.status == "done" and record.error is None
+    assert record.raw_text_preview == "raw text"
+    assert executor.calls == [[("a.csv", b"carbon emissions fell.")]] * 2
+    assert not list(uploads.iterdir())
+
+
+def test_worker_marks_job_failed_after_max_attempts(tmp_path):
+    worker, store, queue, executor, uploads = _worker(tmp_path, failures=5, max_attempts=2)
+    asyncio.run(_drain(worker, queue))
+
+    record = store.get("j1")
+    assert record.status == "error"
+    assert record.error["detail"] == "provider unavailable"
+    assert len(executor.calls) == 2
+    assert queue.reserve() is None
+    assert not list(uploads.iterdir())
+
+
+def test_worker_fails_unretryable_errors_at_once(tmp_path):
+    worker, store, queue, executor, uploads = _worker(
+        tmp_path, failures=5, max_attempts=3, error=ValueError("Unsupported file type: a.exe")
+    )
+    asyncio.run(_drain(worker, queue))
+
+    record = store.get("j1")
+    assert record.status == "error"
+    assert record.error["detail"] == "Unsupported file type: a.exe"
+    assert len(executor.calls) == 1
+    assert not list(uploads.iterdir())
+
+
+def test_only_input_and_configuration_errors_are_permanent():
+    @retry(stop=stop_after_attempt(1))
+    def unconfigured():
+        raise ValueError("GEMINI_API_KEY is not configured.")
+
+    with pytest.raises(RetryError) as wrapped:
+        unconfigured()
+    assert _permanent(wrapped.value)
+    assert not _permanent(RuntimeError("provider unavailable"))
+    assert not _permanent(json.JSONDecodeError("Expecting value", "", 0))
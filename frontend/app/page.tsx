@@ -93,6 +93,45 @@ export default function Home() {
     []
   );
 
+  const watchJob = useCallback(
+    (id: string) => {
+      if (typeof EventSource === "undefined") {
+        pollJob(id);
+        return;
+      }
+      const source = new EventSource(`${BACKEND_URL}/api/jobs/${id}/events`);
+      let finished = false;
+      source.addEventListener("progress", (event) => {
+        const data = JSON.parse((event as MessageEvent).data) as JobStatus;
+        setStage(data.stage);
+        setStatus("processing");
+      });
+      source.addEventListener("done", (event) => {
+        const data = JSON.parse((event as MessageEvent).data) as JobStatus;
+        finished = true;
+        source.close();
+        setStage(data.stage);
+        setStatus("done");
+        setResult(data.result);
+        setRawText(data.raw_text_preview || "");
+      });
+      source.addEventListener("failed", (event) => {
+        const data = JSON.parse((event as MessageEvent).data) as JobStatus;
+        finished = true;
+        source.close();
+        setStatus("error");
+        setError(data.error?.message || "Pipeline error.");
+        setDetail(data.error?.detail || "");
+      });
+      // Connection problems (proxies without streaming, etc.) fall back to polling.
+      source.onerror = () => {
+        source.close();
+        if (!finished) pollJob(id);
+      };
+    },
+    [pollJob]
+  );
+
   const runExtraction = useCallback(async () => {
     setError(null);
     setDetail(null);
@@ -126,8 +165,8 @@ export default function Home() {
     setStatus("processing");
     setStage("EXTRACT");
     setJobId(data.job_id);
-    pollJob(data.job_id);
-  }, [files, pollJob]);
+    watchJob(data.job_id);
+  }, [files, watchJob]);
 
   const copyJson = useCallback(async () => {
     if (!result) return;